@@ -9,6 +9,9 @@ from typing import Any, Dict
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
+from sentinel_mas.tools.pool import close_async_pools, close_pools
+from sentinel_mas.tools.tracking_tools import aclose_clients, close_clients
+
 from .config import get_api_config
 from .models import HealthResponse
 from .routers import admin, auth, queries
@@ -72,6 +75,10 @@ async def shutdown_event() -> None:
     - Cleanup
     """
     print(f"Shutting down {config.PROJECT_NAME}")
+    close_pools()
+    await close_async_pools()
+    close_clients()
+    await aclose_clients()
 
 
 @app.get("/")
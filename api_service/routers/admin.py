@@ -9,6 +9,9 @@ from typing import Any, Dict
 
 from fastapi import APIRouter, Depends
 
+from sentinel_mas.tools.db import db_stats
+from sentinel_mas.tools.tracking_tools import central_stats
+
 from ..auth import AuthContext, TokenData, require_role
 from ..models import QueryRequest, QueryResponse
 from ..services.sentinel_service import SentinelService, get_sentinel_service
@@ -84,3 +87,50 @@ async def get_config_info(
     """
     sentinel_service = get_sentinel_service()
     return sentinel_service.get_config_info()
+
+
+@router.get("/db")
+async def get_db_stats(
+    current_user: TokenData = Depends(require_role("admin")),
+) -> Dict[str, Any]:
+    """
+    Get DB connection pool and read replica statistics (admin only)
+
+    Args:
+        current_user: Must have admin role
+
+    Returns:
+        Dict with pool counters (by pool name) and replica routing state
+
+    Example Response:
+        {
+            "pools": {
+                "enabled": true,
+                "primary": {"pool_size": 2, "pool_available": 2, "requests_num": 41}
+            },
+            "replica": {"configured": false, "reads": 0}
+        }
+    """
+    return db_stats()
+
+
+@router.get("/central")
+async def get_central_stats(
+    current_user: TokenData = Depends(require_role("admin")),
+) -> Dict[str, Any]:
+    """
+    Get the sentinel_central client and circuit breaker state (admin only)
+
+    Args:
+        current_user: Must have admin role
+
+    Returns:
+        Dict with the breaker state, its consecutive failures and fast-failed calls
+
+    Example Response:
+        {
+            "breaker": {"state": "closed", "failures": 0, "rejected": 0},
+            "http2": false
+        }
+    """
+    return central_stats()
@@ -0,0 +1,137 @@
+"""
+Local stand-in for the alert channels, for tests and load runs of the fanout.
+
+    python -m app.alert_stub --port 8199 [--fail-rate 0.2] [--status-429-every 10]
+
+    POST /1/messages.json   Pushover-shaped form post  -> {"status": 1, "request": ...}
+    POST /webhook           JSON webhook
+    GET  /messages          everything received so far (and counters)
+    POST /reset             forget it
+
+Point the fanout at it with PUSHOVER_API=http://127.0.0.1:8199/1/messages.json
+(plus any PUSHOVER_TOKEN / PUSHOVER_USER) and/or ALERT_WEBHOOK_URL=http://127.0.0.1:8199/webhook.
+Connections are kept alive, so the fanout's pooled client is exercised as in production.
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl
+
+import logging
+log = logging.getLogger(__name__)
+
+_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 429: "Too Many Requests", 500: "Internal Server Error",
+            503: "Service Unavailable"}
+
+
+class AlertStub:
+    def __init__(self, fail_rate: float = 0.0, status_429_every: int = 0, delay_s: float = 0.0):
+        self.fail_rate = fail_rate
+        self.status_429_every = status_429_every
+        self.delay_s = delay_s
+        self.messages: List[Dict[str, Any]] = []
+        self.requests = 0
+        self.failed = 0
+        self.throttled = 0
+        self.connections = 0
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> int:
+        self._server = await asyncio.start_server(self._serve, host, port)
+        return self._server.sockets[0].getsockname()[1]
+
+    async def close(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+
+    def reset(self) -> None:
+        self.messages.clear()
+        self.requests = self.failed = self.throttled = 0
+
+    def _route(self, method: str, path: str, headers: Dict[str, str], body: bytes) -> Tuple[int, Dict[str, Any], Dict[str, str]]:
+        if method == "GET" and path == "/messages":
+            return 200, {"messages": self.messages, "requests": self.requests, "failed": self.failed,
+                         "throttled": self.throttled, "connections": self.connections}, {}
+        if method == "POST" and path == "/reset":
+            self.reset()
+            return 200, {"ok": True}, {}
+        if method != "POST" or path not in ("/1/messages.json", "/webhook"):
+            return 404, {"detail": "Not Found"}, {}
+
+        self.requests += 1
+        if self.status_429_every and self.requests % self.status_429_every == 0:
+            self.throttled += 1
+            return 429, {"status": 0, "errors": ["rate limited"]}, {"Retry-After": "1"}
+        if self.fail_rate and random.random() < self.fail_rate:
+            self.failed += 1
+            return 503, {"status": 0, "errors": ["unavailable"]}, {}
+
+        if path == "/webhook":
+            message: Dict[str, Any] = {"channel": "webhook", "body": json.loads(body or b"null")}
+        else:
+            form = dict(parse_qsl(body.decode()))
+            if not form.get("token") or not form.get("user") or not form.get("message"):
+                return 400, {"status": 0, "errors": ["token, user and message are required"]}, {}
+            message = {"channel": "pushover", "body": form}
+        message["received_ms"] = int(time.time() * 1000)
+        self.messages.append(message)
+        return 200, {"status": 1, "request": uuid.uuid4().hex}, {}
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.connections += 1
+        try:
+            while True:                                        # HTTP/1.1 keep-alive
+                request_line = (await reader.readline()).decode("latin-1").split()
+                if len(request_line) < 2:
+                    break
+                headers: Dict[str, str] = {}
+                while True:
+                    line = (await reader.readline()).decode("latin-1").strip()
+                    if not line:
+                        break
+                    k, _, v = line.partition(":")
+                    headers[k.strip().lower()] = v.strip()
+                body = await reader.readexactly(int(headers.get("content-length", "0")))
+                if self.delay_s:
+                    await asyncio.sleep(self.delay_s)
+                method, path = request_line[0], request_line[1].split("?", 1)[0]
+                code, payload, extra = self._route(method, path, headers, body)
+                data = json.dumps(payload).encode()
+                head = f"HTTP/1.1 {code} {_REASONS.get(code, 'Error')}\r\nContent-Type: application/json\r\n"
+                head += "".join(f"{k}: {v}\r\n" for k, v in extra.items())
+                writer.write(f"{head}Content-Length: {len(data)}\r\n\r\n".encode() + data)
+                await writer.drain()
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        except Exception as e:
+            log.debug("Alert stub request failed: %s", e)
+        finally:
+            writer.close()
+
+
+async def _main(args: argparse.Namespace) -> None:
+    stub = AlertStub(args.fail_rate, args.status_429_every, args.delay_s)
+    port = await stub.start(args.host, args.port)
+    log.info("Alert stub listening on http://%s:%d (pushover: /1/messages.json, webhook: /webhook)", args.host, port)
+    await asyncio.Event().wait()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s [%(name)s] %(message)s")
+    ap = argparse.ArgumentParser(description="Local Pushover/webhook stub for the alert fanout")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8199)
+    ap.add_argument("--fail-rate", type=float, default=0.0, help="fraction of sends answered with 503")
+    ap.add_argument("--status-429-every", type=int, default=0, help="answer every Nth send with 429")
+    ap.add_argument("--delay-s", type=float, default=0.0, help="latency added to every response")
+    try:
+        asyncio.run(_main(ap.parse_args()))
+    except KeyboardInterrupt:
+        pass
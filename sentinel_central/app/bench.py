@@ -0,0 +1,256 @@
+"""
+Microbenchmarks for the per-event CPU cost of the central hot path.
+
+    python -m app.bench                        # run, compare with the stored baseline
+    python -m app.bench --only pgvector        # substring filter on case names
+    python -m app.bench --save                 # (re)write the baseline from this run
+    python -m pytest app/bench.py              # one test per case, fails on regression
+
+Each case is timed in isolation (best of BENCH_REPEAT runs of an auto-sized
+loop, like timeit) and reports ops/s plus, from tracemalloc, the bytes
+allocated per call (peak growth during the call) and the bytes still held
+after it (a leak shows up here). A case regresses when its ops/s drops, or its
+allocations per call grow, by more than BENCH_TOLERANCE relative to
+bench_baseline.json. Throughput is compared normalised by a fixed
+pure-Python reference loop timed interleaved with each case, which absorbs
+most CPU frequency / noisy-neighbour drift and machine differences; still,
+re-save the baseline on the machine that gates (CI runner).
+
+    case                                 ops/s    alloc B/call   retained B/call   vs baseline
+    par.validate                       86232.7            5968                 1   -2.1%
+"""
+import argparse
+import gc
+import json
+import os
+import pathlib
+import sys
+import time
+import tracemalloc
+from dataclasses import asdict, dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.common.resolve import Resolver
+from app.common.utils import from_pgvector_value, to_pgvector_literal, unit
+from app.envelope import pack_event
+from app.events import ATTR_ORDER, ParEventPayload, TtsEventPayload
+
+BENCH_BASELINE = os.getenv("BENCH_BASELINE", str(pathlib.Path(__file__).with_name("bench_baseline.json")))
+BENCH_TOLERANCE = float(os.getenv("BENCH_TOLERANCE", "0.30"))
+BENCH_MIN_TIME_S = float(os.getenv("BENCH_MIN_TIME_S", "0.2"))
+BENCH_REPEAT = int(os.getenv("BENCH_REPEAT", "5"))
+# allocation deltas below this are noise (interpreter caches, free lists)
+ALLOC_SLACK_BYTES = 1024
+
+
+# ---- inputs ----
+def _par_dict(rng: np.random.Generator, with_vec: bool = False) -> Dict[str, Any]:
+    d: Dict[str, Any] = {
+        "event_type": "appearance",
+        "track_id": "t-1042",
+        "location_id": "lobby",
+        "camera_id": "cam-3",
+        "edge_id": "edge-1",
+        "frame": 18231,
+        "bbox_ltrb": [412, 96, 530, 388],
+        "image_path": "/data/crops/cam-3/18231.jpg",
+        "embedding": [float(x) for x in unit(rng.standard_normal(512).astype(np.float32))],
+    }
+    if with_vec:
+        d["attributes_vec"] = [float(x) for x in rng.random(40)]
+    else:
+        d["attributes"] = [f"{name} ({score:.2f})" for name, score in zip(ATTR_ORDER[::3], rng.random(14))]
+    return d
+
+
+def _cases() -> Dict[str, Tuple[Callable[[], Any], int]]:
+    """name -> (callable, ops per call)."""
+    rng = np.random.default_rng(47)
+    raw = _par_dict(rng)
+    raw_vec = _par_dict(rng, with_vec=True)
+    par = ParEventPayload(**raw)
+    par_vec = ParEventPayload(**raw_vec)
+    tts_extra = dict(idf_name="idf-1", resolved_id="p_000042", resolved_at_ms=1_760_000_000_000,
+                     best_distance=0.18, second_distance=0.31, is_new_identity=False)
+    tts = TtsEventPayload(**par.model_dump(), **tts_extra)
+    vec = unit(rng.standard_normal(512).astype(np.float32))
+    literal = to_pgvector_literal(vec)
+    as_list = vec.tolist()
+
+    resolver = Resolver()
+    decisions = [
+        (f"p_{i}", float(best), float(best + gap) if i % 4 else None)
+        for i, (best, gap) in enumerate(zip(rng.uniform(0.1, 0.4, 1000), rng.uniform(0.0, 0.1, 1000)))
+    ]
+
+    def decide_batch() -> None:
+        decide = resolver.decide
+        for best_id, best, second in decisions:
+            decide(best_id, best, second)
+
+    return {
+        "par.validate": (lambda: ParEventPayload(**raw), 1),
+        "par.validate_vec": (lambda: ParEventPayload(**raw_vec), 1),
+        "par.parse_attributes": (par.parse_attributes, 1),
+        "par.parse_attributes_vec": (par_vec.parse_attributes, 1),
+        # as IDFusion._publish_tts builds it
+        "tts.construct": (lambda: TtsEventPayload(**par.model_dump(), **tts_extra), 1),
+        "envelope.pack_event": (lambda: pack_event("tts-event", tts.model_dump(), created_by="idf-1"), 1),
+        "pgvector.to_literal": (lambda: to_pgvector_literal(vec), 1),
+        "pgvector.from_str": (lambda: from_pgvector_value(literal), 1),
+        "pgvector.from_list": (lambda: from_pgvector_value(as_list), 1),
+        "resolver.decide": (decide_batch, len(decisions)),
+    }
+
+
+# ---- measurement ----
+def _reference() -> int:
+    # fixed interpreter work (dict/attr/call mix) that the hot-path code changes never touch
+    d: Dict[int, int] = {}
+    for i in range(200):
+        d[i & 31] = d.get(i & 31, 0) + i
+    return len(d)
+
+
+@dataclass
+class Result:
+    name: str
+    ops_per_s: float
+    ref_ops_per_s: float
+    alloc_bytes_per_call: float
+    retained_bytes_per_call: float
+
+
+def _autorange(fn: Callable[[], Any], min_time_s: float) -> int:
+    n = 1
+    while True:
+        t0 = time.perf_counter()
+        for _ in range(n):
+            fn()
+        if time.perf_counter() - t0 >= min_time_s / 5:
+            return max(1, int(n * (min_time_s / max(time.perf_counter() - t0, 1e-9))))
+        n *= 2
+
+
+def _allocations(fn: Callable[[], Any], calls: int = 50) -> Tuple[float, float]:
+    """(allocated, retained) bytes per call: peak growth during a call, and growth after it."""
+    peak = 0
+    tracemalloc.start()
+    try:
+        fn()                                                       # warm caches outside the window
+        start = tracemalloc.get_traced_memory()[0]
+        for _ in range(calls):
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+            fn()
+            peak += tracemalloc.get_traced_memory()[1] - before
+        retained = tracemalloc.get_traced_memory()[0] - start
+    finally:
+        tracemalloc.stop()
+    return peak / calls, max(0, retained) / calls
+
+
+def measure(name: str, fn: Callable[[], Any], ops_per_call: int = 1,
+            min_time_s: float = BENCH_MIN_TIME_S, repeat: int = BENCH_REPEAT) -> Result:
+    fn()
+    n = _autorange(fn, min_time_s)
+    n_ref = _autorange(_reference, min_time_s / 4)
+    best = best_ref = float("inf")
+    gc_was_enabled = gc.isenabled()
+    gc.disable()                                                   # collections add noise, not signal
+    try:
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            for _ in range(n_ref):
+                _reference()
+            t1 = time.perf_counter()
+            for _ in range(n):
+                fn()
+            best_ref = min(best_ref, t1 - t0)
+            best = min(best, time.perf_counter() - t1)
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+    allocated, retained = _allocations(fn)
+    return Result(name, n * ops_per_call / best, n_ref / best_ref, allocated / ops_per_call, retained / ops_per_call)
+
+
+def run(only: Optional[str] = None) -> List[Result]:
+    return [measure(name, fn, ops) for name, (fn, ops) in _cases().items() if not only or only in name]
+
+
+# ---- baseline ----
+def load_baseline(path: str = BENCH_BASELINE) -> Dict[str, Dict[str, float]]:
+    try:
+        with open(path) as f:
+            return json.load(f)["cases"]
+    except FileNotFoundError:
+        return {}
+
+
+def save_baseline(results: List[Result], path: str = BENCH_BASELINE) -> None:
+    cases = load_baseline(path)
+    cases.update({r.name: {k: round(v, 2) for k, v in asdict(r).items() if k != "name"} for r in results})
+    doc = {"python": sys.version.split()[0], "saved_ms": int(time.time() * 1000), "cases": dict(sorted(cases.items()))}
+    with open(path, "w") as f:
+        json.dump(doc, f, indent=2)
+        f.write("\n")
+
+
+def relative_speed(r: Result, base: Dict[str, float]) -> float:
+    """Throughput vs baseline, normalised by the reference loop measured alongside each."""
+    return (r.ops_per_s / r.ref_ops_per_s) / (base["ops_per_s"] / base["ref_ops_per_s"])
+
+
+def regressions(r: Result, base: Optional[Dict[str, float]], tolerance: float = BENCH_TOLERANCE) -> List[str]:
+    """Human-readable regressions of r against its baseline entry (empty when within tolerance)."""
+    if not base:
+        return []
+    out = []
+    speed = relative_speed(r, base)
+    if speed < 1 - tolerance:
+        out.append(f"{r.name}: {r.ops_per_s:.1f} ops/s, {speed:.2f}x baseline {base['ops_per_s']:.1f} (reference-normalised)")
+    for key in ("alloc_bytes_per_call", "retained_bytes_per_call"):
+        if getattr(r, key) > base[key] * (1 + tolerance) + ALLOC_SLACK_BYTES:
+            out.append(f"{r.name}: {key}={getattr(r, key):.0f} vs baseline {base[key]:.0f}")
+    return out
+
+
+# ---- pytest entry: python -m pytest app/bench.py ----
+def pytest_generate_tests(metafunc) -> None:
+    if "case" in metafunc.fixturenames:
+        metafunc.parametrize("case", list(_cases()))
+
+
+def test_no_regression(case: str) -> None:
+    fn, ops = _cases()[case]
+    result = measure(case, fn, ops)
+    problems = regressions(result, load_baseline().get(case))
+    assert not problems, "; ".join(problems)
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Microbenchmarks of the central per-event hot path")
+    ap.add_argument("--only", help="run cases whose name contains this")
+    ap.add_argument("--baseline", default=BENCH_BASELINE)
+    ap.add_argument("--tolerance", type=float, default=BENCH_TOLERANCE)
+    ap.add_argument("--save", action="store_true", help="write this run into the baseline file")
+    args = ap.parse_args()
+
+    baseline = load_baseline(args.baseline)
+    failed: List[str] = []
+    print(f"{'case':<28}{'ops/s':>14}{'alloc B/call':>16}{'retained B/call':>18}   vs baseline")
+    for r in run(args.only):
+        base = baseline.get(r.name)
+        delta = f"{(relative_speed(r, base) - 1) * 100:+.1f}%" if base else "-"
+        print(f"{r.name:<28}{r.ops_per_s:>14.1f}{r.alloc_bytes_per_call:>16.0f}{r.retained_bytes_per_call:>18.0f}   {delta}")
+        failed += regressions(r, base, args.tolerance)
+        if args.save:
+            save_baseline([r], args.baseline)
+    if args.save:
+        print(f"baseline written to {args.baseline}")
+    elif failed:
+        print("\nREGRESSIONS (tolerance {:.0%}):\n  ".format(args.tolerance) + "\n  ".join(failed))
+        sys.exit(1)
@@ -0,0 +1,71 @@
+"""
+Content-addressed local object store for claim-check envelopes.
+
+Producers put the image bytes here and send only the reference
+("blob://sha256/<hex>.<ext>") on the bus; central resolves it to a file path
+when it needs the image, so brokers never carry the bytes.
+"""
+import base64
+import hashlib
+import os
+import pathlib
+import re
+from typing import Any, Dict, Optional
+
+import logging
+log = logging.getLogger(__name__)
+
+MEDIA_ROOT = os.getenv("MEDIA_ROOT", "D:/app/sentinel-central/")
+BLOB_ROOT = os.getenv("BLOB_ROOT", str(pathlib.Path(MEDIA_ROOT) / "blobs"))
+# producers (and HTTP ingest) swap image_b64 for image_ref when enabled
+CLAIM_CHECK = os.getenv("AD_IMAGE_CLAIM_CHECK", "0").lower() in ("1", "true", "yes")
+
+_REF_RE = re.compile(r"^blob://sha256/(?P<digest>[0-9a-f]{64})\.(?P<ext>[A-Za-z0-9]{1,8})$")
+
+
+class LocalBlobStore:
+    def __init__(self, root: str = BLOB_ROOT):
+        self.root = pathlib.Path(root)
+
+    def _path(self, digest: str, ext: str) -> pathlib.Path:
+        return self.root / digest[:2] / digest[2:4] / f"{digest}.{ext}"
+
+    def put(self, data: bytes, ext: str = "jpg") -> str:
+        """Store bytes (idempotent: same content -> same reference)."""
+        ext = (ext or "jpg").lstrip(".").lower()
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._path(digest, ext)
+        if not path.exists():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        return f"blob://sha256/{digest}.{ext}"
+
+    def path(self, ref: str) -> pathlib.Path:
+        m = _REF_RE.match(ref or "")
+        if not m:
+            raise ValueError(f"Invalid blob reference: {ref!r}")
+        return self._path(m.group("digest"), m.group("ext").lower())
+
+    def exists(self, ref: str) -> bool:
+        try:
+            return self.path(ref).is_file()
+        except ValueError:
+            return False
+
+    def get(self, ref: str) -> bytes:
+        return self.path(ref).read_bytes()
+
+
+def to_claim_check(payload: Dict[str, Any], store: Optional[LocalBlobStore] = None) -> Dict[str, Any]:
+    """Producer side: replace an inline image_b64 with an image_ref into the store."""
+    img_b64 = payload.get("image_b64")
+    if not img_b64:
+        return payload
+    store = store or LocalBlobStore()
+    ref = store.put(base64.b64decode(img_b64, validate=True), payload.get("ext") or "jpg")
+    out = {k: v for k, v in payload.items() if k != "image_b64"}
+    out["image_ref"] = ref
+    return out
@@ -0,0 +1,185 @@
+import os
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.common.snapshot import GallerySnapshot, load_snapshot
+from app.common.utils import from_pgvector_value, unit
+
+import logging
+log = logging.getLogger(__name__)
+
+EMB_DIM = 512
+
+# identities seen within this horizon live in the hot tier (0 disables the tier)
+HOT_HORIZON_MS = int(os.getenv("IDF_HOT_HORIZON_MS", str(30 * 60 * 1000)))
+HOT_MAX_SIZE = int(os.getenv("IDF_HOT_MAX_SIZE", "50000"))
+# demotion sweep runs at most this often (ms of event time)
+HOT_EVICT_EVERY_MS = int(os.getenv("IDF_HOT_EVICT_EVERY_MS", "10000"))
+
+
+class HotGallery:
+    """
+    In-memory tier of recently seen identities (by last_seen_ms).
+
+    Rows live in a preallocated float32 matrix of unit vectors so a lookup is a
+    single mat-vec product over the hot set only; its cost depends on how many
+    identities were seen within the horizon, not on the size of `identities`.
+      - promote(): insert/refresh an identity after it was matched or created
+      - evict():   demote identities whose last_seen_ms fell out of the horizon
+    """
+    def __init__(self, horizon_ms: int = HOT_HORIZON_MS, max_size: int = HOT_MAX_SIZE,
+                 dim: int = EMB_DIM):
+        self.horizon_ms = horizon_ms
+        self.max_size = max_size
+        self.dim = dim
+        self._mat = np.zeros((1024, dim), dtype=np.float32)
+        self._last_seen = np.zeros(1024, dtype=np.int64)
+        self._ids: List[str] = []
+        self._row: Dict[str, int] = {}
+        self._loaded = False
+        self._last_evict_ms = 0
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def __contains__(self, rid: str) -> bool:
+        return rid in self._row
+
+    @property
+    def enabled(self) -> bool:
+        return self.horizon_ms > 0
+
+    def _grow(self) -> None:
+        cap = self._mat.shape[0] * 2
+        mat = np.zeros((cap, self.dim), dtype=np.float32)
+        mat[: len(self._ids)] = self._mat[: len(self._ids)]
+        seen = np.zeros(cap, dtype=np.int64)
+        seen[: len(self._ids)] = self._last_seen[: len(self._ids)]
+        self._mat, self._last_seen = mat, seen
+
+    def _remove_row(self, i: int) -> None:
+        last = len(self._ids) - 1
+        rid = self._ids[i]
+        if i != last:
+            # swap the tail row into the hole to keep the matrix dense
+            tail = self._ids[last]
+            self._mat[i] = self._mat[last]
+            self._last_seen[i] = self._last_seen[last]
+            self._ids[i] = tail
+            self._row[tail] = i
+        self._ids.pop()
+        del self._row[rid]
+
+    def promote(self, rid: str, emb: np.ndarray, last_seen_ms: int) -> None:
+        i = self._row.get(rid)
+        if i is None:
+            if len(self._ids) >= self.max_size:
+                # full: demote the least recently seen identity
+                self._remove_row(int(np.argmin(self._last_seen[: len(self._ids)])))
+            if len(self._ids) == self._mat.shape[0]:
+                self._grow()
+            i = len(self._ids)
+            self._ids.append(rid)
+            self._row[rid] = i
+            self._last_seen[i] = int(last_seen_ms)
+        else:
+            self._last_seen[i] = max(int(self._last_seen[i]), int(last_seen_ms))
+        self._mat[i] = unit(np.asarray(emb, dtype=np.float32))
+
+    def demote(self, rid: str) -> None:
+        i = self._row.get(rid)
+        if i is not None:
+            self._remove_row(i)
+
+    def evict(self, now_ms: int) -> int:
+        """Drop identities not seen within the horizon. Returns number demoted."""
+        self._last_evict_ms = now_ms
+        n = len(self._ids)
+        if n == 0:
+            return 0
+        stale = np.nonzero(self._last_seen[:n] < now_ms - self.horizon_ms)[0]
+        # remove from the back: the tail row swapped into a hole is then never stale
+        for i in sorted(stale.tolist(), reverse=True):
+            self._remove_row(i)
+        if len(stale):
+            log.debug("HotGallery demoted %d identities (size=%d)", len(stale), len(self._ids))
+        return int(len(stale))
+
+    def maybe_evict(self, now_ms: int) -> None:
+        if now_ms - self._last_evict_ms >= HOT_EVICT_EVERY_MS:
+            self.evict(now_ms)
+
+    def search(self, qvec: np.ndarray, k: int = 2) -> List[Tuple[str, float]]:
+        """Top-k (id, cosine distance) over the hot tier; qvec must be unit-norm."""
+        n = len(self._ids)
+        if n == 0:
+            return []
+        dist = 1.0 - self._mat[:n] @ qvec.astype(np.float32, copy=False)
+        k = min(k, n)
+        idx = np.argpartition(dist, k - 1)[:k] if n > k else np.arange(n)
+        idx = idx[np.argsort(dist[idx])]
+        return [(self._ids[i], float(dist[i])) for i in idx]
+
+    def search_many(self, queries: np.ndarray, k: int = 2, chunk: int = 256) -> List[List[Tuple[str, float]]]:
+        """search() for each row of a (B, dim) matrix of unit vectors, one mat-mat product per chunk."""
+        n = len(self._ids)
+        if n == 0:
+            return [[] for _ in range(len(queries))]
+        k = min(k, n)
+        out: List[List[Tuple[str, float]]] = []
+        mat = self._mat[:n]
+        for lo in range(0, len(queries), chunk):
+            # chunked so the (chunk, n) distance block stays small for large galleries
+            dist = 1.0 - queries[lo:lo + chunk].astype(np.float32, copy=False) @ mat.T
+            idx = np.argpartition(dist, k - 1, axis=1)[:, :k] if n > k else np.tile(np.arange(n), (len(dist), 1))
+            top = np.take_along_axis(dist, idx, axis=1)
+            order = np.argsort(top, axis=1)
+            idx, top = np.take_along_axis(idx, order, axis=1), np.take_along_axis(top, order, axis=1)
+            out.extend([(self._ids[i], float(d)) for i, d in zip(ri, rd)] for ri, rd in zip(idx, top))
+        return out
+
+    def embedding(self, rid: str) -> Optional[np.ndarray]:
+        i = self._row.get(rid)
+        return None if i is None else self._mat[i].copy()
+
+    def warm_from_snapshot(self, snap: GallerySnapshot, now_ms: int) -> int:
+        """Copy the hot rows (last_seen within the horizon) out of a mmapped snapshot."""
+        idx = np.nonzero(np.asarray(snap.last_seen) >= now_ms - self.horizon_ms)[0]
+        if len(idx) > self.max_size:
+            idx = idx[np.argsort(np.asarray(snap.last_seen)[idx])[-self.max_size:]]
+        for i in idx.tolist():
+            self.promote(str(snap.ids[i]), snap.emb[i], int(snap.last_seen[i]))
+        return int(len(idx))
+
+    async def ensure_loaded(self, s: AsyncSession, now_ms: int) -> None:
+        """
+        Warm the hot tier once. With a gallery snapshot on disk only the rows
+        changed after its watermark are read from Postgres; otherwise all
+        identities seen within the horizon are.
+        """
+        if self._loaded:
+            return
+        self._loaded = True
+        since = now_ms - self.horizon_ms
+        snap = load_snapshot()
+        if snap is not None:
+            from_snapshot = self.warm_from_snapshot(snap, now_ms)
+            since = max(since, snap.replay_from_ms)
+            log.info("HotGallery: %d identities from snapshot %s", from_snapshot, snap.path)
+        rows = (await s.execute(
+            text("""
+                SELECT id, embedding, last_seen_ms
+                FROM identities
+                WHERE last_seen_ms >= :since
+                ORDER BY last_seen_ms DESC
+                LIMIT :cap
+            """),
+            {"since": since, "cap": self.max_size}
+        )).all()
+        for rid, emb, seen in rows:
+            self.promote(rid, from_pgvector_value(emb), int(seen))
+        log.info("HotGallery warmed with %d identities (horizon=%dms, db rows=%d)",
+                 len(self), self.horizon_ms, len(rows))
@@ -1,9 +1,13 @@
 # services/common/repository.py
-from typing import Optional, Tuple, List, Dict, Any
-from sqlalchemy import text
+from typing import Optional, Tuple, List, Dict, Any, Sequence
+from sqlalchemy import text, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.ext.asyncio import AsyncSession
 import numpy as np
 
+from app.db import statements
+from app.db.models import ParEventORM
+
 def _check_unit_norm(v: np.ndarray, tol: float = 1e-3) -> bool:
     n = float(np.linalg.norm(v))
     return (1.0 - tol) <= n <= (1.0 + tol)
@@ -66,6 +70,30 @@ async def upsert_identity(
             {"id": resolved_id, "e": qvec.tolist(), "ts": ts_ms}
         )
 
+async def insert_par_events(s: AsyncSession, rows: Sequence[Dict[str, Any]]) -> List[Optional[int]]:
+    """
+    INSERT ... ON CONFLICT (cam_id, track_id, ts_ms) DO NOTHING RETURNING id.
+    Returns one id per input row, None where the row was a duplicate
+    (broker redelivery / edge retry), so callers can skip the resolver.
+    """
+    if not rows:
+        return []
+    stmt = (
+        pg_insert(ParEventORM)
+        .values(list(rows))
+        .on_conflict_do_nothing(index_elements=["cam_id", "track_id", "ts_ms"])
+        .returning(ParEventORM.id, ParEventORM.cam_id, ParEventORM.track_id, ParEventORM.ts_ms)
+    )
+    inserted = {(r.cam_id, r.track_id, r.ts_ms): r.id for r in (await s.execute(stmt)).all()}
+    return [inserted.get((r["cam_id"], r["track_id"], r["ts_ms"])) for r in rows]
+
+async def set_par_events_resolved(s: AsyncSession, ids: Sequence[Optional[int]], resolved_id: str) -> None:
+    ids = [i for i in ids if i is not None]
+    if ids:
+        await s.execute(
+            update(ParEventORM).where(ParEventORM.id.in_(ids)).values(resolved_id=resolved_id)
+        )
+
 def _new_identity_id(ts_ms: int) -> str:
     import uuid
     return f"id_{ts_ms}_{uuid.uuid4().hex[:8]}"
@@ -75,18 +103,10 @@ async def _get_tracking_info(s, resolved_id: Optional[str]) -> tuple[bool, Optio
     if not resolved_id:
         return (False, None)
 
-    res = await s.execute(text("""
-        SELECT is_tracked, annotation_name
-        FROM identities
-        WHERE id = :rid
-        LIMIT 1
-    """), {"rid": resolved_id})
-    row = res.first()
+    row = await statements.fetchrow(s, statements.TRACKING_INFO, rid=resolved_id)
     if not row:
         return (False, None)
 
-    is_tracked = bool(row[0])
-    name = row[1] if len(row) > 1 else None
-    return (is_tracked, name)
+    return (bool(row["is_tracked"]), row["annotation_name"])
 
 class ResolutionResult(Tuple[str, float, Optional[float]]): ...
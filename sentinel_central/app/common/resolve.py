@@ -1,11 +1,17 @@
-from typing import Optional, Tuple, List, Dict, Any
+import os
 import uuid
+from dataclasses import asdict, dataclass
+from typing import Optional, Tuple, List, Dict, Any
 import numpy as np
-from sqlalchemy import text
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.common.gallery import HotGallery
+from app.db import statements
 from app.common.utils import from_pgvector_value, to_pgvector_literal, unit
 
+import logging
+log = logging.getLogger(__name__)
+
 def _unit(v: np.ndarray) -> np.ndarray:
     v = v.astype(np.float32, copy=False)
     n = float(np.linalg.norm(v))
@@ -17,63 +23,121 @@ def _new_identity_id(ts_ms: int) -> str:
     return f"id_{ts_ms}_{uuid.uuid4().hex[:8]}"
 
 async def _nearest_identities(s, qvec: np.ndarray, k: int = 2):
-    rows = (await s.execute(
-        text("""
-            SELECT id, (embedding <=> (:q)::vector) AS distance
-            FROM identities
-            ORDER BY embedding <=> (:q)::vector
-            LIMIT :k
-        """),
-        {
-            "q": to_pgvector_literal(qvec),  # <-- string, not list
-            "k": k
-        }
-    )).mappings().all()
+    rows = await statements.fetch(
+        s, statements.NEAREST_IDENTITIES,
+        q=to_pgvector_literal(qvec),  # <-- string, not list
+        k=k,
+    )
     return [dict(r) for r in rows]
 
-async def _upsert_identity(s, rid: str, emb: np.ndarray, ts_ms: int, ema_alpha: float = 0.2) -> None:
+EMA_MAX_RETRIES = int(os.getenv("IDF_EMA_MAX_RETRIES", "5"))
+
+
+@dataclass
+class EmaStats:
+    """Optimistic-concurrency counters for identity EMA updates."""
+    updates: int = 0      # version-checked UPDATEs that applied
+    conflicts: int = 0    # UPDATEs that lost to a concurrent writer (re-read + retry)
+    exhausted: int = 0    # gave up after EMA_MAX_RETRIES; only last_seen/count were bumped
+
+    @property
+    def conflict_rate(self) -> float:
+        attempts = self.updates + self.conflicts
+        return self.conflicts / attempts if attempts else 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {**asdict(self), "conflict_rate": round(self.conflict_rate, 4)}
+
+
+async def _upsert_identity(s, rid: str, emb: np.ndarray, ts_ms: int, ema_alpha: float = 0.2,
+                           stats: Optional[EmaStats] = None) -> np.ndarray:
+    """
+    EMA-update (or insert) the canonical embedding; returns the stored vector.
+
+    Concurrent IDFusion workers may update the same identity: the write is
+    conditional on the version that was read (no row lock is held while the
+    EMA is computed), and a lost race re-reads and recomputes. count_events
+    and last_seen_ms are maintained in-DB so they never lose increments.
+    """
     emb = unit(emb)
+    stats = stats if stats is not None else EmaStats()
 
-    row = (await s.execute(
-        text("SELECT embedding, count_events FROM identities WHERE id = :id"),
-        {"id": rid}
-    )).mappings().first()
+    for _ in range(EMA_MAX_RETRIES + 1):
+        row = await statements.fetchrow(s, statements.IDENTITY_SELECT, id=rid)
+        if row is None:
+            break
 
-    if row:
         base = from_pgvector_value(row["embedding"])
         new_emb = unit((1.0 - ema_alpha) * base + ema_alpha * emb)
-        e_str = to_pgvector_literal(new_emb)
-        await s.execute(
-            text("""
-                UPDATE identities
-                SET embedding = (:e)::vector,
-                    last_seen_ms = :ts,
-                    count_events = :c
-                WHERE id = :id
-            """),
-            {"e": e_str, "ts": ts_ms, "c": int(row["count_events"]) + 1, "id": rid}
+        applied = await statements.fetchrow(
+            s, statements.IDENTITY_EMA_UPDATE,
+            e=to_pgvector_literal(new_emb), ts=ts_ms, id=rid, v=row["version"],
         )
+        if applied is not None:
+            stats.updates += 1
+            return new_emb
+        stats.conflicts += 1
     else:
-        e_str = to_pgvector_literal(emb)
-        await s.execute(
-            text("""
-                INSERT INTO identities (id, annotation_name, embedding, created_ms, last_seen_ms, count_events)
-                VALUES (:id, :anno_name, (:e)::vector, :ts, :ts, 1)
-            """),
-            {"id": rid, "anno_name": rid, "e": e_str, "ts": ts_ms}
-        )
-        
+        # persistent contention on one identity: keep the sample count, skip its EMA step
+        stats.exhausted += 1
+        log.warning("EMA update for %s lost %d races; embedding left unchanged", rid, EMA_MAX_RETRIES + 1)
+        await statements.execute(s, statements.IDENTITY_TOUCH, ts=ts_ms, id=rid)
+        return base
+
+    await statements.execute(
+        s, statements.IDENTITY_INSERT, id=rid, anno_name=rid, e=to_pgvector_literal(emb), ts=ts_ms
+    )
+    return emb
+
 class Resolver:
     """
     Decision policy:
       - If best ≤ tau_same  -> match best_id
       - Else if best ≤ tau_ambig and (second - best) ≥ delta_min -> match best_id
       - Else -> NEW ID
+
+    With a HotGallery attached, candidates come from the hot tier first; the cold
+    gallery (pgvector over all `identities`) is skipped only when the hot tier's
+    best match is within tau_same. Otherwise the two top-2 lists are merged, so
+    the ambiguity margin is measured against the whole gallery.
     """
-    def __init__(self, tau_same: float = 0.22, tau_ambig: float = 0.30, delta_min: float = 0.05):
+    def __init__(self, tau_same: float = 0.22, tau_ambig: float = 0.30, delta_min: float = 0.05,
+                 gallery: Optional[HotGallery] = None):
         self.tau_same = tau_same
         self.tau_ambig = tau_ambig
         self.delta_min = delta_min
+        self.gallery = gallery if gallery is not None and gallery.enabled else None
+        self.hot_hits = 0
+        self.cold_lookups = 0
+        self.ema = EmaStats()
+
+    def decide(self, best_id: Optional[str], best: float, second: Optional[float]) -> Optional[str]:
+        """Apply the decision policy; returns the matched id or None for a new identity."""
+        if best_id is None:
+            return None
+        if best <= self.tau_same:
+            return best_id
+        if best <= self.tau_ambig and (second is None or (second - best) >= self.delta_min):
+            return best_id
+        return None
+
+    async def _candidates(self, s: AsyncSession, qvec: np.ndarray, ts_ms: int) -> List[Dict[str, Any]]:
+        if self.gallery is not None:
+            await self.gallery.ensure_loaded(s, ts_ms)
+            self.gallery.maybe_evict(ts_ms)
+            hot = [{"id": rid, "distance": d} for rid, d in self.gallery.search(qvec, k=2)]
+            if hot and hot[0]["distance"] <= self.tau_same:
+                self.hot_hits += 1
+                return hot
+        else:
+            hot = []
+        self.cold_lookups += 1
+        cold = await _nearest_identities(s, qvec, k=2)
+        # an identity can be in both tiers; keep its closest distance once
+        merged: Dict[str, Dict[str, Any]] = {}
+        for c in sorted(hot + list(cold), key=lambda c: float(c["distance"])):
+            merged.setdefault(c["id"], c)
+        return list(merged.values())[:2]
 
     async def resolve(self, s: AsyncSession, qvec: np.ndarray, ts_ms: int) -> Tuple[str, float, Optional[float], bool]:
         """
@@ -81,25 +145,25 @@ class Resolver:
         """
         qvec = _unit(qvec)
 
-        top = await _nearest_identities(s, qvec, k=2)
+        top = await self._candidates(s, qvec, ts_ms)
         if not top:
             rid = _new_identity_id(ts_ms)
-            await _upsert_identity(s, rid, qvec, ts_ms)
+            stored = await _upsert_identity(s, rid, qvec, ts_ms, stats=self.ema)
+            self._promote(rid, stored, ts_ms)
             return rid, 1.0, None, True
 
         best = float(top[0]["distance"])
         second = float(top[1]["distance"]) if len(top) > 1 else None
-        best_id = top[0]["id"]
 
-        if best <= self.tau_same:
-            rid = best_id
-            is_new = False
-        elif best <= self.tau_ambig and (second is None or (second - best) >= self.delta_min):
-            rid = best_id
-            is_new = False
-        else:
+        rid = self.decide(top[0]["id"], best, second)
+        is_new = rid is None
+        if is_new:
             rid = _new_identity_id(ts_ms)
-            is_new = True
 
-        await _upsert_identity(s, rid, qvec, ts_ms)
+        stored = await _upsert_identity(s, rid, qvec, ts_ms, stats=self.ema)
+        self._promote(rid, stored, ts_ms)
         return rid, best, second, is_new
+
+    def _promote(self, rid: str, emb: np.ndarray, ts_ms: int) -> None:
+        if self.gallery is not None:
+            self.gallery.promote(rid, emb, ts_ms)
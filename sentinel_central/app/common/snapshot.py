@@ -0,0 +1,178 @@
+"""
+Memory-mapped snapshots of the identity gallery.
+
+Layout (one directory per snapshot, CURRENT points at the latest):
+    <SNAPSHOT_DIR>/CURRENT                 -> "<watermark>-<created_ms>"
+    <SNAPSHOT_DIR>/<name>/emb.npy          float32 [N, 512], unit vectors
+    <SNAPSHOT_DIR>/<name>/ids.npy          <U128 [N]
+    <SNAPSHOT_DIR>/<name>/seen.npy         int64 [N] last_seen_ms
+    <SNAPSHOT_DIR>/<name>/meta.json        {"watermark", "count", "dim", "created_ms"}
+
+A written snapshot directory is never modified; each write gets a new name and
+only directories CURRENT no longer points at are pruned, so a reader that has
+the arrays mapped keeps valid files.
+
+Workers open the arrays with mmap_mode="r" (pages are shared between processes
+through the page cache) and replay only identities with last_seen_ms after the
+watermark from Postgres.
+
+Run periodically:  python -m app.common.snapshot --every 300
+"""
+import argparse
+import asyncio
+import json
+import os
+import pathlib
+import shutil
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+import numpy as np
+from sqlalchemy import text
+
+from app.common.utils import from_pgvector_value, unit
+
+import logging
+log = logging.getLogger(__name__)
+
+SNAPSHOT_DIR = os.getenv("IDF_SNAPSHOT_DIR", "")
+# deltas are replayed from (watermark - slack) to cover late, out-of-order events
+SNAPSHOT_DELTA_SLACK_MS = int(os.getenv("IDF_SNAPSHOT_DELTA_SLACK_MS", "60000"))
+SNAPSHOT_KEEP = int(os.getenv("IDF_SNAPSHOT_KEEP", "2"))
+EMB_DIM = 512
+
+
+@dataclass
+class GallerySnapshot:
+    ids: np.ndarray          # <U128 [N] (mmap)
+    emb: np.ndarray          # float32 [N, dim] (mmap, read-only)
+    last_seen: np.ndarray    # int64 [N] (mmap)
+    watermark: int
+    path: pathlib.Path
+
+    def __len__(self) -> int:
+        return int(self.emb.shape[0])
+
+    @property
+    def replay_from_ms(self) -> int:
+        return self.watermark - SNAPSHOT_DELTA_SLACK_MS
+
+
+def load_snapshot(snap_dir: str = SNAPSHOT_DIR) -> Optional[GallerySnapshot]:
+    """Open the latest snapshot read-only (memory-mapped); None if there is none."""
+    if not snap_dir:
+        return None
+    root = pathlib.Path(snap_dir)
+    try:
+        current = (root / "CURRENT").read_text().strip()
+        folder = root / current
+        meta = json.loads((folder / "meta.json").read_text())
+        return GallerySnapshot(
+            ids=np.load(folder / "ids.npy", mmap_mode="r"),
+            emb=np.load(folder / "emb.npy", mmap_mode="r"),
+            last_seen=np.load(folder / "seen.npy", mmap_mode="r"),
+            watermark=int(meta["watermark"]),
+            path=folder,
+        )
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        log.warning("Ignoring unreadable gallery snapshot in %s: %s", snap_dir, e)
+        return None
+
+
+async def write_snapshot(snap_dir: str = SNAPSHOT_DIR, batch: int = 2000) -> Optional[GallerySnapshot]:
+    """
+    Stream `identities` with a server-side cursor into a new snapshot directory.
+    Count and stream run in one REPEATABLE READ transaction so they agree.
+    """
+    from app.db.db import engine
+    from app.envelope import now_ms
+
+    root = pathlib.Path(snap_dir)
+    root.mkdir(parents=True, exist_ok=True)
+    tmp = root / f".tmp-{os.getpid()}-{now_ms()}"
+    tmp.mkdir()
+
+    async with engine.connect() as conn:
+        conn = await conn.execution_options(isolation_level="REPEATABLE READ")
+        async with conn.begin():
+            n = int((await conn.execute(text("SELECT count(*) FROM identities"))).scalar_one())
+            emb = np.lib.format.open_memmap(tmp / "emb.npy", mode="w+", dtype=np.float32, shape=(n, EMB_DIM))
+            seen = np.lib.format.open_memmap(tmp / "seen.npy", mode="w+", dtype=np.int64, shape=(n,))
+            ids = np.empty(n, dtype="<U128")
+
+            result = await conn.stream(
+                text("SELECT id, embedding, last_seen_ms FROM identities ORDER BY last_seen_ms"),
+                execution_options={"yield_per": batch},
+            )
+            i = 0
+            async for rid, e, ts in result:
+                if i >= n:
+                    break
+                ids[i] = rid
+                emb[i] = unit(from_pgvector_value(e))
+                seen[i] = int(ts)
+                i += 1
+
+    watermark = int(seen.max()) if n else 0
+    emb.flush()
+    seen.flush()
+    del emb, seen
+    np.save(tmp / "ids.npy", ids)
+    created_ms = now_ms()
+    (tmp / "meta.json").write_text(json.dumps(
+        {"watermark": watermark, "count": n, "dim": EMB_DIM, "created_ms": created_ms}
+    ))
+
+    # a unique name: an idle period repeats the watermark, and the live snapshot must stay intact
+    final = root / f"{watermark}-{created_ms}"
+    tmp.rename(final)
+    # atomically flip CURRENT so readers never see a half-written snapshot
+    pointer = root / f".CURRENT-{os.getpid()}"
+    pointer.write_text(final.name)
+    os.replace(pointer, root / "CURRENT")
+    _prune(root, keep=SNAPSHOT_KEEP)
+    log.info("Wrote gallery snapshot: %d identities, watermark=%d -> %s", n, watermark, final)
+    return load_snapshot(snap_dir)
+
+
+def _snapshot_order(p: pathlib.Path) -> Optional[Tuple[int, int]]:
+    """(created_ms, watermark) of a snapshot directory name; None for anything else."""
+    parts = p.name.split("-")
+    if not p.is_dir() or len(parts) > 2 or not all(x.isdigit() for x in parts):
+        return None
+    # pre-created_ms layouts were named by watermark alone
+    return (int(parts[1]), int(parts[0])) if len(parts) == 2 else (0, int(parts[0]))
+
+
+def _prune(root: pathlib.Path, keep: int) -> None:
+    try:
+        current = (root / "CURRENT").read_text().strip()
+    except FileNotFoundError:
+        current = None
+    snaps = sorted((p for p in root.iterdir() if _snapshot_order(p) is not None), key=_snapshot_order)
+    for old in snaps[:-keep] if keep > 0 else []:
+        if old.name != current:
+            shutil.rmtree(old, ignore_errors=True)
+
+
+async def snapshot_loop(every_s: float, snap_dir: str = SNAPSHOT_DIR) -> None:
+    while True:
+        try:
+            await write_snapshot(snap_dir)
+        except Exception as e:
+            log.exception("Gallery snapshot failed: %s", e)
+        await asyncio.sleep(every_s)
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Write identity gallery snapshots")
+    ap.add_argument("--dir", default=SNAPSHOT_DIR or "./gallery-snapshots")
+    ap.add_argument("--every", type=float, default=0, help="repeat every N seconds (0 = once)")
+    args = ap.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s [%(name)s] %(message)s")
+    if args.every > 0:
+        asyncio.run(snapshot_loop(args.every, args.dir))
+    else:
+        asyncio.run(write_snapshot(args.dir))
@@ -0,0 +1,94 @@
+"""
+Statements/s for the hot-path statements: text() vs the prepared registry.
+
+    DB_URL=postgresql+asyncpg://... python -m app.db.bench_statements [--n 2000] [--identities 2000]
+
+Seeds a scratch identity gallery and person_sessions rows inside a transaction
+that is rolled back at the end, so it can run against a dev database.
+Prints one line per statement and mode, e.g.
+
+    identity.nearest         text       812.4 stmt/s
+    identity.nearest         prepared   951.0 stmt/s   (+17.1%)
+"""
+import argparse
+import asyncio
+import time
+from typing import Any, Callable, Dict, List, Tuple
+
+import numpy as np
+from sqlalchemy import text
+
+from app.common.utils import to_pgvector_literal, unit
+from app.db import statements
+from app.db.db import SessionLocal
+
+DIM = 512
+
+
+def _vec(rng: np.random.Generator) -> str:
+    return to_pgvector_literal(unit(rng.standard_normal(DIM).astype(np.float32)))
+
+
+def _cases(rng: np.random.Generator, ids: List[str]) -> List[Tuple[statements.Statement, Callable[[int], Dict[str, Any]]]]:
+    q = _vec(rng)
+    return [
+        (statements.NEAREST_IDENTITIES, lambda i: {"q": q, "k": 2}),
+        (statements.IDENTITY_SELECT, lambda i: {"id": ids[i % len(ids)]}),
+        (statements.TRACKING_INFO, lambda i: {"rid": ids[i % len(ids)]}),
+        (statements.IDENTITY_TOUCH, lambda i: {"id": ids[i % len(ids)], "ts": 2_000_000_000_000 + i}),
+        (statements.SESSION_OPEN, lambda i: {
+            "id": f"bench_s_{i}", "rid": ids[i % len(ids)], "tid": f"bench_t_{i % 50}", "loc": "bench",
+            "cam": "bench_cam", "ts": 2_000_000_000_000 + i, "attrs": None, "anames": None,
+            "scores": None, "mask": None, "emb": None, "img": None,
+        }),
+        (statements.SESSION_CLOSE, lambda i: {
+            "tid": f"bench_t_{i % 50}", "loc": "bench", "cam": "bench_cam", "ts": 2_000_000_000_000 + i,
+        }),
+    ]
+
+
+async def _rate(fn: Callable[[int], Any], n: int) -> float:
+    for i in range(min(50, n)):         # warm-up: first-use prepare, planner caches
+        await fn(i)
+    t0 = time.perf_counter()
+    for i in range(n):
+        await fn(i)
+    return n / (time.perf_counter() - t0)
+
+
+async def run(n: int, identities: int) -> None:
+    rng = np.random.default_rng(7)
+    ids = [f"bench_id_{i}" for i in range(identities)]
+    async with SessionLocal() as s:
+        await s.execute(
+            text("""
+                INSERT INTO identities (id, annotation_name, embedding, created_ms, last_seen_ms, count_events)
+                VALUES (:id, :id, (:e)::vector, 0, 0, 1)
+            """),
+            [{"id": rid, "e": _vec(rng)} for rid in ids],
+        )
+        try:
+            for stmt, params in _cases(rng, ids):
+                async def via_text(i: int) -> None:
+                    result = await s.execute(stmt.clause, params(i))
+                    if result.returns_rows:
+                        result.all()
+
+                async def via_prepared(i: int) -> None:
+                    await statements.fetch(s, stmt, **params(i))
+
+                base = await _rate(via_text, n)
+                prepared = await _rate(via_prepared, n)
+                print(f"{stmt.name:<24} text     {base:9.1f} stmt/s")
+                print(f"{stmt.name:<24} prepared {prepared:9.1f} stmt/s   ({(prepared / base - 1) * 100:+.1f}%)")
+            print(f"registry: {statements.stats.as_dict()}")
+        finally:
+            await s.rollback()
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Benchmark prepared hot-path statements against text()")
+    ap.add_argument("--n", type=int, default=2000, help="executions per statement and mode")
+    ap.add_argument("--identities", type=int, default=2000, help="scratch gallery size")
+    args = ap.parse_args()
+    asyncio.run(run(args.n, args.identities))
@@ -1,10 +1,68 @@
 import asyncio
+from sqlalchemy import text
 from app.db.db import engine
 from app.db.models import Base
 
+# Idempotent upgrades for databases created before a column/index existed
+# (create_all only creates missing tables, not new columns or indexes).
+SCHEMA_UPGRADES = [
+    # identities (created outside the ORM): row version for optimistic EMA updates
+    "ALTER TABLE IF EXISTS identities ADD COLUMN IF NOT EXISTS version BIGINT NOT NULL DEFAULT 0",
+    # person_sessions: activity timestamp + one open session per track/location/camera
+    "ALTER TABLE person_sessions ADD COLUMN IF NOT EXISTS last_seen_ms BIGINT",
+    """
+    UPDATE person_sessions ps SET disappear_ms = COALESCE(ps.last_seen_ms, ps.appear_ms)
+    FROM (
+        SELECT session_id, row_number() OVER (
+            PARTITION BY track_id, location_id, camera_id ORDER BY appear_ms DESC, session_id DESC
+        ) AS rn
+        FROM person_sessions WHERE disappear_ms IS NULL
+    ) dup
+    WHERE ps.session_id = dup.session_id AND dup.rn > 1
+    """,
+    """
+    CREATE UNIQUE INDEX IF NOT EXISTS uq_ps_active_track_loc_cam
+    ON person_sessions (track_id, location_id, camera_id) NULLS NOT DISTINCT
+    WHERE disappear_ms IS NULL
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS ix_ps_active_last_seen
+    ON person_sessions ((COALESCE(last_seen_ms, appear_ms)))
+    WHERE disappear_ms IS NULL
+    """,
+    # person_sessions: thresholded attributes as a bitmask (bit i = ATTR_ORDER[i], score >= 0.5)
+    "ALTER TABLE person_sessions ADD COLUMN IF NOT EXISTS attr_mask BIGINT",
+    """
+    UPDATE person_sessions SET attr_mask = (
+        SELECT COALESCE(sum(1::bigint << (i - 1)::int), 0)::bigint
+        FROM unnest(attr_scores::real[]) WITH ORDINALITY AS u(v, i)
+        WHERE v >= 0.5
+    )
+    WHERE attr_mask IS NULL AND attr_scores IS NOT NULL
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_ps_loc_appear ON person_sessions (location_id, appear_ms)",
+    # person_sessions: presence interval [appear_ms, disappear_ms]; open sessions are
+    # unbounded above. Overlap queries (who was present at/during) use the GiST index
+    # and must spell the expression as session_span(appear_ms, disappear_ms).
+    """
+    CREATE OR REPLACE FUNCTION session_span(appear bigint, disappear bigint) RETURNS int8range
+    LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $$
+        SELECT int8range(appear, CASE WHEN disappear IS NULL THEN NULL ELSE GREATEST(disappear, appear) END, '[]')
+    $$
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS ix_ps_span_gist
+    ON person_sessions USING gist (session_span(appear_ms, disappear_ms))
+    """,
+    # par_events: time-window prefilter for similar-person search
+    "CREATE INDEX IF NOT EXISTS ix_par_ts_embedded ON par_events (ts_ms) WHERE embedding IS NOT NULL",
+]
+
 async def run():
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+        for ddl in SCHEMA_UPGRADES:
+            await conn.execute(text(ddl))
 
 if __name__ == "__main__":
     asyncio.run(run())
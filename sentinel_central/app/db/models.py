@@ -1,7 +1,7 @@
 from sqlalchemy.orm import Mapped, mapped_column, declarative_base
 from sqlalchemy import (
     BigInteger, String, Boolean, JSON, Text, Integer,
-    Index, UniqueConstraint, ARRAY, Enum as SQLEnum
+    Index, UniqueConstraint, ARRAY, Enum as SQLEnum, text
 )
 from pgvector.sqlalchemy import Vector
 
@@ -37,6 +37,8 @@ class ParEventORM(Base):
         Index("ix_par_cam_ts", "cam_id", "ts_ms"),
         Index("ix_par_edge_ts", "edge_id", "ts_ms"),
         Index("ix_par_loc_ts", "location_id", "ts_ms"),
+        # similar-person search prefilter: only rows that carry a vector
+        Index("ix_par_ts_embedded", "ts_ms", postgresql_where=text("embedding IS NOT NULL")),
         UniqueConstraint("cam_id", "track_id", "ts_ms", name="uq_par_cam_track_ts"),
     )
 
@@ -105,4 +107,25 @@ class PersonSessionORM(Base):
     attr_scores: Mapped[list | None] = mapped_column(Vector(40), nullable=True)
     attr_names: Mapped[list | None]  = mapped_column(JSON)        # list[str]
     embedding: Mapped[list | None]   = mapped_column(Vector(512), nullable=True)
-    image_path: Mapped[str | None]   = mapped_column(Text)
\ No newline at end of file
+    image_path: Mapped[str | None]   = mapped_column(Text)
+    last_seen_ms: Mapped[int | None] = mapped_column(BigInteger, nullable=True)  # latest Move-In refresh
+    attr_mask: Mapped[int | None]    = mapped_column(BigInteger, nullable=True)  # events.attr_mask(attr_scores)
+
+    __table_args__ = (
+        # at most one open session per track/location/camera; the move-in upsert targets it
+        Index(
+            "uq_ps_active_track_loc_cam", "track_id", "location_id", "camera_id",
+            unique=True,
+            postgresql_where=text("disappear_ms IS NULL"),
+            postgresql_nulls_not_distinct=True,
+        ),
+        # attribute / who-entered searches: location + time range, then the bitmask test
+        Index("ix_ps_loc_appear", "location_id", "appear_ms"),
+        # ix_ps_span_gist (GiST on session_span(appear_ms, disappear_ms)) depends on a SQL
+        # function and is created in migrate.SCHEMA_UPGRADES
+        # stale-session sweeper scans open sessions by last activity
+        Index(
+            "ix_ps_active_last_seen", text("COALESCE(last_seen_ms, appear_ms)"),
+            postgresql_where=text("disappear_ms IS NULL"),
+        ),
+    )
\ No newline at end of file
@@ -0,0 +1,232 @@
+"""
+Hot-path statements, declared once and run as prepared statements.
+
+Each statement is written with :named parameters (as for text()) and converted
+once to asyncpg's positional form. On an asyncpg-backed session the statement
+is prepared on first use per connection and the PreparedStatement is reused,
+skipping SQLAlchemy's per-call compilation, parameter processing and result
+wrapping. Other drivers (and sessions without a bind) run the same SQL via text().
+
+    rows = await fetch(s, NEAREST_IDENTITIES, q=to_pgvector_literal(v), k=2)
+
+The statements run on the session's connection inside its transaction, so they
+mix freely with ORM/text() statements in one unit of work.
+"""
+import os
+import re
+import weakref
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+
+import asyncpg
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql.elements import TextClause
+
+import logging
+log = logging.getLogger(__name__)
+
+# set to 0 to route everything through text() (e.g. behind a transaction-mode pgbouncer)
+DB_PREPARED_STATEMENTS = os.getenv("DB_PREPARED_STATEMENTS", "1").lower() in ("1", "true", "yes")
+
+# :name, but not the second colon of a ::cast or a literal such as 'HH24:MI'
+_PARAM = re.compile(r"(?<![:\w]):([A-Za-z_]\w*)")
+
+
+@dataclass(frozen=True)
+class Statement:
+    name: str
+    sql: str
+    positional: str = field(init=False, repr=False)
+    args: Tuple[str, ...] = field(init=False, repr=False)
+    clause: TextClause = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self) -> None:
+        order: Dict[str, int] = {}
+
+        def number(m: "re.Match[str]") -> str:
+            return f"${order.setdefault(m.group(1), len(order) + 1)}"
+
+        object.__setattr__(self, "positional", _PARAM.sub(number, self.sql))
+        object.__setattr__(self, "args", tuple(order))
+        object.__setattr__(self, "clause", text(self.sql))
+
+    def bind(self, params: Mapping[str, Any]) -> List[Any]:
+        try:
+            return [params[a] for a in self.args]
+        except KeyError as e:
+            raise TypeError(f"Statement {self.name!r} is missing parameter {e}") from None
+
+
+REGISTRY: Dict[str, Statement] = {}
+
+
+def declare(name: str, sql: str) -> Statement:
+    if name in REGISTRY:
+        raise ValueError(f"Statement {name!r} is already declared")
+    REGISTRY[name] = stmt = Statement(name, sql)
+    return stmt
+
+
+@dataclass
+class PreparedStats:
+    prepares: int = 0
+    hits: int = 0
+    fallbacks: int = 0      # executions routed through text()
+    retries: int = 0        # executions re-prepared after a plan invalidation
+
+    def as_dict(self) -> Dict[str, int]:
+        return {"prepares": self.prepares, "hits": self.hits, "fallbacks": self.fallbacks, "retries": self.retries}
+
+
+stats = PreparedStats()
+
+# asyncpg connection -> {statement name: PreparedStatement}; entries die with the connection
+_prepared: "weakref.WeakKeyDictionary[Any, Dict[str, Any]]" = weakref.WeakKeyDictionary()
+
+_BEGIN = text("SELECT 1")
+_STALE = (asyncpg.exceptions.InvalidCachedStatementError, asyncpg.exceptions.OutdatedSchemaCacheError)
+
+
+async def _prepared_for(s: AsyncSession, stmt: Statement) -> Optional[Tuple[Any, bool]]:
+    """
+    (PreparedStatement on this session's asyncpg connection, whether this call opened
+    the database transaction), or None to use text().
+    """
+    bind = getattr(s, "bind", None)
+    if not DB_PREPARED_STATEMENTS or bind is None or bind.dialect.driver != "asyncpg":
+        return None
+    conn = (await (await s.connection()).get_raw_connection()).driver_connection
+    # SQLAlchemy's adapter opens the asyncpg transaction lazily on its first
+    # statement; run one so this statement belongs to the session's transaction
+    began = not conn.is_in_transaction()
+    if began:
+        await s.execute(_BEGIN)
+    cache = _prepared.setdefault(conn, {})
+    ps = cache.get(stmt.name)
+    if ps is None:
+        ps = cache[stmt.name] = await conn.prepare(stmt.positional)
+        stats.prepares += 1
+    else:
+        stats.hits += 1
+    return ps, began
+
+
+def _rollback(sync_conn: Any) -> None:
+    sync_conn.connection.dbapi_connection.rollback()
+
+
+async def fetch(s: AsyncSession, stmt: Statement, **params: Any) -> List[Mapping[str, Any]]:
+    prepared = await _prepared_for(s, stmt)
+    if prepared is None:
+        stats.fallbacks += 1
+        return list((await s.execute(stmt.clause, params)).mappings().all())
+    ps, began = prepared
+    args = stmt.bind(params)
+    try:
+        return await ps.fetch(*args)
+    except _STALE:
+        # plan invalidated by DDL (e.g. a migration), which every connection's cache
+        # shares: drop them all so each statement is prepared afresh
+        _prepared.clear()
+        # the error aborts the transaction; it is only safe to start over when this
+        # statement opened it, so nothing else of the unit of work is lost
+        if not began:
+            raise
+    log.info("prepared statement %s invalidated; re-preparing", stmt.name)
+    await (await s.connection()).run_sync(_rollback)
+    conn = (await (await s.connection()).get_raw_connection()).driver_connection
+    await conn.reload_schema_state()
+    prepared = await _prepared_for(s, stmt)
+    assert prepared is not None
+    stats.retries += 1
+    return await prepared[0].fetch(*args)
+
+
+async def fetchrow(s: AsyncSession, stmt: Statement, **params: Any) -> Optional[Mapping[str, Any]]:
+    rows = await fetch(s, stmt, **params)
+    return rows[0] if rows else None
+
+
+async def execute(s: AsyncSession, stmt: Statement, **params: Any) -> None:
+    await fetch(s, stmt, **params)
+
+
+# ---------------------------------------------------------------------------
+# IDFusion: identity resolution
+# ---------------------------------------------------------------------------
+NEAREST_IDENTITIES = declare("identity.nearest", """
+    SELECT id, (embedding <=> (:q)::vector) AS distance
+    FROM identities
+    ORDER BY embedding <=> (:q)::vector
+    LIMIT :k
+""")
+
+IDENTITY_SELECT = declare("identity.select", """
+    SELECT embedding, version FROM identities WHERE id = :id
+""")
+
+IDENTITY_EMA_UPDATE = declare("identity.ema_update", """
+    UPDATE identities
+    SET embedding = (:e)::vector,
+        last_seen_ms = GREATEST(last_seen_ms, :ts),
+        count_events = count_events + 1,
+        version = version + 1
+    WHERE id = :id AND version = :v
+    RETURNING version
+""")
+
+IDENTITY_TOUCH = declare("identity.touch", """
+    UPDATE identities
+    SET last_seen_ms = GREATEST(last_seen_ms, :ts), count_events = count_events + 1
+    WHERE id = :id
+""")
+
+IDENTITY_INSERT = declare("identity.insert", """
+    INSERT INTO identities (id, annotation_name, embedding, created_ms, last_seen_ms, count_events)
+    VALUES (:id, :anno_name, (:e)::vector, :ts, :ts, 1)
+""")
+
+# ---------------------------------------------------------------------------
+# TTS: person sessions and tracking info
+# ---------------------------------------------------------------------------
+# one statement against uq_ps_active_track_loc_cam: open a session, or refresh the
+# active one (first image wins, newer vectors win, last_seen_ms moves forward)
+SESSION_OPEN = declare("session.open", """
+    INSERT INTO person_sessions (
+        id, resolved_id, track_id, location_id, camera_id, appear_ms, disappear_ms,
+        last_seen_ms, attributes, attr_names, attr_scores, attr_mask, embedding, image_path
+    )
+    VALUES (
+        :id, :rid, :tid, :loc, :cam, :ts, NULL,
+        :ts, CAST(:attrs AS jsonb), CAST(:anames AS jsonb),
+        CAST(:scores AS vector), CAST(:mask AS bigint), CAST(:emb AS vector), :img
+    )
+    ON CONFLICT (track_id, location_id, camera_id) WHERE disappear_ms IS NULL
+    DO UPDATE SET
+        image_path   = COALESCE(person_sessions.image_path, EXCLUDED.image_path),
+        attributes   = COALESCE(person_sessions.attributes, EXCLUDED.attributes),
+        attr_names   = COALESCE(person_sessions.attr_names, EXCLUDED.attr_names),
+        attr_scores  = COALESCE(EXCLUDED.attr_scores, person_sessions.attr_scores),
+        attr_mask    = COALESCE(EXCLUDED.attr_mask, person_sessions.attr_mask),
+        embedding    = COALESCE(EXCLUDED.embedding, person_sessions.embedding),
+        last_seen_ms = GREATEST(COALESCE(person_sessions.last_seen_ms, person_sessions.appear_ms),
+                                EXCLUDED.last_seen_ms)
+""")
+
+# plain equality on the key columns so the partial unique index serves the lookup
+SESSION_CLOSE = declare("session.close", """
+    UPDATE person_sessions
+    SET disappear_ms = :ts
+    WHERE track_id = :tid
+      AND location_id = :loc
+      AND camera_id = :cam
+      AND disappear_ms IS NULL
+""")
+
+TRACKING_INFO = declare("identity.tracking_info", """
+    SELECT is_tracked, annotation_name
+    FROM identities
+    WHERE id = :rid
+    LIMIT 1
+""")
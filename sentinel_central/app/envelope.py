@@ -1,4 +1,4 @@
-from typing import Any, Dict, Literal
+from typing import Any, Dict, Literal, Type, TypeVar
 from pydantic import BaseModel
 from time import time
 
@@ -18,3 +18,13 @@ def pack_event(event_type: Envelope.__annotations__['type'],
                version: int = 1) -> Dict[str, Any]:
     env = Envelope(type=event_type, version=version, ts_ms=now_ms(), created_by=created_by, payload=payload)
     return env.model_dump()
+
+
+P = TypeVar("P", bound=BaseModel)
+
+def unpack_payload(envelope: Dict[str, Any], model: Type[P]) -> P:
+    """Validated payload of an envelope; in-process transports already carry the model."""
+    payload = envelope["payload"]
+    if isinstance(payload, model):
+        return payload
+    return model(**payload)
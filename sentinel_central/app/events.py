@@ -20,9 +20,22 @@ ATTR_ORDER = [
 
 assert len(ATTR_ORDER) == 40
 ATTR_INDEX = {n: i for i, n in enumerate(ATTR_ORDER)}
+# attribute i (ATTR_ORDER) -> bit i of person_sessions.attr_mask when its score reaches this
+ATTR_MASK_THRESHOLD = 0.5
 _ATTR_RE = re.compile(r"^(?P<name>.+?)\s*\((?P<score>[-+]?\d*\.?\d+(?:[eE][-+]?\d+)?)\)\s*$")
 
 
+def attr_mask(scores: Optional[List[float]], threshold: float = ATTR_MASK_THRESHOLD) -> Optional[int]:
+    """Pack a 40-dim attr_scores vector into a bitmask (None when there are no scores)."""
+    if scores is None:
+        return None
+    mask = 0
+    for i, v in enumerate(scores[:len(ATTR_ORDER)]):
+        if v >= threshold:
+            mask |= 1 << i
+    return mask
+
+
 # Edge → Central
 class ParEventPayload(BaseModel):
     # core routing
@@ -116,6 +129,8 @@ class AdEventPayload(BaseModel):
 
     image_path: Optional[str] = None
     image_b64: Optional[str] = None
+    # claim-check: reference into the blob store instead of inline bytes
+    image_ref: Optional[str] = None
     ext: Optional[str] = None
 
     # timestamps (optional by default)
@@ -147,3 +162,16 @@ class MovementUpdatePayload(BaseModel):
     edge_id: str
     ts_ms: int
     track_id: Optional[str] = None
+
+
+# Anomaly alert for operator notification (RAN -> alert fanout)
+class AnomalyAlertPayload(BaseModel):
+    episode: str
+    phase: Literal["start", "end"]
+    incident: str = "anomaly"
+    confidence: float = 0.0
+    location_id: str
+    camera_id: str
+    ts_ms: int
+    ad_event_id: Optional[int] = None
+    duration_ms: Optional[int] = None
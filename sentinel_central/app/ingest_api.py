@@ -0,0 +1,219 @@
+"""
+HTTP batch ingest for edge sites that cannot hold a broker connection.
+
+    POST /ingest/par-events   -> IDFusion.handle_par_batch (same path as the bus worker)
+    POST /ingest/ad-events    -> RealtimeAlertNotification.handle_ad_event
+
+Body: a JSON array of envelopes, {"events": [...]}, or NDJSON (one envelope
+per line, Content-Type application/x-ndjson); optionally gzip-compressed
+(Content-Encoding: gzip). Every item gets its own result:
+
+    {"accepted": 95, "buffered": 3, "rejected": 2,
+     "results": [{"index": 0, "status": "accepted"},
+                 {"index": 3, "status": "buffered"},
+                 {"index": 5, "status": "rejected", "error": "..."}, ...]}
+
+Items that failed on the server side (e.g. the database was unavailable) also
+carry "retryable": true; the edge should resend those, not the invalid ones.
+"buffered" par-events are held in memory for track aggregation and written by
+the ingest flush task within about IDF_AGG_T_MS of event time; they are not
+durable yet, so an edge that must not lose them keeps and resends them
+(redeliveries are deduplicated).
+
+A site should use one path (bus or HTTP) for a given camera: track
+aggregation and debouncing state lives in the process that handles the track.
+Ingest needs a shared broker: with BUS_TRANSPORT=inprocess nothing in the web
+process would consume what IDF and RAN publish, so the endpoints answer 503.
+"""
+import asyncio
+import json
+import os
+import zlib
+from typing import Any, Dict, List, Optional, Tuple, Type
+
+from fastapi import APIRouter, HTTPException, Request
+from pydantic import BaseModel, ValidationError
+
+from app.bus import BUS_TRANSPORT, Bus, create_bus
+from app.common.blobstore import CLAIM_CHECK, LocalBlobStore, to_claim_check
+from app.envelope import Envelope
+from app.events import AdEventPayload, ParEventPayload
+
+import logging
+log = logging.getLogger(__name__)
+
+INGEST_MAX_ITEMS = int(os.getenv("INGEST_MAX_ITEMS", "5000"))
+INGEST_MAX_BYTES = int(os.getenv("INGEST_MAX_BYTES", str(64 * 1024 * 1024)))   # after decompression
+
+ingest = APIRouter(prefix="/ingest")
+
+_bus: Optional[Bus] = None
+_idf = None
+_ran = None
+_init_lock = asyncio.Lock()
+# IDFusion keeps per-track state; batches are applied one at a time
+_idf_lock = asyncio.Lock()
+_flush_task: Optional[asyncio.Task] = None
+
+
+async def _pipelines():
+    global _bus, _idf, _ran
+    if BUS_TRANSPORT == "inprocess":
+        # tts-event / anomaly-alert would fill an unread queue and block every request
+        raise HTTPException(status_code=503,
+                            detail="HTTP ingest needs a shared bus; BUS_TRANSPORT=inprocess is not supported")
+    async with _init_lock:
+        if _idf is None:
+            from app.notification_service import RealtimeAlertNotification
+            from app.tracking_service import IDFusion
+            _bus = create_bus(asyncio.get_running_loop())
+            await _bus.connect()
+            _idf = IDFusion(_bus, created_by="idf-http-ingest")
+            _ran = RealtimeAlertNotification(created_by="ran-http-ingest", bus=_bus)
+    return _idf, _ran
+
+
+async def _flush_loop() -> None:
+    """Resolve buffered tracks whose stream went quiet (the HTTP counterpart of the worker sweep)."""
+    while True:
+        idf = _idf
+        await asyncio.sleep(max(idf.aggregator.max_wait_ms / 2000.0, 0.1) if idf is not None else 1.0)
+        if idf is None or not idf.aggregator.enabled:
+            continue
+        try:
+            await idf.flush_expired()
+        except Exception:
+            log.exception("HTTP ingest: flush of expired tracks failed")
+
+
+def start_ingest() -> None:
+    """Startup hook: run the aggregation flush in the background."""
+    global _flush_task
+    if _flush_task is None:
+        _flush_task = asyncio.get_running_loop().create_task(_flush_loop(), name="ingest-flush")
+
+
+async def close_ingest() -> None:
+    """Shutdown hook: stop the flush task, resolve buffered tracks, flush movements, close the bus."""
+    global _flush_task
+    if _flush_task is not None:
+        _flush_task.cancel()
+        await asyncio.gather(_flush_task, return_exceptions=True)
+        _flush_task = None
+    if _idf is not None:
+        async with _idf_lock:
+            await _idf.flush_pending()
+    if _ran is not None:
+        await _ran.close()
+    if _bus is not None:
+        await _bus.close()
+
+
+def _decompress(body: bytes, encoding: str) -> bytes:
+    if "gzip" not in encoding:
+        if len(body) > INGEST_MAX_BYTES:
+            raise HTTPException(status_code=413, detail="Batch too large")
+        return body
+    # bounded inflate: a small gzip body must not expand without limit
+    d = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    try:
+        out = d.decompress(body, INGEST_MAX_BYTES + 1)
+    except zlib.error as e:
+        raise HTTPException(status_code=400, detail=f"Invalid gzip body: {e}")
+    if len(out) > INGEST_MAX_BYTES or d.unconsumed_tail:
+        raise HTTPException(status_code=413, detail="Batch too large")
+    return out
+
+
+def _split(raw: bytes, content_type: str) -> List[Any]:
+    """Raw items: bytes per NDJSON line, or parsed objects from a JSON array."""
+    if "ndjson" in content_type or "jsonl" in content_type:
+        items: List[Any] = [line for line in raw.splitlines() if line.strip()]
+    else:
+        try:
+            doc = json.loads(raw)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"Invalid JSON body: {e}")
+        items = doc.get("events") if isinstance(doc, dict) else doc
+        if not isinstance(items, list):
+            raise HTTPException(status_code=400, detail="Expected a JSON array of envelopes or {\"events\": [...]}")
+    if len(items) > INGEST_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"Batch has {len(items)} items (max {INGEST_MAX_ITEMS})")
+    return items
+
+
+def _validate(items: List[Any], event_type: str, model: Type[BaseModel]
+              ) -> Tuple[List[Tuple[int, Dict[str, Any]]], List[Dict[str, Any]]]:
+    """Validate envelopes and payloads; returns ([(index, envelope)], rejected results)."""
+    valid: List[Tuple[int, Dict[str, Any]]] = []
+    rejected: List[Dict[str, Any]] = []
+    for i, item in enumerate(items):
+        try:
+            env = Envelope.model_validate_json(item) if isinstance(item, bytes) else Envelope.model_validate(item)
+            if env.type != event_type:
+                raise ValueError(f"expected type '{event_type}', got '{env.type}'")
+            envelope = env.model_dump()
+            # downstream handlers take the validated model as-is (see unpack_payload)
+            envelope["payload"] = model.model_validate(env.payload)
+            valid.append((i, envelope))
+        except (ValidationError, ValueError) as e:
+            msg = "; ".join(
+                f"{'.'.join(map(str, err['loc']))}: {err['msg']}" if err["loc"] else err["msg"] for err in e.errors()
+            ) if isinstance(e, ValidationError) else str(e)
+            rejected.append({"index": i, "status": "rejected", "error": msg})
+    return valid, rejected
+
+
+async def _read_batch(request: Request, event_type: str, model: Type[BaseModel]):
+    raw = _decompress(await request.body(), request.headers.get("content-encoding", "").lower())
+    items = _split(raw, request.headers.get("content-type", "").lower())
+    return _validate(items, event_type, model)
+
+
+def _failed(index: int, error: str) -> Dict[str, Any]:
+    return {"index": index, "status": "rejected", "error": error, "retryable": True}
+
+
+def _summary(results: List[Dict[str, Any]]) -> Dict[str, Any]:
+    results.sort(key=lambda r: r["index"])
+    accepted = sum(1 for r in results if r["status"] in ("accepted", "debounced"))
+    buffered = sum(1 for r in results if r["status"] == "buffered")
+    return {"accepted": accepted, "buffered": buffered, "rejected": len(results) - accepted - buffered,
+            "results": results}
+
+
+@ingest.post("/par-events")
+async def ingest_par_events(request: Request) -> Dict[str, Any]:
+    valid, results = await _read_batch(request, "par-event", ParEventPayload)
+    if valid:
+        idf, _ = await _pipelines()
+        async with _idf_lock:
+            statuses = await idf.handle_par_batch([env for _, env in valid])
+        for (i, _), status in zip(valid, statuses):
+            results.append({"index": i, "status": status} if status != "error"
+                           else _failed(i, "processing failed"))
+    out = _summary(results)
+    log.info("HTTP ingest: %d par-events (%d rejected)", len(results), out["rejected"])
+    return out
+
+
+@ingest.post("/ad-events")
+async def ingest_ad_events(request: Request) -> Dict[str, Any]:
+    valid, results = await _read_batch(request, "ad-event", AdEventPayload)
+    if valid:
+        _, ran = await _pipelines()
+        blobs = LocalBlobStore() if CLAIM_CHECK else None
+        for i, env in valid:
+            try:
+                if blobs is not None and env["payload"].image_b64:
+                    env["payload"] = AdEventPayload.model_validate(
+                        to_claim_check(env["payload"].model_dump(), blobs)
+                    )
+                if await ran.handle_ad_event(env):
+                    results.append({"index": i, "status": "accepted"})
+                else:
+                    results.append(_failed(i, "not persisted"))
+            except Exception as e:
+                log.exception("HTTP ingest: ad-event %d failed", i)
+                results.append(_failed(i, f"processing failed: {type(e).__name__}"))
+    return _summary(results)
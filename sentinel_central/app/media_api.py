@@ -0,0 +1,214 @@
+"""
+Anomaly snapshot serving.
+
+    GET /media/snapshots/{episode}                  -> files of an episode (+ url / thumb_url)
+    GET /media/snapshots/{episode}/{name}[?w=320]   -> the image, or a cached thumbnail
+    GET /media/ad-events/{ad_event_id}/snapshot[?w=320]
+
+Responses carry ETag / Last-Modified / Cache-Control and answer If-None-Match /
+If-Modified-Since with 304; byte ranges (Range / If-Range) are handled by
+FileResponse, which also uses the server's zero-copy path send when the ASGI
+server offers the http.response.pathsend extension.
+
+Thumbnails are rendered on first request (Pillow, off the event loop), snapped
+to MEDIA_THUMB_WIDTHS so the cache stays bounded, and written next to the
+media under MEDIA_THUMB_ROOT; a thumbnail older than its source is re-rendered.
+Without Pillow the original image is served.
+"""
+import asyncio
+import hashlib
+import os
+import pathlib
+import re
+import weakref
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Any, Dict, List, Optional
+
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import FileResponse, Response
+
+from app.common.blobstore import BLOB_ROOT, MEDIA_ROOT
+from app.db.db import get_session
+from app.db.models import AdEventORM
+
+import logging
+log = logging.getLogger(__name__)
+
+SNAPSHOT_ROOT = pathlib.Path(MEDIA_ROOT) / "snapshots" / "anomaly_events"
+THUMB_ROOT = pathlib.Path(os.getenv("MEDIA_THUMB_ROOT", str(pathlib.Path(MEDIA_ROOT) / "thumbs")))
+THUMB_WIDTHS = sorted({int(w) for w in os.getenv("MEDIA_THUMB_WIDTHS", "160,320,640").split(",") if w.strip()})
+THUMB_QUALITY = int(os.getenv("MEDIA_THUMB_QUALITY", "80"))
+MEDIA_MAX_AGE_S = int(os.getenv("MEDIA_MAX_AGE_S", "3600"))
+
+IMAGE_EXTS = {".jpg", ".jpeg", ".png", ".webp"}
+# episode handles and file names as written by notification_service._event_file_path
+_SAFE_NAME = re.compile(r"^[A-Za-z0-9][A-Za-z0-9._-]{0,127}$")
+
+media = APIRouter(prefix="/media")
+
+# one render per (source, width) at a time; locks disappear once no request holds them
+_thumb_locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
+_pil_missing_logged = False
+
+
+def _safe(part: str) -> str:
+    if not _SAFE_NAME.match(part) or ".." in part:
+        raise HTTPException(status_code=404, detail="Not Found")
+    return part
+
+
+def _within(path: pathlib.Path, *roots: pathlib.Path) -> bool:
+    return any(path == r or r in path.parents for r in roots)
+
+
+def _media_file(path: pathlib.Path) -> pathlib.Path:
+    """Resolved path of a servable image under MEDIA_ROOT or BLOB_ROOT, else 404."""
+    try:
+        p = path.resolve(strict=True)
+    except (FileNotFoundError, OSError):
+        raise HTTPException(status_code=404, detail="Not Found")
+    roots = (pathlib.Path(MEDIA_ROOT).resolve(), pathlib.Path(BLOB_ROOT).resolve())
+    if not p.is_file() or p.suffix.lower() not in IMAGE_EXTS or not _within(p, *roots):
+        raise HTTPException(status_code=404, detail="Not Found")
+    return p
+
+
+# ---- thumbnails ----
+def snap_width(w: int) -> int:
+    """Smallest configured width >= w (the largest for anything bigger)."""
+    return next((t for t in THUMB_WIDTHS if t >= w), THUMB_WIDTHS[-1])
+
+
+def thumb_path(src: pathlib.Path, width: int) -> pathlib.Path:
+    key = hashlib.sha1(str(src).encode()).hexdigest()
+    return THUMB_ROOT / f"w{width}" / key[:2] / f"{key}.jpg"
+
+
+def _load_pil():
+    global _pil_missing_logged
+    try:
+        from PIL import Image
+    except ImportError:
+        if not _pil_missing_logged:
+            log.warning("Pillow is not installed; serving full-size snapshots instead of thumbnails")
+            _pil_missing_logged = True
+        return None
+    return Image
+
+
+def _render_thumb(src: pathlib.Path, dst: pathlib.Path, width: int) -> None:
+    Image = _load_pil()
+    with Image.open(src) as im:
+        im.draft("RGB", (width, width * 4))    # JPEG: decode at a reduced scale
+        im = im.convert("RGB")
+        im.thumbnail((width, width * 4))       # keeps aspect ratio, never upscales
+        dst.parent.mkdir(parents=True, exist_ok=True)
+        tmp = dst.with_name(f".{dst.name}.{os.getpid()}.tmp")
+        im.save(tmp, "JPEG", quality=THUMB_QUALITY, optimize=True)
+    os.replace(tmp, dst)
+
+
+def _fresh(thumb: pathlib.Path, src_mtime: float) -> bool:
+    try:
+        return thumb.stat().st_mtime >= src_mtime
+    except FileNotFoundError:
+        return False
+
+
+async def thumbnail(src: pathlib.Path, w: int) -> pathlib.Path:
+    """Path of the cached thumbnail for src (rendered if missing or stale); src without Pillow."""
+    if _load_pil() is None:
+        return src
+    width = snap_width(w)
+    dst = thumb_path(src, width)
+    src_mtime = src.stat().st_mtime
+    if _fresh(dst, src_mtime):
+        return dst
+    lock = _thumb_locks.setdefault(str(dst), asyncio.Lock())
+    async with lock:
+        if not _fresh(dst, src_mtime):
+            try:
+                await asyncio.to_thread(_render_thumb, src, dst, width)
+            except Exception as e:
+                log.warning("Thumbnail render failed for %s: %s", src, e)
+                return src
+    return dst
+
+
+# ---- conditional responses ----
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    if if_none_match.strip() == "*":
+        return True
+    tags = [t.strip().removeprefix("W/") for t in if_none_match.split(",")]
+    return etag in tags
+
+
+def _not_modified(request: Request, etag: str, mtime: float) -> bool:
+    inm = request.headers.get("if-none-match")
+    if inm is not None:
+        return _etag_matches(inm, etag)           # If-None-Match wins over If-Modified-Since
+    ims = request.headers.get("if-modified-since")
+    if ims:
+        try:
+            return int(mtime) <= int(parsedate_to_datetime(ims).timestamp())
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def _serve(request: Request, path: pathlib.Path) -> Response:
+    st = path.stat()
+    resp = FileResponse(path, stat_result=st, headers={"cache-control": f"public, max-age={MEDIA_MAX_AGE_S}"})
+    etag = resp.headers["etag"]
+    if _not_modified(request, etag, st.st_mtime):
+        return Response(status_code=304, headers={
+            "etag": etag,
+            "last-modified": formatdate(st.st_mtime, usegmt=True),
+            "cache-control": resp.headers["cache-control"],
+        })
+    return resp
+
+
+async def _serve_image(request: Request, path: pathlib.Path, w: Optional[int]) -> Response:
+    src = _media_file(path)
+    if w is not None:
+        if w <= 0:
+            raise HTTPException(status_code=400, detail="w must be > 0")
+        src = await thumbnail(src, w)
+    return _serve(request, src)
+
+
+# ---- routes ----
+@media.get("/snapshots/{episode}")
+async def list_snapshots(episode: str) -> Dict[str, Any]:
+    folder = SNAPSHOT_ROOT / _safe(episode)
+    if not folder.is_dir():
+        raise HTTPException(status_code=404, detail="episode not found")
+    files: List[Dict[str, Any]] = []
+    for entry in sorted(os.scandir(folder), key=lambda e: e.name):
+        if entry.is_file() and pathlib.Path(entry.name).suffix.lower() in IMAGE_EXTS:
+            st = entry.stat()
+            url = f"/media/snapshots/{episode}/{entry.name}"
+            files.append({
+                "name": entry.name,
+                "size": st.st_size,
+                "mtime_ms": int(st.st_mtime * 1000),
+                "url": url,
+                "thumb_url": f"{url}?w={THUMB_WIDTHS[0]}",
+            })
+    return {"episode": episode, "files": files}
+
+
+@media.api_route("/snapshots/{episode}/{name}", methods=["GET", "HEAD"])
+async def get_snapshot(request: Request, episode: str, name: str, w: Optional[int] = None) -> Response:
+    return await _serve_image(request, SNAPSHOT_ROOT / _safe(episode) / _safe(name), w)
+
+
+@media.api_route("/ad-events/{ad_event_id}/snapshot", methods=["GET", "HEAD"])
+async def get_ad_event_snapshot(request: Request, ad_event_id: int, w: Optional[int] = None) -> Response:
+    async with get_session() as s:
+        row = await s.get(AdEventORM, ad_event_id)
+    if row is None or not row.image_path:
+        raise HTTPException(status_code=404, detail="snapshot not found")
+    # image_path is absolute: a snapshot file or a claim-check blob
+    return await _serve_image(request, pathlib.Path(row.image_path), w)
@@ -2,7 +2,12 @@ import base64
 import os
 import pathlib
 from typing import Dict, Any, Optional
-from app.events import AdEventPayload, MovementUpdatePayload
+from app.common.blobstore import LocalBlobStore
+from app.envelope import now_ms, unpack_payload
+from app.services.movement_writer import MovementWriter
+from app.events import AdEventPayload, AnomalyAlertPayload, MovementUpdatePayload
+from app.bus import Bus
+from app.services.alert_fanout import ANOMALY_ALERTS
 from app.db.db import get_session
 from app.db.models import ADPhase, AdEventORM, MovementORM
 from sqlalchemy import select
@@ -23,16 +28,23 @@ def _event_file_path(episode: str, camera_id: str, start_ms: int, ext: str = "jp
 
 
 class RealtimeAlertNotification:
-    def __init__(self, created_by: str = "ran-svc-1"):
+    def __init__(self, created_by: str = "ran-svc-1", blobs: Optional[LocalBlobStore] = None,
+                 movements: Optional[MovementWriter] = None, bus: Optional[Bus] = None):
         self.created_by = created_by
+        # anomaly-alert envelopes go to the alert fanout stage (app.services.alert_fanout)
+        self.bus = bus if ANOMALY_ALERTS else None
+        self.blobs = blobs or LocalBlobStore()
+        self.movements = movements or MovementWriter()
 
-    async def handle_ad_event(self, envelope: Dict[str, Any]) -> None:
-        log.info(f'handle AD-event with "start"...{envelope}')
-        p = AdEventPayload(**envelope["payload"])
+    async def handle_ad_event(self, envelope: Dict[str, Any]) -> bool:
+        """Persist an AD-event; False if it was not stored (bad payload or DB error)."""
+        p = unpack_payload(envelope, AdEventPayload)
+        # don't log the envelope itself: inline image_b64 can be hundreds of KB
+        log.info(f'handle AD-event {p.phase} episode={p.episode} from {envelope.get("created_by")} ref={p.image_ref}')
         episode: Optional[str] = getattr(p, "episode", None) or getattr(p, "episode_id", None)
         if not episode:
             log.error("AD payload missing episode/episode_id: %s", envelope)
-            return
+            return False
 
         phase = ADPhase(str(p.phase).lower())
         # optional: validate timestamps in payload
@@ -48,7 +60,17 @@ class RealtimeAlertNotification:
                 if phase == ADPhase.START:
                     img_b64 = p.image_b64
                     img_path = None
-                    if img_b64:
+                    if p.image_ref:
+                        # claim-check: record where the bytes live; they are only read when served
+                        try:
+                            ref_path = self.blobs.path(p.image_ref)
+                            if ref_path.is_file():
+                                img_path = str(ref_path.resolve())
+                            else:
+                                log.warning("AD image_ref not found in blob store for episode=%s: %s", episode, p.image_ref)
+                        except ValueError as e:
+                            log.warning("Bad AD image_ref for episode=%s: %s", episode, e)
+                    elif img_b64:
                         try:
                             ext = (p.ext or "jpg").lstrip(".")
                             img_path = _event_file_path(episode, p.camera_id, p.start_ms, ext)
@@ -126,17 +148,47 @@ class RealtimeAlertNotification:
 
                 else:
                     log.error("Unknown AD phase %r for episode=%s", p.phase, episode)
-                    return
+                    return False
                 await s.commit()
 
         except SQLAlchemyError as e:
             log.exception("Failed to persist AD event episode=%s: %s", episode, e)
+            return False
+        await self._publish_alert(p, episode, row)
+        return True
+
+    async def _publish_alert(self, p: AdEventPayload, episode: str, row: AdEventORM) -> None:
+        if self.bus is None:
+            return
+        alert = AnomalyAlertPayload(
+            episode=episode,
+            phase=str(p.phase).lower(),
+            incident=row.incident or "anomaly",
+            confidence=float(p.confidence or 0.0),
+            location_id=row.location_id,
+            camera_id=row.camera_id,
+            ts_ms=(p.start_ms if str(p.phase).lower() == "start" else p.end_ms) or now_ms(),
+            ad_event_id=row.id,
+            duration_ms=row.duration_ms,
+        )
+        try:
+            await self.bus.publish_event("anomaly-alert", alert, created_by=self.created_by)
+        except Exception:
+            # the event is persisted; a lost alert must not fail (and redeliver) the ad-event
+            log.exception("Failed to publish anomaly-alert for episode=%s", episode)
 
     async def handle_movement_update(self, envelope: Dict[str, Any]):
-        p = MovementUpdatePayload(**envelope["payload"])
+        p = unpack_payload(envelope, MovementUpdatePayload)
         log.info(f"MovementUpdate: {p.resolved_id} {p.annotation_name} {p.movement_type} at {p.location_id}")
+        label = p.annotation_name or p.resolved_id
+        if self.movements.enabled:
+            # buffered; written in batches by MovementWriter (COPY / multi-row insert)
+            await self.movements.add((
+                p.resolved_id, p.movement_type, p.location_id, p.camera_id,
+                p.edge_id, envelope["ts_ms"], p.track_id, label,
+            ))
+            return
         async with get_session() as s:
-            label = p.annotation_name or p.resolved_id
             s.add(MovementORM(
                 resolved_id=p.resolved_id,
                 state=p.movement_type,
@@ -148,4 +200,7 @@ class RealtimeAlertNotification:
                 annotation_name=label,
             ))
             await s.commit()
-        
+
+    async def close(self) -> None:
+        """Flush buffered movements (call on shutdown)."""
+        await self.movements.close()
@@ -0,0 +1,463 @@
+"""
+Offline re-resolution of historical par_events (after Resolver threshold
+changes or identity merges), rewriting the derived resolved_id columns.
+
+    python -m app.reprocess --start-ms 1760000000000 --end-ms 1760086400000 \\
+        --checkpoint /var/lib/sentinel/reprocess-2025-10-09.json [--resume] [--dry-run]
+
+How it works:
+  * the gallery is every identity created before --start-ms, held in memory
+    (HotGallery); identities the live pipeline created inside the window are
+    ignored and re-derived;
+  * par_events in the window are streamed in (ts_ms, id) order through a
+    server-side cursor and resolved per (cam_id, track_id) like IDFusion: the
+    first embedded row of a track decides, later rows of the track inherit it,
+    a disappearance ends it. Each batch is matched against the gallery with one
+    mat-mat product; identities created inside the same batch are compared
+    exactly, EMA updates made inside a batch take effect from the next one;
+  * rows whose resolved_id changes are COPYed into temp tables and applied
+    with one UPDATE ... FROM per table (par_events, movements, person_sessions),
+    new identities are upserted, all in one transaction per batch;
+  * after each committed batch the checkpoint file records the stream position
+    and open-track state, so --resume continues where a run stopped.
+
+Existing identities keep their stored embeddings (their EMA already includes
+this window); only last_seen_ms moves forward.
+"""
+import argparse
+import asyncio
+import json
+import os
+import pathlib
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import asyncpg
+import numpy as np
+
+from app.common.gallery import HotGallery
+from app.common.resolve import Resolver, _new_identity_id
+from app.common.utils import to_pgvector_literal, unit
+from app.db.db import DB_URL
+from app.services.track_aggregation import AGG_TRACK_TTL_MS
+
+import logging
+log = logging.getLogger(__name__)
+
+REPROCESS_BATCH = int(os.getenv("REPROCESS_BATCH", "5000"))
+REPROCESS_PROGRESS_S = float(os.getenv("REPROCESS_PROGRESS_S", "10"))
+EMA_ALPHA = 0.2
+
+TrackKey = Tuple[str, str]
+# (id, cam_id, track_id, ts_ms, appeared, resolved_id, embedding text, location_id)
+Row = Tuple[int, str, str, int, bool, Optional[str], Optional[str], Optional[str]]
+
+_SELECT_EVENTS = """
+    SELECT id, cam_id, track_id, ts_ms, COALESCE(appeared, true), resolved_id, embedding::text, location_id
+    FROM par_events
+    WHERE ts_ms >= $1 AND ts_ms < $2 AND (ts_ms, id) > ($3, $4)
+    ORDER BY ts_ms, id
+"""
+
+_SELECT_GALLERY = """
+    SELECT id, embedding::text, created_ms, last_seen_ms, count_events
+    FROM identities
+    WHERE embedding IS NOT NULL AND (created_ms < $1 OR id = ANY($2::text[]))
+"""
+
+_TEMP_TABLES = """
+    CREATE TEMP TABLE IF NOT EXISTS rp_identities (
+        id text, embedding text, created_ms bigint, last_seen_ms bigint, count_events integer, created boolean
+    ) ON COMMIT DELETE ROWS;
+    CREATE TEMP TABLE IF NOT EXISTS rp_par (id bigint, resolved_id text) ON COMMIT DELETE ROWS;
+    CREATE TEMP TABLE IF NOT EXISTS rp_track (
+        camera_id text, track_id text, first_ms bigint, last_ms bigint, resolved_id text
+    ) ON COMMIT DELETE ROWS;
+"""
+
+_APPLY = [
+    """
+    INSERT INTO identities (id, annotation_name, embedding, created_ms, last_seen_ms, count_events)
+    SELECT id, id, embedding::vector, created_ms, last_seen_ms, count_events FROM rp_identities WHERE created
+    ON CONFLICT (id) DO UPDATE SET
+        embedding = EXCLUDED.embedding,
+        last_seen_ms = GREATEST(identities.last_seen_ms, EXCLUDED.last_seen_ms),
+        count_events = EXCLUDED.count_events,
+        version = identities.version + 1
+    """,
+    """
+    UPDATE identities i SET last_seen_ms = GREATEST(i.last_seen_ms, t.last_seen_ms)
+    FROM rp_identities t WHERE NOT t.created AND i.id = t.id
+    """,
+    """
+    UPDATE par_events p SET resolved_id = t.resolved_id
+    FROM rp_par t WHERE p.id = t.id
+    """,
+    """
+    UPDATE movements m SET resolved_id = t.resolved_id, annotation_name = COALESCE(i.annotation_name, t.resolved_id)
+    FROM rp_track t LEFT JOIN identities i ON i.id = t.resolved_id
+    WHERE m.camera_id = t.camera_id AND m.track_id = t.track_id
+      AND m.ts_ms BETWEEN t.first_ms AND t.last_ms
+      AND m.resolved_id IS DISTINCT FROM t.resolved_id
+    """,
+    """
+    UPDATE person_sessions ps SET resolved_id = t.resolved_id
+    FROM rp_track t
+    WHERE ps.camera_id = t.camera_id AND ps.track_id = t.track_id
+      AND ps.appear_ms BETWEEN t.first_ms AND t.last_ms
+      AND ps.resolved_id IS DISTINCT FROM t.resolved_id
+    """,
+]
+
+
+def parse_vectors(texts: Sequence[str], dim: int = 512) -> np.ndarray:
+    """pgvector text literals -> (n, dim) float32, parsed in one pass."""
+    if not texts:
+        return np.zeros((0, dim), dtype=np.float32)
+    flat = np.array(",".join(t[1:-1] for t in texts).split(","), dtype=np.float32)
+    return flat.reshape(len(texts), dim)
+
+
+@dataclass
+class TrackState:
+    resolved_id: Optional[str] = None
+    last_ts: int = 0
+    # rows seen before the track was resolved: (id, ts_ms, old resolved_id)
+    pending: List[Tuple[int, int, Optional[str]]] = field(default_factory=list)
+    changed: bool = False
+    first_ms: Optional[int] = None    # span of rows assigned since the last flush
+    last_ms: Optional[int] = None
+
+
+@dataclass
+class BatchResult:
+    par: List[Tuple[int, str]] = field(default_factory=list)
+    tracks: List[Tuple[str, str, int, int, str]] = field(default_factory=list)
+    identities: List[Tuple[str, Optional[str], int, int, int, bool]] = field(default_factory=list)
+    new_ids: List[str] = field(default_factory=list)
+    rows: int = 0
+    position: Tuple[int, int] = (0, 0)
+
+
+@dataclass
+class Progress:
+    rows: int = 0
+    changed: int = 0
+    new_identities: int = 0
+    matched: int = 0
+    unresolved: int = 0     # rows of tracks that never carried an embedding
+    batches: int = 0
+
+
+class Reprocessor:
+    """Re-resolution state over one time-ordered stream; no database access."""
+
+    def __init__(self, resolver: Resolver, track_ttl_ms: int = AGG_TRACK_TTL_MS):
+        self.resolver = resolver
+        self.track_ttl_ms = track_ttl_ms
+        self.gallery = HotGallery(horizon_ms=2 ** 62, max_size=2 ** 31)
+        self.tracks: Dict[TrackKey, TrackState] = {}
+        # identities created by this run: rid -> [created_ms, last_seen_ms, count_events]
+        self.created: Dict[str, List[int]] = {}
+        self.progress = Progress()
+
+    # ---- gallery ----
+    def load_gallery(self, rows: Sequence[Tuple[str, str, int, int, int]], created: Sequence[str] = ()) -> None:
+        ours = set(created)
+        vecs = parse_vectors([r[1] for r in rows], self.gallery.dim)
+        for (rid, _, created_ms, last_seen, count), v in zip(rows, vecs):
+            self.gallery.promote(rid, v, int(last_seen or 0))
+            if rid in ours:
+                self.created[rid] = [int(created_ms), int(last_seen or 0), int(count or 0)]
+
+    # ---- stream ----
+    def _expire(self, now_ms: int) -> None:
+        stale = [k for k, t in self.tracks.items() if t.last_ts < now_ms - self.track_ttl_ms]
+        for k in stale:
+            self._end(k, self.tracks.pop(k), None)
+
+    def _end(self, key: TrackKey, t: TrackState, out: Optional[BatchResult]) -> None:
+        self.progress.unresolved += len(t.pending)
+        if out is not None:
+            self._flush_span(key, t, out)
+
+    def _flush_span(self, key: TrackKey, t: TrackState, out: BatchResult) -> None:
+        if t.changed and t.first_ms is not None:
+            out.tracks.append((key[0], key[1], t.first_ms, t.last_ms, t.resolved_id))
+        t.first_ms = t.last_ms = None
+        t.changed = False
+
+    def _assign(self, t: TrackState, row_id: int, ts_ms: int, old: Optional[str], out: BatchResult) -> None:
+        if old != t.resolved_id:
+            out.par.append((row_id, t.resolved_id))
+            t.changed = True
+            self.progress.changed += 1
+        t.first_ms = ts_ms if t.first_ms is None else min(t.first_ms, ts_ms)
+        t.last_ms = ts_ms if t.last_ms is None else max(t.last_ms, ts_ms)
+
+    def process(self, rows: Sequence[Row]) -> BatchResult:
+        out = BatchResult(rows=len(rows))
+        if not rows:
+            return out
+        self._expire(rows[0][3])
+
+        # 1) which rows resolve a track (first embedded row of an unresolved track)
+        units: List[int] = []
+        open_keys = {k for k, t in self.tracks.items() if t.resolved_id is not None}
+        for i, (_, cam, track, _, appeared, _, emb, _) in enumerate(rows):
+            key = (cam, track)
+            if emb is not None and key not in open_keys:
+                units.append(i)
+                open_keys.add(key)
+            if not appeared:
+                open_keys.discard(key)
+        qs = parse_vectors([rows[i][6] for i in units], self.gallery.dim)
+        qs /= np.maximum(np.linalg.norm(qs, axis=1, keepdims=True), 1e-12)
+        hits = dict(zip(units, self.gallery.search_many(qs, k=2)))
+        unit_vec = dict(zip(units, qs))
+
+        # 2) sequential decisions; identities created in this batch are searched exactly
+        fresh_ids: List[str] = []
+        fresh_vecs: List[np.ndarray] = []
+        updated: Dict[str, np.ndarray] = {}
+        seen: Dict[str, int] = {}
+        for i, (row_id, cam, track, ts_ms, appeared, old, _, _) in enumerate(rows):
+            key = (cam, track)
+            t = self.tracks.setdefault(key, TrackState())
+            t.last_ts = ts_ms
+            if i in unit_vec:
+                t.resolved_id = self._resolve(unit_vec[i], hits[i], ts_ms, fresh_ids, fresh_vecs, updated)
+                seen[t.resolved_id] = max(seen.get(t.resolved_id, 0), ts_ms)
+                for pid, pts, pold in t.pending:
+                    self._assign(t, pid, pts, pold, out)
+                t.pending.clear()
+            if t.resolved_id is not None:
+                self._assign(t, row_id, ts_ms, old, out)
+            else:
+                t.pending.append((row_id, ts_ms, old))
+            if not appeared:
+                self._end(key, self.tracks.pop(key), out)
+
+        # 3) spans of tracks still open at the end of the batch
+        for key, t in self.tracks.items():
+            self._flush_span(key, t, out)
+
+        # 4) gallery + identity rows to write
+        out.new_ids = fresh_ids
+        for rid, v in zip(fresh_ids, fresh_vecs):
+            updated.setdefault(rid, v)
+        for rid, v in updated.items():
+            self.gallery.promote(rid, v, seen.get(rid, 0))
+        for rid, ts in seen.items():
+            mine = self.created.get(rid)
+            if mine is not None:
+                out.identities.append((rid, to_pgvector_literal(updated[rid]), mine[0], mine[1], mine[2], True))
+            else:
+                out.identities.append((rid, None, 0, ts, 0, False))
+
+        last = rows[-1]
+        out.position = (last[3], last[0])
+        self.progress.rows += len(rows)
+        self.progress.batches += 1
+        return out
+
+    def _resolve(self, q: np.ndarray, hits: List[Tuple[str, float]], ts_ms: int,
+                 fresh_ids: List[str], fresh_vecs: List[np.ndarray], updated: Dict[str, np.ndarray]) -> str:
+        cand = list(hits)
+        if fresh_ids:
+            d = 1.0 - np.stack(fresh_vecs) @ q
+            cand += [(fresh_ids[j], float(d[j])) for j in np.argsort(d)[:2]]
+            cand.sort(key=lambda c: c[1])
+        best_id, best = (cand[0][0], cand[0][1]) if cand else (None, 1.0)
+        second = cand[1][1] if len(cand) > 1 else None
+
+        rid = self.resolver.decide(best_id, best, second)
+        if rid is None:
+            rid = _new_identity_id(ts_ms)
+            fresh_ids.append(rid)
+            fresh_vecs.append(q)
+            self.created[rid] = [ts_ms, ts_ms, 1]
+            self.progress.new_identities += 1
+            return rid
+
+        self.progress.matched += 1
+        if rid in fresh_ids:
+            j = fresh_ids.index(rid)
+            fresh_vecs[j] = unit((1.0 - EMA_ALPHA) * fresh_vecs[j] + EMA_ALPHA * q)
+            base = None
+        else:
+            base = updated.get(rid)
+            if base is None:
+                base = self.gallery.embedding(rid)
+        if base is not None:
+            updated[rid] = unit((1.0 - EMA_ALPHA) * base + EMA_ALPHA * q)
+        mine = self.created.get(rid)
+        if mine is not None:
+            mine[1] = max(mine[1], ts_ms)
+            mine[2] += 1
+        return rid
+
+    # ---- checkpoints ----
+    def state(self) -> Dict[str, Any]:
+        return {
+            "tracks": [[k[0], k[1], t.resolved_id, t.last_ts, t.pending] for k, t in self.tracks.items()],
+            "progress": asdict(self.progress),
+        }
+
+    def restore(self, state: Dict[str, Any]) -> None:
+        self.tracks = {
+            (cam, track): TrackState(rid, last_ts, [tuple(p) for p in pending])
+            for cam, track, rid, last_ts, pending in state.get("tracks", [])
+        }
+        self.progress = Progress(**state.get("progress", {}))
+
+
+class Checkpoint:
+    """JSON position/state file plus an append-only sidecar of identity ids this run created."""
+
+    def __init__(self, path: Optional[str]):
+        self.path = pathlib.Path(path) if path else None
+        self.ids_path = self.path.with_suffix(self.path.suffix + ".ids") if self.path else None
+
+    def load(self) -> Optional[Dict[str, Any]]:
+        if self.path is None or not self.path.exists():
+            return None
+        return json.loads(self.path.read_text())
+
+    def created_ids(self) -> List[str]:
+        if self.ids_path is None or not self.ids_path.exists():
+            return []
+        return [line for line in self.ids_path.read_text().splitlines() if line]
+
+    def save(self, doc: Dict[str, Any], new_ids: Sequence[str]) -> None:
+        if self.path is None:
+            return
+        if new_ids:
+            with open(self.ids_path, "a") as f:
+                f.write("".join(f"{rid}\n" for rid in new_ids))
+        tmp = self.path.with_name(f".{self.path.name}.tmp")
+        tmp.write_text(json.dumps(doc))
+        os.replace(tmp, self.path)
+
+    def reset(self) -> None:
+        for p in (self.path, self.ids_path):
+            if p is not None and p.exists():
+                p.unlink()
+
+
+def _dsn(url: str) -> str:
+    return url.replace("postgresql+asyncpg://", "postgresql://", 1)
+
+
+async def _write(conn: asyncpg.Connection, out: BatchResult) -> None:
+    async with conn.transaction():
+        if out.identities:
+            await conn.copy_records_to_table("rp_identities", records=out.identities)
+        if out.par:
+            await conn.copy_records_to_table("rp_par", records=out.par)
+        if out.tracks:
+            await conn.copy_records_to_table("rp_track", records=out.tracks)
+        for sql in _APPLY:
+            await conn.execute(sql)
+
+
+async def prune_orphans(conn: asyncpg.Connection, start_ms: int, end_ms: int) -> int:
+    """Delete identities created in the window that nothing references any more (never named/tracked ones)."""
+    status = await conn.execute("""
+        DELETE FROM identities i
+        WHERE i.created_ms >= $1 AND i.created_ms < $2
+          AND NOT COALESCE(i.is_tracked, false)
+          AND (i.annotation_name IS NULL OR i.annotation_name = i.id)
+          AND NOT EXISTS (SELECT 1 FROM par_events p WHERE p.resolved_id = i.id)
+          AND NOT EXISTS (SELECT 1 FROM movements m WHERE m.resolved_id = i.id)
+          AND NOT EXISTS (SELECT 1 FROM person_sessions ps WHERE ps.resolved_id = i.id)
+    """, start_ms, end_ms)
+    return int(status.split()[-1])
+
+
+def _report(p: Progress, start_ms: int, end_ms: int, pos_ms: int, t0: float, final: bool = False) -> None:
+    dt = max(time.monotonic() - t0, 1e-9)
+    pct = 100.0 * (pos_ms - start_ms) / max(end_ms - start_ms, 1)
+    log.info("reprocess%s: %.1f%% rows=%d (%.0f rows/s) changed=%d new_identities=%d matched=%d unresolved=%d",
+             " done" if final else "", 100.0 if final else pct, p.rows, p.rows / dt, p.changed,
+             p.new_identities, p.matched, p.unresolved)
+
+
+async def run(start_ms: int, end_ms: int, checkpoint: Optional[str] = None, resume: bool = False,
+              dry_run: bool = False, batch: int = REPROCESS_BATCH, tau_same: float = 0.22,
+              tau_ambig: float = 0.30, delta_min: float = 0.05, prune: bool = False) -> Progress:
+    params = {"start_ms": start_ms, "end_ms": end_ms, "tau_same": tau_same, "tau_ambig": tau_ambig,
+              "delta_min": delta_min}
+    ck = Checkpoint(None if dry_run else checkpoint)
+    state = ck.load() if resume else None
+    if state is not None and state["params"] != params:
+        raise SystemExit(f"Checkpoint {checkpoint} was written for {state['params']}, not {params}")
+    if state is None:
+        ck.reset()
+
+    rp = Reprocessor(Resolver(tau_same=tau_same, tau_ambig=tau_ambig, delta_min=delta_min))
+    position = (start_ms - 1, 0)
+    if state is not None:
+        rp.restore(state)
+        position = tuple(state["position"])
+        log.info("Resuming at ts_ms=%d id=%d (%d rows done)", position[0], position[1], rp.progress.rows)
+
+    read = await asyncpg.connect(_dsn(DB_URL))
+    write = None if dry_run else await asyncpg.connect(_dsn(DB_URL))
+    try:
+        t0 = time.monotonic()
+        async with read.transaction(isolation="repeatable_read", readonly=True):
+            ids = ck.created_ids()
+            cur = await read.cursor(_SELECT_GALLERY, start_ms, ids)
+            while chunk := await cur.fetch(20000):
+                rp.load_gallery(chunk, ids)
+            log.info("Gallery: %d identities loaded in %.1fs", len(rp.gallery), time.monotonic() - t0)
+
+        if write is not None:
+            await write.execute(_TEMP_TABLES)
+        t0 = last_report = time.monotonic()
+        rows_at_start = rp.progress.rows
+        async with read.transaction(isolation="repeatable_read", readonly=True):
+            cur = await read.cursor(_SELECT_EVENTS, start_ms, end_ms, position[0], position[1])
+            while rows := await cur.fetch(batch):
+                out = rp.process(rows)
+                if write is not None:
+                    await _write(write, out)
+                    ck.save({"params": params, "position": list(out.position), **rp.state()}, out.new_ids)
+                if time.monotonic() - last_report >= REPROCESS_PROGRESS_S:
+                    last_report = time.monotonic()
+                    done = rp.progress.rows - rows_at_start
+                    _report(Progress(**{**asdict(rp.progress), "rows": done}), start_ms, end_ms, out.position[0], t0)
+        _report(rp.progress, start_ms, end_ms, end_ms, t0, final=True)
+
+        if prune and write is not None:
+            log.info("Pruned %d orphaned identities created in the window", await prune_orphans(write, start_ms, end_ms))
+    finally:
+        await read.close()
+        if write is not None:
+            await write.close()
+    return rp.progress
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Re-resolve par_events in a time window and rewrite derived tables")
+    ap.add_argument("--start-ms", type=int, required=True)
+    ap.add_argument("--end-ms", type=int, required=True, help="exclusive")
+    ap.add_argument("--checkpoint", help="state file written after every committed batch")
+    ap.add_argument("--resume", action="store_true", help="continue from --checkpoint")
+    ap.add_argument("--dry-run", action="store_true", help="count what would change; write nothing")
+    ap.add_argument("--batch", type=int, default=REPROCESS_BATCH)
+    ap.add_argument("--tau-same", type=float, default=0.22)
+    ap.add_argument("--tau-ambig", type=float, default=0.30)
+    ap.add_argument("--delta-min", type=float, default=0.05)
+    ap.add_argument("--prune-orphans", action="store_true",
+                    help="delete window-created identities left unreferenced (unnamed, untracked only)")
+    args = ap.parse_args()
+    if args.end_ms <= args.start_ms:
+        ap.error("--end-ms must be > --start-ms")
+    if args.resume and not args.checkpoint:
+        ap.error("--resume needs --checkpoint")
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s [%(name)s] %(message)s")
+    asyncio.run(run(args.start_ms, args.end_ms, args.checkpoint, args.resume, args.dry_run, args.batch,
+                    args.tau_same, args.tau_ambig, args.delta_min, args.prune_orphans))
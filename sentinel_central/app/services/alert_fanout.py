@@ -0,0 +1,475 @@
+"""
+Anomaly alert fanout: anomaly-alert envelopes -> operator channels.
+
+    RAN ──anomaly-alert──> Coalescer ──> per-channel queue ──token bucket──> HTTP (pooled)
+                                                  ^                              |
+                                                  └──────── retry (backoff) <────┘
+
+  * Coalescing: the first alert of an (episode, location_id) goes out at once;
+    everything else for that key within ALERT_COALESCE_MS is merged into one
+    trailing summary (count, cameras, max confidence, latest phase).
+  * Each channel drains its own bounded queue under a token bucket; one token
+    sends up to ALERT_BATCH_MAX queued alerts as a single digest message.
+  * When a queue is full the oldest alert is dropped and counted; the next
+    message carries "+N suppressed", so an anomaly storm costs at most the
+    bucket rate in sends and ALERT_QUEUE_MAX alerts of memory per channel.
+  * Transport errors, 429 and 5xx are retried with jittered exponential
+    backoff (Retry-After honoured) up to ALERT_MAX_ATTEMPTS; other 4xx are dropped.
+
+Channels are enabled by configuration: Pushover (PUSHOVER_TOKEN + PUSHOVER_USER,
+PUSHOVER_API) and a generic JSON webhook (ALERT_WEBHOOK_URL). `python -m
+app.alert_stub` serves both endpoints locally for tests.
+"""
+import abc
+import asyncio
+import heapq
+import itertools
+import os
+import random
+import time
+from collections import deque
+from dataclasses import asdict, dataclass, field
+from typing import Any, Callable, Deque, Dict, List, Optional, Set, Tuple
+
+import httpx
+
+from app.envelope import unpack_payload
+from app.events import AnomalyAlertPayload
+
+import logging
+log = logging.getLogger(__name__)
+
+PUSHOVER_API = os.getenv("PUSHOVER_API", "https://api.pushover.net/1/messages.json")
+PUSHOVER_TOKEN = os.getenv("PUSHOVER_TOKEN")
+PUSHOVER_USER = os.getenv("PUSHOVER_USER")
+PUSHOVER_RATE_PER_MIN = float(os.getenv("PUSHOVER_RATE_PER_MIN", "30"))
+PUSHOVER_BURST = int(os.getenv("PUSHOVER_BURST", "5"))
+ALERT_WEBHOOK_URL = os.getenv("ALERT_WEBHOOK_URL")
+ALERT_WEBHOOK_RATE_PER_MIN = float(os.getenv("ALERT_WEBHOOK_RATE_PER_MIN", "120"))
+ALERT_WEBHOOK_BURST = int(os.getenv("ALERT_WEBHOOK_BURST", "20"))
+
+ALERT_COALESCE_MS = int(os.getenv("ALERT_COALESCE_MS", "30000"))
+ALERT_MAX_OPEN_WINDOWS = int(os.getenv("ALERT_MAX_OPEN_WINDOWS", "5000"))
+ALERT_BATCH_MAX = int(os.getenv("ALERT_BATCH_MAX", "10"))
+ALERT_QUEUE_MAX = int(os.getenv("ALERT_QUEUE_MAX", "500"))
+ALERT_MAX_ATTEMPTS = int(os.getenv("ALERT_MAX_ATTEMPTS", "5"))
+ALERT_RETRY_BASE_S = float(os.getenv("ALERT_RETRY_BASE_S", "1.0"))
+ALERT_RETRY_MAX_S = float(os.getenv("ALERT_RETRY_MAX_S", "60"))
+ALERT_HTTP_TIMEOUT_S = float(os.getenv("ALERT_HTTP_TIMEOUT_S", "10"))
+ALERT_HTTP_MAX_CONNECTIONS = int(os.getenv("ALERT_HTTP_MAX_CONNECTIONS", "10"))
+ALERT_FLUSH_TIMEOUT_S = float(os.getenv("ALERT_FLUSH_TIMEOUT_S", "5"))
+# public base of this service, for snapshot links in messages (see app.media_api)
+ALERT_MEDIA_BASE_URL = os.getenv("ALERT_MEDIA_BASE_URL", "").rstrip("/")
+
+# RAN publishes anomaly-alert envelopes only when someone will consume them
+ANOMALY_ALERTS = os.getenv(
+    "ANOMALY_ALERTS", "1" if (PUSHOVER_TOKEN and PUSHOVER_USER) or ALERT_WEBHOOK_URL else "0"
+).lower() in ("1", "true", "yes")
+
+AlertKey = Tuple[str, str]   # (episode, location_id)
+
+
+def _now_ms() -> int:
+    return int(time.monotonic() * 1000)
+
+
+@dataclass
+class Alert:
+    episode: str
+    location_id: str
+    incident: str
+    phase: str
+    confidence: float
+    first_ms: int
+    last_ms: int
+    cameras: Set[str] = field(default_factory=set)
+    count: int = 1
+    ad_event_id: Optional[int] = None
+    duration_ms: Optional[int] = None
+
+    @classmethod
+    def from_payload(cls, p: AnomalyAlertPayload) -> "Alert":
+        return cls(p.episode, p.location_id, p.incident, p.phase, float(p.confidence), p.ts_ms, p.ts_ms,
+                   {p.camera_id}, 1, p.ad_event_id, p.duration_ms)
+
+    @property
+    def key(self) -> AlertKey:
+        return (self.episode, self.location_id)
+
+    def merge(self, p: AnomalyAlertPayload) -> None:
+        self.count += 1
+        self.cameras.add(p.camera_id)
+        self.confidence = max(self.confidence, float(p.confidence))
+        self.first_ms = min(self.first_ms, p.ts_ms)
+        if p.ts_ms >= self.last_ms:
+            self.last_ms, self.phase = p.ts_ms, p.phase
+            self.duration_ms = p.duration_ms if p.duration_ms is not None else self.duration_ms
+        self.ad_event_id = self.ad_event_id or p.ad_event_id
+
+    def line(self) -> str:
+        state = "ended" if self.phase == "end" else "started"
+        extra = f" x{self.count}" if self.count > 1 else ""
+        return (f"{self.incident} {state} at {self.location_id} ({', '.join(sorted(self.cameras))})"
+                f" conf={self.confidence:.2f}{extra}")
+
+    def snapshot_url(self) -> Optional[str]:
+        if not ALERT_MEDIA_BASE_URL or self.ad_event_id is None:
+            return None
+        return f"{ALERT_MEDIA_BASE_URL}/media/ad-events/{self.ad_event_id}/snapshot"
+
+    def as_dict(self) -> Dict[str, Any]:
+        d = asdict(self)
+        d["cameras"] = sorted(self.cameras)
+        d["snapshot_url"] = self.snapshot_url()
+        return d
+
+
+class TokenBucket:
+    def __init__(self, rate_per_s: float, burst: int, clock: Callable[[], float] = time.monotonic):
+        self.rate = rate_per_s
+        self.burst = max(1, burst)
+        self.clock = clock
+        self.tokens = float(self.burst)
+        self._at = clock()
+
+    def _refill(self) -> None:
+        now = self.clock()
+        self.tokens = min(self.burst, self.tokens + (now - self._at) * self.rate)
+        self._at = now
+
+    def delay(self) -> float:
+        """Seconds until one token is available (0 if one is now)."""
+        self._refill()
+        return 0.0 if self.tokens >= 1.0 else (1.0 - self.tokens) / self.rate
+
+    def hold(self, seconds: float) -> None:
+        """No tokens for `seconds` (server asked us to back off)."""
+        self._refill()
+        self.tokens = min(self.tokens, 0.0) - seconds * self.rate
+
+    def take(self) -> bool:
+        self._refill()
+        if self.tokens >= 1.0:
+            self.tokens -= 1.0
+            return True
+        return False
+
+
+@dataclass
+class _Window:
+    opened_ms: int
+    pending: Optional[Alert] = None
+
+
+class Coalescer:
+    """Leading alert per key immediately, then at most one trailing summary per window."""
+
+    def __init__(self, window_ms: int = ALERT_COALESCE_MS, max_windows: int = ALERT_MAX_OPEN_WINDOWS):
+        self.window_ms = window_ms
+        self.max_windows = max_windows
+        self._windows: Dict[AlertKey, _Window] = {}
+        self.merged = 0
+
+    def offer(self, p: AnomalyAlertPayload, now_ms: int) -> List[Alert]:
+        """Alerts to send now."""
+        key = (p.episode, p.location_id)
+        w = self._windows.get(key)
+        if w is not None and now_ms - w.opened_ms < self.window_ms:
+            self.merged += 1
+            if w.pending is None:
+                w.pending = Alert.from_payload(p)
+            else:
+                w.pending.merge(p)
+            return []
+        out = self._close(key) if w is not None else []
+        if len(self._windows) >= self.max_windows:
+            # storm across many episodes: close the oldest window early
+            oldest = min(self._windows, key=lambda k: self._windows[k].opened_ms)
+            out += self._close(oldest)
+        self._windows[key] = _Window(now_ms)
+        return out + [Alert.from_payload(p)]
+
+    def _close(self, key: AlertKey) -> List[Alert]:
+        w = self._windows.pop(key)
+        return [w.pending] if w.pending is not None else []
+
+    def due(self, now_ms: int) -> List[Alert]:
+        """Trailing summaries of windows that ended."""
+        out: List[Alert] = []
+        for key in [k for k, w in self._windows.items() if now_ms - w.opened_ms >= self.window_ms]:
+            out += self._close(key)
+        return out
+
+    def drain(self) -> List[Alert]:
+        out: List[Alert] = []
+        for key in list(self._windows):
+            out += self._close(key)
+        return out
+
+    @property
+    def open_windows(self) -> int:
+        return len(self._windows)
+
+
+class DeliveryError(Exception):
+    def __init__(self, msg: str, retryable: bool, retry_after_s: Optional[float] = None):
+        super().__init__(msg)
+        self.retryable = retryable
+        self.retry_after_s = retry_after_s
+
+
+def _check(resp: httpx.Response) -> None:
+    if resp.status_code < 300:
+        return
+    retry_after = resp.headers.get("retry-after")
+    try:
+        retry_after_s = float(retry_after) if retry_after else None
+    except ValueError:
+        retry_after_s = None
+    retryable = resp.status_code == 429 or resp.status_code >= 500
+    raise DeliveryError(f"HTTP {resp.status_code}: {resp.text[:200]}", retryable, retry_after_s)
+
+
+class Channel(abc.ABC):
+    name = "channel"
+
+    def __init__(self, rate_per_min: float, burst: int, batch_max: int = ALERT_BATCH_MAX):
+        self.bucket = TokenBucket(rate_per_min / 60.0, burst)
+        self.batch_max = batch_max
+
+    @abc.abstractmethod
+    async def send(self, client: httpx.AsyncClient, alerts: List[Alert], suppressed: int) -> None:
+        """Deliver one batch as one message; raises DeliveryError."""
+
+
+class PushoverChannel(Channel):
+    """One Pushover message per batch (the API has no batch endpoint)."""
+    name = "pushover"
+
+    def __init__(self, api: str = PUSHOVER_API, token: Optional[str] = PUSHOVER_TOKEN,
+                 user: Optional[str] = PUSHOVER_USER, rate_per_min: float = PUSHOVER_RATE_PER_MIN,
+                 burst: int = PUSHOVER_BURST):
+        super().__init__(rate_per_min, burst)
+        self.api, self.token, self.user = api, token, user
+
+    async def send(self, client: httpx.AsyncClient, alerts: List[Alert], suppressed: int) -> None:
+        lines = [a.line() for a in alerts]
+        if suppressed:
+            lines.append(f"+{suppressed} more alerts suppressed (rate limit)")
+        first = alerts[0]
+        data = {
+            "token": self.token,
+            "user": self.user,
+            "title": first.line() if len(alerts) == 1 else f"{len(alerts)} anomaly alerts",
+            "message": "\n".join(lines)[:1024],
+            "timestamp": str(int(time.time())),
+            # starts are urgent; end-only digests are informational
+            "priority": "1" if any(a.phase == "start" for a in alerts) else "0",
+        }
+        url = first.snapshot_url()
+        if url:
+            data["url"], data["url_title"] = url, "Snapshot"
+        try:
+            resp = await client.post(self.api, data=data)
+        except httpx.HTTPError as e:
+            raise DeliveryError(f"{type(e).__name__}: {e}", retryable=True)
+        _check(resp)
+
+
+class WebhookChannel(Channel):
+    """JSON POST of the whole batch: {"alerts": [...], "suppressed": N}."""
+    name = "webhook"
+
+    def __init__(self, url: str = ALERT_WEBHOOK_URL, rate_per_min: float = ALERT_WEBHOOK_RATE_PER_MIN,
+                 burst: int = ALERT_WEBHOOK_BURST):
+        super().__init__(rate_per_min, burst)
+        self.url = url
+
+    async def send(self, client: httpx.AsyncClient, alerts: List[Alert], suppressed: int) -> None:
+        try:
+            resp = await client.post(self.url, json={"alerts": [a.as_dict() for a in alerts], "suppressed": suppressed})
+        except httpx.HTTPError as e:
+            raise DeliveryError(f"{type(e).__name__}: {e}", retryable=True)
+        _check(resp)
+
+
+def configured_channels() -> List[Channel]:
+    channels: List[Channel] = []
+    if PUSHOVER_TOKEN and PUSHOVER_USER:
+        channels.append(PushoverChannel())
+    if ALERT_WEBHOOK_URL:
+        channels.append(WebhookChannel())
+    return channels
+
+
+@dataclass
+class ChannelStats:
+    queued: int = 0
+    sent: int = 0          # alerts delivered
+    messages: int = 0      # HTTP sends that succeeded
+    dropped: int = 0       # pushed out of a full queue
+    retried: int = 0
+    failed: int = 0        # gave up (attempts exhausted or non-retryable)
+
+
+@dataclass
+class _Item:
+    alert: Alert
+    attempts: int = 0
+
+
+class ChannelQueue:
+    """Bounded queue + retry heap + token bucket for one channel."""
+
+    def __init__(self, channel: Channel, max_size: int = ALERT_QUEUE_MAX, max_attempts: int = ALERT_MAX_ATTEMPTS):
+        self.channel = channel
+        self.max_size = max_size
+        self.max_attempts = max_attempts
+        self.queue: Deque[_Item] = deque()
+        self.retry: List[Tuple[float, int, _Item]] = []
+        self.suppressed = 0
+        self.stats = ChannelStats()
+        self._seq = itertools.count()
+        self._wake = asyncio.Event()
+
+    def put(self, alert: Alert) -> None:
+        self._push(_Item(alert))
+        self.stats.queued += 1
+        self._wake.set()
+
+    def _push(self, item: _Item, front: bool = False) -> None:
+        if len(self.queue) >= self.max_size:
+            self.queue.popleft()
+            self.suppressed += 1
+            self.stats.dropped += 1
+        (self.queue.appendleft if front else self.queue.append)(item)
+
+    def _promote_due_retries(self, now: float) -> None:
+        while self.retry and self.retry[0][0] <= now:
+            self._push(heapq.heappop(self.retry)[2], front=True)
+
+    def _backoff(self, attempts: int, retry_after_s: Optional[float]) -> float:
+        base = min(ALERT_RETRY_MAX_S, ALERT_RETRY_BASE_S * 2 ** (attempts - 1))
+        delay = base / 2 + random.uniform(0, base / 2)      # jittered: retries of a burst spread out
+        return max(delay, retry_after_s or 0.0)
+
+    async def send_next(self, client: httpx.AsyncClient) -> None:
+        batch = [self.queue.popleft() for _ in range(min(self.channel.batch_max, len(self.queue)))]
+        suppressed, self.suppressed = self.suppressed, 0
+        try:
+            await self.channel.send(client, [i.alert for i in batch], suppressed)
+        except DeliveryError as e:
+            self.suppressed += suppressed
+            if e.retry_after_s:
+                self.channel.bucket.hold(e.retry_after_s)     # the whole channel is throttled, not just this batch
+            now = time.monotonic()
+            for item in batch:
+                item.attempts += 1
+                if e.retryable and item.attempts < self.max_attempts:
+                    heapq.heappush(self.retry, (now + self._backoff(item.attempts, e.retry_after_s),
+                                                next(self._seq), item))
+                    self.stats.retried += 1
+                else:
+                    self.stats.failed += 1
+            log.warning("Alert %s send of %d failed (%s)", self.channel.name, len(batch), e)
+            return
+        self.stats.sent += len(batch)
+        self.stats.messages += 1
+
+    async def run(self, client: httpx.AsyncClient) -> None:
+        while True:
+            self._promote_due_retries(time.monotonic())
+            if not self.queue:
+                timeout = max(0.0, self.retry[0][0] - time.monotonic()) if self.retry else None
+                self._wake.clear()
+                try:
+                    await asyncio.wait_for(self._wake.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            delay = self.channel.bucket.delay()
+            if delay > 0:
+                await asyncio.sleep(delay)
+                continue
+            self.channel.bucket.take()
+            await self.send_next(client)
+
+    async def flush(self, client: httpx.AsyncClient) -> None:
+        """Shutdown: send what is queued (retries included) while tokens allow, without waiting."""
+        self._promote_due_retries(float("inf"))
+        while self.queue and self.channel.bucket.take():
+            await self.send_next(client)
+        left = len(self.queue) + len(self.retry)
+        if left:
+            log.warning("Alert %s: %d alerts undelivered at shutdown", self.channel.name, left)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {**asdict(self.stats), "depth": len(self.queue), "retry_depth": len(self.retry),
+                "tokens": round(self.channel.bucket.tokens, 2)}
+
+
+class AlertFanout:
+    def __init__(self, channels: Optional[List[Channel]] = None, coalesce_ms: int = ALERT_COALESCE_MS,
+                 client: Optional[httpx.AsyncClient] = None):
+        self.queues = [ChannelQueue(c) for c in (configured_channels() if channels is None else channels)]
+        self.coalescer = Coalescer(coalesce_ms)
+        self._client = client
+        self.received = 0
+        if not self.queues:
+            log.warning("Alert fanout has no channels configured (PUSHOVER_TOKEN/PUSHOVER_USER, ALERT_WEBHOOK_URL)")
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        # one pooled keep-alive client shared by every channel
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                timeout=ALERT_HTTP_TIMEOUT_S,
+                limits=httpx.Limits(max_connections=ALERT_HTTP_MAX_CONNECTIONS,
+                                    max_keepalive_connections=ALERT_HTTP_MAX_CONNECTIONS),
+            )
+        return self._client
+
+    def _enqueue(self, alerts: List[Alert]) -> None:
+        for a in alerts:
+            for q in self.queues:
+                q.put(a)
+
+    async def handle_alert(self, envelope: Dict[str, Any]) -> None:
+        p = unpack_payload(envelope, AnomalyAlertPayload)
+        self.received += 1
+        if self.queues:
+            self._enqueue(self.coalescer.offer(p, _now_ms()))
+
+    async def run(self) -> None:
+        """Background: channel senders plus the trailing-summary tick."""
+        tasks = [asyncio.create_task(q.run(self.client), name=f"alert-{q.channel.name}") for q in self.queues]
+        try:
+            tick = max(self.coalescer.window_ms / 4000.0, 0.1)
+            while True:
+                await asyncio.sleep(tick)
+                self._enqueue(self.coalescer.due(_now_ms()))
+        finally:
+            for t in tasks:
+                t.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def close(self) -> None:
+        """Shutdown: emit open summaries, flush queues (bounded), close the HTTP pool."""
+        self._enqueue(self.coalescer.drain())
+        try:
+            await asyncio.wait_for(
+                asyncio.gather(*(q.flush(self.client) for q in self.queues)), ALERT_FLUSH_TIMEOUT_S
+            )
+        except asyncio.TimeoutError:
+            log.warning("Alert flush timed out after %ss", ALERT_FLUSH_TIMEOUT_S)
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "received": self.received,
+            "coalesced": self.coalescer.merged,
+            "open_windows": self.coalescer.open_windows,
+            "channels": {q.channel.name: q.as_dict() for q in self.queues},
+        }
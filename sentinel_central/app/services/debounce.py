@@ -0,0 +1,93 @@
+import os
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.events import ParEventPayload
+
+import logging
+log = logging.getLogger(__name__)
+
+# repeat appearances of a track inside this window are dropped unless they changed materially
+DEBOUNCE_WINDOW_MS = int(os.getenv("IDF_DEBOUNCE_MS", "2000"))          # 0 disables
+DEBOUNCE_MIN_IOU = float(os.getenv("IDF_DEBOUNCE_MIN_IOU", "0.8"))       # bbox moved if IoU below
+DEBOUNCE_MAX_EMB_DIST = float(os.getenv("IDF_DEBOUNCE_MAX_EMB_DIST", "0.05"))  # cosine distance
+_PRUNE_EVERY = 1000
+
+
+def _iou(a: List[int], b: List[int]) -> float:
+    ix = max(0, min(a[2], b[2]) - max(a[0], b[0]))
+    iy = max(0, min(a[3], b[3]) - max(a[1], b[1]))
+    inter = ix * iy
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+@dataclass
+class _Last:
+    ts_ms: int
+    bbox: List[int]
+    qvec: Optional[np.ndarray]
+
+
+class AppearanceDebouncer:
+    """
+    Suppresses repeat appearance events per (camera_id, track_id) within a
+    window, unless the bbox (IoU) or the embedding (cosine distance) moved
+    materially since the last event that was let through.
+    The first appearance of a track and every disappearance always pass.
+    """
+    def __init__(self, window_ms: int = DEBOUNCE_WINDOW_MS, min_iou: float = DEBOUNCE_MIN_IOU,
+                 max_emb_dist: float = DEBOUNCE_MAX_EMB_DIST):
+        self.window_ms = window_ms
+        self.min_iou = min_iou
+        self.max_emb_dist = max_emb_dist
+        self._last: Dict[Tuple[str, str], _Last] = {}
+        self._calls = 0
+        self.passed = 0
+        self.dropped = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.window_ms > 0
+
+    def stats(self) -> Dict[str, int]:
+        return {"passed": self.passed, "dropped": self.dropped, "tracks": len(self._last)}
+
+    def _changed(self, last: _Last, p: ParEventPayload, qvec: Optional[np.ndarray]) -> bool:
+        if _iou(last.bbox, p.bbox_ltrb) < self.min_iou:
+            return True
+        if qvec is not None and last.qvec is not None:
+            denom = float(np.linalg.norm(last.qvec) * np.linalg.norm(qvec)) or 1.0
+            return 1.0 - float(np.dot(last.qvec, qvec)) / denom > self.max_emb_dist
+        return False
+
+    def admit(self, p: ParEventPayload, ts_ms: int, qvec: Optional[np.ndarray] = None) -> bool:
+        """True if the event should be processed; False if it was debounced."""
+        key = (p.camera_id, p.track_id)
+        self._calls += 1
+        if self._calls % _PRUNE_EVERY == 0:
+            self._prune(ts_ms)
+
+        if p.event_type != "appearance":
+            self._last.pop(key, None)
+            self.passed += 1
+            return True
+
+        last = self._last.get(key)
+        if last is not None and ts_ms - last.ts_ms < self.window_ms and not self._changed(last, p, qvec):
+            self.dropped += 1
+            return False
+
+        self._last[key] = _Last(ts_ms, list(p.bbox_ltrb), qvec)
+        self.passed += 1
+        return True
+
+    def _prune(self, now_ms: int) -> None:
+        # tracks whose disappearance never arrived
+        horizon = max(self.window_ms * 10, 60_000)
+        stale = [k for k, v in self._last.items() if now_ms - v.ts_ms > horizon]
+        for k in stale:
+            del self._last[k]
+        log.debug("Debouncer: %s (pruned %d)", self.stats(), len(stale))
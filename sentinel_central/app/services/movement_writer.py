@@ -0,0 +1,127 @@
+import asyncio
+import os
+import time
+from typing import Any, List, Optional, Tuple
+
+from sqlalchemy import insert
+
+from app.db.db import engine
+from app.db.models import MovementORM
+
+import logging
+log = logging.getLogger(__name__)
+
+# flush when this many rows are buffered or the oldest row is this old
+MOVEMENT_FLUSH_ROWS = int(os.getenv("MOVEMENT_FLUSH_ROWS", "200"))   # <= 1 writes each row
+MOVEMENT_FLUSH_MS = int(os.getenv("MOVEMENT_FLUSH_MS", "500"))
+# backlog cap while writes fail (DB down): the oldest rows are dropped beyond it
+MOVEMENT_BUFFER_MAX = int(os.getenv("MOVEMENT_BUFFER_MAX", "50000"))
+
+MOVEMENT_COLUMNS = (
+    "resolved_id", "state", "location_id", "camera_id", "edge_id", "ts_ms", "track_id", "annotation_name",
+)
+MovementRow = Tuple[Any, ...]  # values in MOVEMENT_COLUMNS order
+
+
+class MovementWriter:
+    """
+    Buffers movement rows and writes them with COPY (asyncpg) or a multi-row
+    INSERT, on a size or age threshold. close() flushes whatever is left, so a
+    graceful shutdown loses nothing; depth exposes the current backlog.
+    While writes keep failing the backlog is capped at max_buffered rows; the
+    oldest are dropped first and counted in dropped.
+    """
+    def __init__(self, max_rows: int = MOVEMENT_FLUSH_ROWS, max_delay_ms: int = MOVEMENT_FLUSH_MS,
+                 max_buffered: int = MOVEMENT_BUFFER_MAX):
+        self.max_rows = max_rows
+        self.max_delay_ms = max_delay_ms
+        self.max_buffered = max(max_buffered, max_rows)
+        self._buf: List[MovementRow] = []
+        self._oldest: float = 0.0
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._closed = False
+        self.flushes = 0
+        self.rows_written = 0
+        self.dropped = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_rows > 1
+
+    @property
+    def depth(self) -> int:
+        return len(self._buf)
+
+    async def add(self, row: MovementRow) -> None:
+        if self._closed:
+            raise RuntimeError("MovementWriter is closed")
+        if not self._buf:
+            self._oldest = time.monotonic()
+        self._buf.append(row)
+        self._trim()
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name="movement-writer")
+        if len(self._buf) >= self.max_rows:
+            try:
+                await self.flush()
+            except Exception:
+                log.exception("Movement flush failed (depth=%d)", self.depth)
+
+    def _trim(self) -> None:
+        over = len(self._buf) - self.max_buffered
+        if over > 0:
+            del self._buf[:over]
+            if self.dropped == 0 or (self.dropped + over) // 1000 > self.dropped // 1000:
+                log.warning("Movement backlog full (%d rows); dropped %d oldest so far",
+                            self.max_buffered, self.dropped + over)
+            self.dropped += over
+
+    async def _run(self) -> None:
+        interval = self.max_delay_ms / 1000.0
+        while True:
+            await asyncio.sleep(interval / 2)
+            if self._buf and time.monotonic() - self._oldest >= interval:
+                try:
+                    await self.flush()
+                except Exception:
+                    # rows stay buffered; retried on the next tick
+                    log.exception("Movement flush failed (depth=%d)", self.depth)
+
+    async def flush(self) -> int:
+        async with self._lock:
+            if not self._buf:
+                return 0
+            rows, self._buf = self._buf, []
+            try:
+                await self._write(rows)
+            except Exception:
+                self._buf[:0] = rows
+                self._trim()
+                raise
+            self.flushes += 1
+            self.rows_written += len(rows)
+            log.debug("Flushed %d movements (depth=%d)", len(rows), self.depth)
+            return len(rows)
+
+    @staticmethod
+    async def _write(rows: List[MovementRow]) -> None:
+        async with engine.connect() as conn:
+            raw = await conn.get_raw_connection()
+            driver = getattr(raw, "driver_connection", None)
+            if hasattr(driver, "copy_records_to_table"):
+                await driver.copy_records_to_table(
+                    MovementORM.__tablename__, records=rows, columns=list(MOVEMENT_COLUMNS)
+                )
+            else:
+                await conn.execute(insert(MovementORM), [dict(zip(MOVEMENT_COLUMNS, r)) for r in rows])
+                await conn.commit()
+
+    async def close(self) -> None:
+        """Stop the timer and flush the remaining rows."""
+        self._closed = True
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
@@ -1,12 +1,22 @@
+import asyncio
 import json
+import os
 import numpy as np
 from sqlalchemy import text
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.common.utils import to_pgvector_literal
-from app.db.models import PersonSessionORM
+from app.events import attr_mask
+from app.db import statements
+from app.db.db import get_session
 import time, uuid
 
+import logging
+log = logging.getLogger(__name__)
 
+# open sessions with no Move-In activity for this long are closed by the sweeper
+SESSION_IDLE_TIMEOUT_MS = int(os.getenv("SESSION_IDLE_TIMEOUT_MS", str(30 * 60 * 1000)))
+SESSION_SWEEP_EVERY_S = float(os.getenv("SESSION_SWEEP_EVERY_S", "60"))
+SESSION_SWEEP_BATCH = int(os.getenv("SESSION_SWEEP_BATCH", "500"))
 
 def _new_session_id(ts_ms: int) -> str:
     return f"s_{ts_ms}_{uuid.uuid4().hex[:6]}"
@@ -24,77 +34,69 @@ async def open_or_update_session_on_move_in(
     rep_embedding: list[float] | None,
     track_id: str | None,
 ) -> None:
-    # if there is an active session (no disappear_ms) for same resolved_id+location+camera, don’t create a duplicate
-    row = (await s.execute(
-        text("""
-            SELECT session_id FROM person_sessions
-            WHERE track_id = :tid
-              AND COALESCE(location_id,'') = COALESCE(:loc,'')
-              AND COALESCE(camera_id,'') = COALESCE(:cam,'')
-              AND disappear_ms IS NULL
-            ORDER BY appear_ms DESC
-            LIMIT 1
-        """), {"tid": track_id, "loc": location_id, "cam": camera_id}
-    )).first()
+    params = {
+        "id":     _new_session_id(ts_ms),
+        "rid":    resolved_id,
+        "tid":    track_id,
+        "loc":    location_id,
+        "cam":    camera_id,
+        "ts":     ts_ms,
+        "img":    rep_image,                                  # str | None
+        "attrs":  json.dumps(rep_attrs) if isinstance(rep_attrs, dict) else None,          # str | None
+        "anames": json.dumps(rep_attr_names) if isinstance(rep_attr_names, list) else None,  # str | None
 
-    if row:
-        # already active; optionally refresh representative fields (first image wins, or update if empty)
-        stmt = text("""
-            UPDATE person_sessions
-            SET image_path = COALESCE(image_path, :img),
-                attributes = COALESCE(attributes, CAST(:attrs AS jsonb)),
-                attr_names = COALESCE(attr_names, CAST(:anames AS jsonb)),
-                -- Ensure the parameter has a type even when NULL:
-                attr_scores = COALESCE(CAST(:scores AS vector), attr_scores),
-                embedding   = COALESCE(CAST(:emb AS vector), embedding)
-            WHERE session_id = :sid
-        """)
+        # For pgvector, pass a string literal like "[0.1,0.2,...]" or None
+        "scores": (to_pgvector_literal(np.asarray(rep_scores, dtype="float32"))
+                if rep_scores is not None else None),
+        "mask":   attr_mask(rep_scores),
+        "emb":    (to_pgvector_literal(np.asarray(rep_embedding, dtype="float32"))
+                if rep_embedding is not None else None),
+    }
 
-        params = {
-            "img":    rep_image,                                  # str | None
-            "attrs":  json.dumps(rep_attrs) if rep_attrs is not None else None,       # str | None
-            "anames": json.dumps(rep_attr_names) if rep_attr_names is not None else None,  # str | None
-
-            # For pgvector, pass a string literal like "[0.1,0.2,...]" or None
-            "scores": (to_pgvector_literal(np.asarray(rep_scores, dtype="float32"))
-                    if rep_scores is not None else None),
-            "emb":    (to_pgvector_literal(np.asarray(rep_embedding, dtype="float32"))
-                    if rep_embedding is not None else None),
-
-            "sid":    row[0],  # the session_id you fetched
-        }
-
-        # IMPORTANT: pass a DICT (named params), NOT a tuple/list
-        await s.execute(stmt, params)
-        return
-
-    ps = PersonSessionORM(
-        id=_new_session_id(ts_ms),
-        resolved_id=resolved_id,
-        track_id=track_id,
-        location_id=location_id,
-        camera_id=camera_id,
-        appear_ms=ts_ms,
-        disappear_ms=None,
-        attributes=rep_attrs if isinstance(rep_attrs, dict) else None,
-        attr_names=rep_attr_names if isinstance(rep_attr_names, list) else None,
-        image_path=rep_image
-    )
-    # Optional vectors (use ORM type if you mapped pgvector)
-    setattr(ps, "attr_scores", rep_scores)
-    setattr(ps, "embedding", rep_embedding)
-    s.add(ps)
+    await statements.execute(s, statements.SESSION_OPEN, **params)
 
 async def close_session_on_move_out(
     s: AsyncSession, track_id: str, location_id: str | None, camera_id: str | None, ts_ms: int
 ) -> None:
-    await s.execute(
-        text("""
-            UPDATE person_sessions
-            SET disappear_ms = :ts
-            WHERE track_id = :tid
-              AND COALESCE(location_id,'') = COALESCE(:loc,'')
-              AND COALESCE(camera_id,'') = COALESCE(:cam,'')
-              AND disappear_ms IS NULL
-        """), {"ts": ts_ms, "tid": track_id, "loc": location_id, "cam": camera_id}
+    await statements.execute(
+        s, statements.SESSION_CLOSE, ts=ts_ms, tid=track_id, loc=location_id, cam=camera_id
     )
+
+async def close_stale_sessions(s: AsyncSession, idle_ms: int, now_ms: int, batch: int = SESSION_SWEEP_BATCH) -> int:
+    """
+    Close open sessions with no activity for idle_ms (their Move-Out was lost),
+    in batches of `batch` rows. disappear_ms is set to the last activity time.
+    Returns the number of sessions closed.
+    """
+    closed = 0
+    while True:
+        n = (await s.execute(
+            text("""
+                UPDATE person_sessions ps
+                SET disappear_ms = COALESCE(ps.last_seen_ms, ps.appear_ms)
+                FROM (
+                    SELECT session_id FROM person_sessions
+                    WHERE disappear_ms IS NULL
+                      AND COALESCE(last_seen_ms, appear_ms) < :cutoff
+                    LIMIT :batch
+                    FOR UPDATE SKIP LOCKED
+                ) stale
+                WHERE ps.session_id = stale.session_id
+            """), {"cutoff": now_ms - idle_ms, "batch": batch}
+        )).rowcount
+        await s.commit()
+        closed += n
+        if n < batch:
+            return closed
+
+async def session_sweeper(idle_ms: int = SESSION_IDLE_TIMEOUT_MS, every_s: float = SESSION_SWEEP_EVERY_S) -> None:
+    """Periodic task: close sessions idle past the timeout."""
+    while True:
+        try:
+            async with get_session() as s:
+                n = await close_stale_sessions(s, idle_ms, int(time.time() * 1000))
+            if n:
+                log.info("Session sweeper closed %d stale sessions (idle > %dms)", n, idle_ms)
+        except Exception as e:
+            log.exception("Session sweep failed: %s", e)
+        await asyncio.sleep(every_s)
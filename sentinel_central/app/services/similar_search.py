@@ -0,0 +1,174 @@
+"""
+Cross-camera "where else did this person appear" search over par_events.embedding.
+
+Candidates are generated one of two ways:
+  * prefilter: when the time/location/camera window holds few embedded rows
+    (counted with a bounded probe), those rows are fetched by their btree
+    indexes and ranked exactly -- no ANN recall loss for narrow windows;
+  * ANN: otherwise the ivfflat index (idx_par_events_embed_cos) is scanned
+    with more probes and over-fetched, and the window filters are applied to
+    its output.
+Hits are grouped per (cam_id, track_id) and paged with a keyset cursor on
+(best_distance, cam_id, track_id).
+"""
+import base64
+import json
+import os
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.common.utils import from_pgvector_value, to_pgvector_literal, unit
+
+import logging
+log = logging.getLogger(__name__)
+
+SIMILAR_MAX_DISTANCE = float(os.getenv("SIMILAR_MAX_DISTANCE", "0.35"))       # cosine distance
+SIMILAR_CANDIDATES = int(os.getenv("SIMILAR_CANDIDATES", "2000"))            # hits before grouping
+SIMILAR_PREFILTER_MAX_ROWS = int(os.getenv("SIMILAR_PREFILTER_MAX_ROWS", "50000"))
+SIMILAR_IVFFLAT_PROBES = int(os.getenv("SIMILAR_IVFFLAT_PROBES", "32"))
+SIMILAR_MAX_WINDOW_MS = int(os.getenv("SIMILAR_MAX_WINDOW_MS", str(90 * 24 * 3600 * 1000)))
+
+Cursor = Tuple[float, str, str]   # (best_distance, cam_id, track_id) of the last group returned
+
+
+def encode_cursor(c: Cursor) -> str:
+    return base64.urlsafe_b64encode(json.dumps(list(c)).encode()).decode().rstrip("=")
+
+
+def decode_cursor(token: Optional[str]) -> Optional[Cursor]:
+    if not token:
+        return None
+    try:
+        d, cam, track = json.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+        return float(d), str(cam), str(track)
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+
+async def query_embedding(s: AsyncSession, embedding: Optional[List[float]] = None,
+                          resolved_id: Optional[str] = None, event_id: Optional[int] = None) -> Optional[np.ndarray]:
+    """The search vector: an explicit embedding, an identity's canonical one, or a par-event's."""
+    if embedding is not None:
+        return unit(np.asarray(embedding, dtype=np.float32))
+    if resolved_id is not None:
+        sql, params = "SELECT embedding FROM identities WHERE id = :k", {"k": resolved_id}
+    elif event_id is not None:
+        sql, params = "SELECT embedding FROM par_events WHERE id = :k", {"k": event_id}
+    else:
+        return None
+    e = (await s.execute(text(sql), params)).scalar_one_or_none()
+    return None if e is None else unit(from_pgvector_value(e))
+
+
+def _window_sql(location_id: Optional[str], camera_ids: Optional[List[str]]) -> str:
+    sql = "ts_ms BETWEEN :start_ms AND :end_ms AND embedding IS NOT NULL"
+    if location_id is not None:
+        sql += " AND location_id = :location_id"
+    if camera_ids:
+        sql += " AND cam_id = ANY(:camera_ids)"
+    return sql
+
+
+async def _prefilter_size(s: AsyncSession, where: str, params: Dict[str, Any], cap: int) -> int:
+    # bounded: stops counting at cap+1, so a wide window costs at most one index range scan of cap rows
+    return int((await s.execute(
+        text(f"SELECT count(*) FROM (SELECT 1 FROM par_events WHERE {where} LIMIT :cap) t"),
+        {**params, "cap": cap + 1},
+    )).scalar_one())
+
+
+async def similar_people(
+    s: AsyncSession,
+    qvec: np.ndarray,
+    start_ms: int,
+    end_ms: int,
+    location_id: Optional[str] = None,
+    camera_ids: Optional[List[str]] = None,
+    max_distance: float = SIMILAR_MAX_DISTANCE,
+    limit: int = 20,
+    cursor: Optional[Cursor] = None,
+    exclude_track: Optional[Tuple[str, str]] = None,
+) -> Dict[str, Any]:
+    where = _window_sql(location_id, camera_ids)
+    params: Dict[str, Any] = {
+        "q": to_pgvector_literal(qvec),
+        "start_ms": start_ms, "end_ms": end_ms,
+        "location_id": location_id, "camera_ids": camera_ids,
+        "k": SIMILAR_CANDIDATES, "max_d": max_distance, "lim": limit + 1,
+    }
+
+    n = await _prefilter_size(s, where, params, SIMILAR_PREFILTER_MAX_ROWS)
+    strategy = "prefilter" if n <= SIMILAR_PREFILTER_MAX_ROWS else "ann"
+    if strategy == "prefilter":
+        # MATERIALIZED keeps the planner on the ts/location btree indexes (exact ranking)
+        hits = f"""
+            cand AS MATERIALIZED (
+                SELECT id, cam_id, track_id, location_id, resolved_id, ts_ms, embedding
+                FROM par_events WHERE {where}
+            ),
+            hits AS (
+                SELECT id, cam_id, track_id, location_id, resolved_id, ts_ms,
+                       embedding <=> (:q)::vector AS dist
+                FROM cand ORDER BY dist LIMIT :k
+            )"""
+    else:
+        await s.execute(text(f"SET LOCAL ivfflat.probes = {int(SIMILAR_IVFFLAT_PROBES)}"))
+        hits = f"""
+            hits AS MATERIALIZED (
+                SELECT id, cam_id, track_id, location_id, resolved_id, ts_ms,
+                       embedding <=> (:q)::vector AS dist
+                FROM par_events WHERE {where}
+                ORDER BY embedding <=> (:q)::vector LIMIT :k
+            )"""
+
+    having = ""
+    if cursor is not None:
+        having = "HAVING (min(dist), cam_id, track_id) > (:c_dist, :c_cam, :c_track)"
+        params.update(c_dist=cursor[0], c_cam=cursor[1], c_track=cursor[2])
+    if exclude_track is not None:
+        where_hits = "dist <= :max_d AND NOT (cam_id = :x_cam AND track_id = :x_track)"
+        params.update(x_cam=exclude_track[0], x_track=exclude_track[1])
+    else:
+        where_hits = "dist <= :max_d"
+
+    rows = (await s.execute(text(f"""
+        WITH {hits}
+        SELECT cam_id, track_id,
+               min(location_id)                        AS location_id,
+               (array_agg(resolved_id ORDER BY dist))[1] AS resolved_id,
+               (array_agg(id ORDER BY dist))[1]          AS best_event_id,
+               min(dist)                               AS best_distance,
+               count(*)                                AS hits,
+               min(ts_ms)                              AS first_ms,
+               max(ts_ms)                              AS last_ms
+        FROM hits
+        WHERE {where_hits}
+        GROUP BY cam_id, track_id
+        {having}
+        ORDER BY best_distance, cam_id, track_id
+        LIMIT :lim
+    """), params)).mappings().all()
+
+    groups = [dict(r) for r in rows[:limit]]
+    for g in groups:
+        g["best_distance"] = float(g["best_distance"])
+    cameras: Dict[str, Dict[str, Any]] = {}
+    for g in groups:
+        c = cameras.setdefault(g["cam_id"], {"cam_id": g["cam_id"], "tracks": 0, "best_distance": g["best_distance"],
+                                             "first_ms": g["first_ms"], "last_ms": g["last_ms"]})
+        c["tracks"] += 1
+        c["first_ms"] = min(c["first_ms"], g["first_ms"])
+        c["last_ms"] = max(c["last_ms"], g["last_ms"])
+
+    last = groups[-1] if groups else None
+    return {
+        "strategy": strategy,
+        "results": groups,
+        "cameras": sorted(cameras.values(), key=lambda c: c["best_distance"]),
+        "count": len(groups),
+        "next_cursor": encode_cursor((last["best_distance"], last["cam_id"], last["track_id"]))
+        if last is not None and len(rows) > limit else None,
+    }
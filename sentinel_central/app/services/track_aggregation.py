@@ -0,0 +1,145 @@
+import os
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.common.utils import unit
+from app.events import ParEventPayload
+
+import logging
+log = logging.getLogger(__name__)
+
+# resolve once per track on the first K embeddings or after T ms, whichever comes first
+AGG_MAX_DETECTIONS = int(os.getenv("IDF_AGG_K", "5"))     # <= 1 disables aggregation
+AGG_MAX_WAIT_MS = int(os.getenv("IDF_AGG_T_MS", "1500"))
+# resolved tracks whose disappearance was lost are forgotten after this idle time
+AGG_TRACK_TTL_MS = int(os.getenv("IDF_AGG_TRACK_TTL_MS", str(10 * 60 * 1000)))
+
+TrackKey = Tuple[str, str]  # (cam_id, track_id)
+
+
+@dataclass
+class Detection:
+    envelope: Dict[str, Any]
+    payload: ParEventPayload
+    qvec: Optional[np.ndarray]
+
+    @property
+    def ts_ms(self) -> int:
+        return int(self.envelope["ts_ms"])
+
+    @property
+    def key(self) -> TrackKey:
+        return (self.payload.camera_id, self.payload.track_id)
+
+    @property
+    def quality(self) -> float:
+        # bbox area as a quality proxy: larger crops give more reliable embeddings
+        l, t, r, b = self.payload.bbox_ltrb
+        return float(max(1, (r - l) * (b - t)))
+
+
+@dataclass
+class TrackResolution:
+    resolved_id: str
+    best: float
+    second: Optional[float]
+    is_new: bool
+    rep_event_id: Optional[int]
+
+
+@dataclass
+class _TrackState:
+    pending: List[Detection] = field(default_factory=list)
+    first_ts_ms: int = 0
+    last_ts_ms: int = 0
+    resolution: Optional[TrackResolution] = None
+
+
+class TrackAggregator:
+    """
+    Buffers appearance detections per (cam_id, track_id) until K embeddings or
+    T ms have been collected, so a track is resolved once on the quality-weighted
+    mean embedding. After that, later detections of the same track reuse the
+    cached resolution.
+    """
+    def __init__(self, max_detections: int = AGG_MAX_DETECTIONS, max_wait_ms: int = AGG_MAX_WAIT_MS,
+                 track_ttl_ms: int = AGG_TRACK_TTL_MS):
+        self.max_detections = max_detections
+        self.max_wait_ms = max_wait_ms
+        self.track_ttl_ms = track_ttl_ms
+        self._tracks: Dict[TrackKey, _TrackState] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_detections > 1
+
+    @property
+    def pending_tracks(self) -> int:
+        return sum(1 for st in self._tracks.values() if st.pending)
+
+    def resolution(self, key: TrackKey) -> Optional[TrackResolution]:
+        st = self._tracks.get(key)
+        return st.resolution if st else None
+
+    def touch(self, key: TrackKey, ts_ms: int) -> None:
+        st = self._tracks.get(key)
+        if st:
+            st.last_ts_ms = max(st.last_ts_ms, ts_ms)
+
+    def add(self, det: Detection) -> Optional[List[Detection]]:
+        """Buffer a detection; returns the group when it is ready to resolve."""
+        st = self._tracks.setdefault(det.key, _TrackState())
+        if not st.pending:
+            st.first_ts_ms = det.ts_ms
+        # broker redeliveries carry the same ts_ms; keep one copy per timestamp
+        if any(d.ts_ms == det.ts_ms for d in st.pending):
+            return None
+        st.pending.append(det)
+        st.last_ts_ms = max(st.last_ts_ms, det.ts_ms)
+        if len(st.pending) >= self.max_detections or det.ts_ms - st.first_ts_ms >= self.max_wait_ms:
+            return self.pop_pending(det.key)
+        return None
+
+    def is_pending(self, key: TrackKey, ts_ms: int) -> bool:
+        """True while the detection at ts_ms is buffered, i.e. not yet written."""
+        st = self._tracks.get(key)
+        return st is not None and any(d.ts_ms == ts_ms for d in st.pending)
+
+    def pop_pending(self, key: TrackKey) -> List[Detection]:
+        st = self._tracks.get(key)
+        if not st or not st.pending:
+            return []
+        group, st.pending = st.pending, []
+        return group
+
+    def set_resolution(self, key: TrackKey, res: TrackResolution) -> None:
+        self._tracks.setdefault(key, _TrackState()).resolution = res
+
+    def forget(self, key: TrackKey) -> None:
+        self._tracks.pop(key, None)
+
+    def expired(self, now_ms: int) -> List[List[Detection]]:
+        """Pop groups that waited longer than T, and drop long-idle resolved tracks."""
+        ready: List[List[Detection]] = []
+        for key, st in list(self._tracks.items()):
+            if st.pending and now_ms - st.first_ts_ms >= self.max_wait_ms:
+                ready.append(self.pop_pending(key))
+            elif not st.pending and now_ms - st.last_ts_ms >= self.track_ttl_ms:
+                del self._tracks[key]
+        return ready
+
+    def drain(self) -> List[List[Detection]]:
+        """Pop every pending group (shutdown)."""
+        return [g for g in (self.pop_pending(k) for k in list(self._tracks)) if g]
+
+    @staticmethod
+    def representative(group: List[Detection]) -> Detection:
+        return max(group, key=lambda d: d.quality)
+
+    @staticmethod
+    def weighted_mean(group: List[Detection]) -> np.ndarray:
+        vecs = np.stack([d.qvec for d in group]).astype(np.float32, copy=False)
+        w = np.asarray([d.quality for d in group], dtype=np.float32)
+        return unit((w[:, None] * vecs).sum(axis=0) / w.sum())
@@ -0,0 +1,107 @@
+"""
+Person trajectory over `movements`: ordered Move-In/Move-Out rows become
+per-camera segments, with consecutive segments at the same camera collapsed.
+Rows are streamed (ix_mv_resolved_ts serves the resolved_id + ts_ms range), so
+a long window never has to fit in memory; the response is capped.
+"""
+import os
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+TRAJECTORY_MAX_SEGMENTS = int(os.getenv("TRAJECTORY_MAX_SEGMENTS", "50"))
+_STREAM_BATCH = 1000
+
+
+@dataclass
+class Segment:
+    location_id: str
+    camera_id: str
+    enter_ms: Optional[int]      # None: already inside when the window started
+    exit_ms: Optional[int]       # None: still inside (or Move-Out not seen yet)
+    last_ms: int
+    moves: int = 1
+
+    @property
+    def dwell_ms(self) -> Optional[int]:
+        if self.enter_ms is None:
+            return None
+        return (self.exit_ms or self.last_ms) - self.enter_ms
+
+    def to_dict(self) -> Dict[str, Any]:
+        d = asdict(self)
+        d["dwell_ms"] = self.dwell_ms
+        return d
+
+
+class TrajectoryBuilder:
+    def __init__(self) -> None:
+        self.segments: List[Segment] = []
+        self.rows = 0
+
+    def add(self, state: str, location_id: str, camera_id: str, ts_ms: int) -> None:
+        self.rows += 1
+        cur = self.segments[-1] if self.segments else None
+        same = cur is not None and cur.camera_id == camera_id and cur.location_id == location_id
+        if state == "Move-In":
+            if same:
+                # back at the same camera (or a repeated Move-In): one continuous stay
+                cur.exit_ms = None
+                cur.last_ms = ts_ms
+                cur.moves += 1
+            else:
+                if cur is not None and cur.exit_ms is None:
+                    # Move-Out lost or cameras overlap: seen elsewhere now, so the stay ended
+                    cur.exit_ms = ts_ms
+                self.segments.append(Segment(location_id, camera_id, ts_ms, None, ts_ms))
+        else:  # Move-Out
+            if same:
+                cur.exit_ms = ts_ms
+                cur.last_ms = ts_ms
+                cur.moves += 1
+            else:
+                self.segments.append(Segment(location_id, camera_id, None, ts_ms, ts_ms))
+
+    def summary(self, max_segments: int = TRAJECTORY_MAX_SEGMENTS) -> Dict[str, Any]:
+        segs = self.segments
+        dwell: Dict[str, int] = {}
+        for sg in segs:
+            if sg.dwell_ms is not None:
+                dwell[sg.location_id] = dwell.get(sg.location_id, 0) + sg.dwell_ms
+        omitted = max(0, len(segs) - max_segments)
+        if omitted:
+            # keep where the person started and where they ended up
+            head = max_segments // 2
+            segs = segs[:head] + segs[len(segs) - (max_segments - head):]
+        return {
+            "movements": self.rows,
+            "segment_count": len(self.segments),
+            "segments": [sg.to_dict() for sg in segs],
+            "omitted_segments": omitted,
+            "cameras": sorted({sg.camera_id for sg in self.segments}),
+            "locations": sorted({sg.location_id for sg in self.segments}),
+            "dwell_ms_by_location": dwell,
+            "first_ms": self.segments[0].enter_ms or self.segments[0].last_ms if self.segments else None,
+            "last_ms": self.segments[-1].last_ms if self.segments else None,
+            "current": self.segments[-1].to_dict() if self.segments and self.segments[-1].exit_ms is None else None,
+        }
+
+
+async def person_trajectory(s: AsyncSession, resolved_id: str, start_ms: int, end_ms: int,
+                            max_segments: int = TRAJECTORY_MAX_SEGMENTS) -> Dict[str, Any]:
+    b = TrajectoryBuilder()
+    result = await s.stream(
+        text("""
+            SELECT state, location_id, camera_id, ts_ms
+            FROM movements
+            WHERE resolved_id = :rid AND ts_ms BETWEEN :start_ms AND :end_ms
+            ORDER BY resolved_id, ts_ms, id
+        """),
+        {"rid": resolved_id, "start_ms": start_ms, "end_ms": end_ms},
+        execution_options={"yield_per": _STREAM_BATCH},
+    )
+    async for state, location_id, camera_id, ts_ms in result:
+        b.add(state, location_id, camera_id, int(ts_ms))
+    return b.summary(max_segments)
@@ -1,15 +1,20 @@
-from typing import Dict, Any, Optional
+import asyncio
+import time
+from typing import Dict, Any, List, Optional
 
 import numpy as np
-from app.common.repository import _get_tracking_info
-from app.envelope import pack_event
-from app.events import ParEventPayload, TtsEventPayload, MovementUpdatePayload
-from app.bus import MessageBus
+from app.common.repository import _get_tracking_info, insert_par_events, set_par_events_resolved
+from app.envelope import unpack_payload
+from app.events import ATTR_MASK_THRESHOLD, ParEventPayload, TtsEventPayload, MovementUpdatePayload
+from app.bus import Bus
 from app.db.db import get_session
 from app.db.models import ParEventORM, MovementORM
 from app.common.resolve import Resolver
+from app.common.gallery import HotGallery
 from sqlalchemy import text
 from app.services.sesessions import open_or_update_session_on_move_in, close_session_on_move_out
+from app.services.debounce import AppearanceDebouncer
+from app.services.track_aggregation import Detection, TrackAggregator, TrackResolution
 
 
 import logging
@@ -17,100 +22,256 @@ import logging
 log = logging.getLogger(__name__)
 
 class IDFusion:
-    def __init__(self, bus: MessageBus, created_by: str = "idf-service-1"):
+    def __init__(self, bus: Bus, created_by: str = "idf-service-1"):
         self.bus = bus
         self.created_by = created_by
-        self.resolver = Resolver(tau_same=0.22, tau_ambig=0.30, delta_min=0.05)
+        # hot tier (recently seen identities) is searched before the full pgvector gallery
+        self.resolver = Resolver(tau_same=0.22, tau_ambig=0.30, delta_min=0.05, gallery=HotGallery())
+        # resolve once per (cam_id, track_id) on the first K embeddings / T ms of a track
+        self.aggregator = TrackAggregator()
+        # drops near-identical repeat appearances before they reach the DB/resolver/TTS
+        self.debouncer = AppearanceDebouncer()
+        # par-events skipped by ON CONFLICT (redeliveries / edge retries)
+        self.duplicates = 0
+        # aggregation state is shared by the handlers and the expiry sweep
+        self._agg_lock = asyncio.Lock()
+        # event-time watermark: newest ts_ms seen, and when (monotonic) it last moved
+        self._watermark_ms = 0
+        self._watermark_at = 0.0
 
-    async def handle_par_event(self, envelope: Dict[str, Any]):
-        p = ParEventPayload(**envelope["payload"])
+    @staticmethod
+    def _embedding(p: ParEventPayload) -> Optional[np.ndarray]:
+        if not p.embedding:
+            return None
+        if len(p.embedding) != 512:
+            log.warning("Bad embedding length=%d (expected 512); dropping", len(p.embedding))
+            return None
+        v = np.asarray(p.embedding, dtype=np.float32)
+        n = float(np.linalg.norm(v))
+        if not (0.999 <= n <= 1.001):
+            log.warning("Embedding not unit-norm (%.6f); edge should normalize", n)
+        return v
 
-        appeared = p.event_type == "appearance"
+    @staticmethod
+    def _event_values(det: Detection, embedding: Optional[np.ndarray], **meta: Any) -> Dict[str, Any]:
+        p = det.payload
         attrs_json, attrs_vec = p.parse_attributes()
+        return dict(
+            track_id=p.track_id,
+            resolved_id=None,            # fill below
+            appeared=p.event_type == "appearance",
+            meta={
+                "event_type": p.event_type,
+                "image_path": getattr(p, "image_path", None),
+                "frame": getattr(p, "frame", None),
+                "edge_normed": True,
+                **meta,
+            },
+            ts_ms=det.ts_ms,
+            cam_id=p.camera_id,
+            edge_id=p.edge_id,
+            location_id=p.location_id,
+            bbox_ltrb=p.bbox_ltrb,
+            embedding=embedding.tolist() if embedding is not None else None,  # may be None
+            attributes=attrs_json or None,
+            attr_scores=attrs_vec or None,
+        )
 
-        emb_list = None
-        qvec = None
+    async def handle_par_event(self, envelope: Dict[str, Any]) -> bool:
+        """Process one par-event envelope; False if it was debounced."""
+        p = unpack_payload(envelope, ParEventPayload)
+        det = Detection(envelope, p, self._embedding(p))
+        appeared = p.event_type == "appearance"
 
-        if p.embedding:
-            if len(p.embedding) != 512:
-                log.warning("Bad embedding length=%d (expected 512); dropping", len(p.embedding))
-            else:
-                v = np.asarray(p.embedding, dtype=np.float32)
-                n = float(np.linalg.norm(v))
-                if not (0.999 <= n <= 1.001):
-                    log.warning("Embedding not unit-norm (%.6f); edge should normalize", n)
-                emb_list = v.tolist()
-                qvec = v
+        if self.debouncer.enabled and not self.debouncer.admit(p, det.ts_ms, det.qvec):
+            log.debug("[IDFusion] debounced cam=%s track=%s (dropped=%d)", p.camera_id, p.track_id, self.debouncer.dropped)
+            return False
 
         log.info(f"[IDFusion] par_event[{p.event_type}] from {envelope.get('created_by')} cam={p.camera_id} track={p.track_id}")
 
+        if not self.aggregator.enabled:
+            await self._handle_single(det)
+            return True
+
+        async with self._agg_lock:
+            if det.ts_ms > self._watermark_ms:
+                self._watermark_ms, self._watermark_at = det.ts_ms, time.monotonic()
+            return await self._handle_aggregated(det, appeared)
+
+    async def _handle_aggregated(self, det: Detection, appeared: bool) -> bool:
+        # groups of other tracks that waited past T are resolved on this tick
+        for group in self.aggregator.expired(det.ts_ms):
+            await self._resolve_group(group)
+
+        if appeared and det.qvec is not None:
+            res = self.aggregator.resolution(det.key)
+            if res is not None:
+                self.aggregator.touch(det.key, det.ts_ms)
+                await self._store_resolved(det, res)
+                return True
+            group = self.aggregator.add(det)
+            if group:
+                await self._resolve_group(group)
+            return True
+
+        if not appeared:
+            # flush what the track buffered before it left, then drop its state
+            group = self.aggregator.pop_pending(det.key)
+            if group:
+                await self._resolve_group(group)
+            self.aggregator.forget(det.key)
+        await self._handle_single(det)
+        return True
+
+    async def handle_par_batch(self, envelopes: List[Dict[str, Any]]) -> List[str]:
+        """
+        Process a batch of validated par-event envelopes in ts_ms order (HTTP
+        ingest). Returns one status per envelope, in input order:
+        "accepted" (written), "buffered" (held for track aggregation, written
+        by a later flush), "debounced" or "error".
+
+        Items go through handle_par_event one at a time; the batch only fixes
+        the order, inserts are not combined across items.
+        """
+        statuses = ["error"] * len(envelopes)
+        for i in sorted(range(len(envelopes)), key=lambda i: int(envelopes[i]["ts_ms"])):
+            try:
+                statuses[i] = "accepted" if await self.handle_par_event(envelopes[i]) else "debounced"
+            except Exception:
+                log.exception("[IDFusion] batch item %d failed", i)
+        if self.aggregator.enabled:
+            # tracks whose first detections arrived in this batch are resolved once T has passed
+            await self.flush_pending(max((int(e["ts_ms"]) for e in envelopes), default=0))
+            for i, env in enumerate(envelopes):
+                p = unpack_payload(env, ParEventPayload)
+                if statuses[i] == "accepted" and self.aggregator.is_pending(
+                        (p.camera_id, p.track_id), int(env["ts_ms"])):
+                    statuses[i] = "buffered"
+        return statuses
+
+    def watermark_ms(self) -> Optional[int]:
+        """Event time now: the newest ts_ms seen plus the wall time since it arrived."""
+        if not self._watermark_ms:
+            return None
+        return self._watermark_ms + int((time.monotonic() - self._watermark_at) * 1000)
+
+    async def flush_pending(self, now_ms: Optional[int] = None) -> int:
+        """Resolve buffered tracks older than T at event time now_ms (all of them when None)."""
+        async with self._agg_lock:
+            groups = self.aggregator.drain() if now_ms is None else self.aggregator.expired(now_ms)
+            for group in groups:
+                await self._resolve_group(group)
+        return len(groups)
+
+    async def flush_expired(self) -> int:
+        """Periodic sweep: resolve tracks whose stream went quiet, at the event-time watermark."""
+        now = self.watermark_ms()
+        return 0 if now is None else await self.flush_pending(now)
+
+    async def _handle_single(self, det: Detection) -> None:
+        """Persist and (on appearance with an embedding) resolve one detection."""
+        appeared = det.payload.event_type == "appearance"
         resolved_id = None
         best = 1.0
         second = None
         is_new = False
 
         async with get_session() as s:
-            # 1) persist the event first
-            event = ParEventORM(
-                track_id=p.track_id,
-                resolved_id=None,            # fill below
-                appeared=appeared,
-                meta={
-                    "event_type": p.event_type,
-                    "image_path": getattr(p, "image_path", None),
-                    "frame": getattr(p, "frame", None),
-                    "edge_normed": True,
-                },
-                ts_ms=envelope["ts_ms"],
-                cam_id=p.camera_id,
-                edge_id=p.edge_id,
-                location_id=p.location_id,
-                bbox_ltrb=p.bbox_ltrb,
-                embedding=emb_list,          # may be None for disappearance
-                attributes=attrs_json or None,
-                attr_scores=attrs_vec or None,
-            )
-            s.add(event)
-            await s.flush()  # event.id available
+            # 1) persist the event first; a duplicate is skipped before the resolver runs
+            [event_id] = await insert_par_events(s, [self._event_values(det, det.qvec)])
+            if event_id is None:
+                self.duplicates += 1
+                log.info(f'Duplicate par_event cam={det.payload.camera_id} track={det.payload.track_id} ts={det.ts_ms}; skipped')
+                return
 
             # 2) resolve identity only on appearance with a valid embedding
-            if appeared and qvec is not None:
-                resolved_id, best, second, is_new = await self.resolver.resolve(s, qvec, envelope["ts_ms"])
-                event.resolved_id = resolved_id  # ✅ assign directly via ORM
-                log.info(f'Resolved id {event.resolved_id} to track {event.track_id}')
+            if appeared and det.qvec is not None:
+                resolved_id, best, second, is_new = await self.resolver.resolve(s, det.qvec, det.ts_ms)
+                await set_par_events_resolved(s, [event_id], resolved_id)
+                log.info(f'Resolved id {resolved_id} to track {det.payload.track_id}')
 
             await s.commit()
 
-        # 3) always publish TTS event
+        # 3) publish TTS event
         # resolved_id could be None if it has only
         if not appeared or resolved_id:
-            tts_payload = TtsEventPayload(
-                **p.model_dump(),
-                idf_name=self.created_by,
-                resolved_id=event.resolved_id,
-                resolved_at_ms=envelope["ts_ms"],
-                best_distance=best,
-                second_distance=second,
-                is_new_identity=is_new,
-            ).model_dump()
-
-        await self.bus.publish_envelope(
-            pack_event("tts-event", tts_payload, created_by=self.created_by)
+            await self._publish_tts(det, resolved_id, best, second, is_new)
+
+    async def _resolve_group(self, group: List[Detection]) -> None:
+        """
+        Resolve a buffered track once on its quality-weighted mean embedding.
+        Only the representative (best-quality) row stores a vector; the other
+        rows keep a reference to it in meta.rep_event_id.
+        """
+        rep = TrackAggregator.representative(group)
+        mean = TrackAggregator.weighted_mean(group)
+        last = max(group, key=lambda d: d.ts_ms)
+        members = [d for d in group if d is not rep]
+
+        async with get_session() as s:
+            [rep_id] = await insert_par_events(
+                s, [self._event_values(rep, mean, agg_n=len(group), agg_role="representative")]
+            )
+            member_ids = await insert_par_events(s, [
+                self._event_values(d, None, agg_role="member", rep_event_id=rep_id) for d in members
+            ])
+            ids = [rep_id] + member_ids
+            dups = sum(1 for i in ids if i is None)
+            self.duplicates += dups
+            if dups == len(ids):
+                # the whole group was redelivered; it was resolved and published before
+                log.info(f'Duplicate par_events for track {rep.payload.track_id} ({dups}); skipped')
+                return
+
+            resolved_id, best, second, is_new = await self.resolver.resolve(s, mean, last.ts_ms)
+            await set_par_events_resolved(s, ids, resolved_id)
+            await s.commit()
+
+        log.info(f'Resolved id {resolved_id} to track {rep.payload.track_id} from {len(group)} detections')
+        self.aggregator.set_resolution(
+            rep.key, TrackResolution(resolved_id, best, second, is_new, rep_id)
         )
+        await self._publish_tts(last, resolved_id, best, second, is_new)
+
+    async def _store_resolved(self, det: Detection, res: TrackResolution) -> None:
+        """A detection of an already-resolved track: no resolver call, no stored vector."""
+        async with get_session() as s:
+            values = self._event_values(det, None, agg_role="member", rep_event_id=res.rep_event_id)
+            values["resolved_id"] = res.resolved_id
+            [event_id] = await insert_par_events(s, [values])
+            await s.commit()
+        if event_id is None:
+            self.duplicates += 1
+            return
+        await self._publish_tts(det, res.resolved_id, res.best, res.second, False)
+
+    async def _publish_tts(self, det: Detection, resolved_id: Optional[str], best: float,
+                           second: Optional[float], is_new: bool) -> None:
+        tts_payload = TtsEventPayload(
+            **det.payload.model_dump(),
+            idf_name=self.created_by,
+            resolved_id=resolved_id,
+            resolved_at_ms=det.ts_ms,
+            best_distance=best,
+            second_distance=second,
+            is_new_identity=is_new,
+        )
+        await self.bus.publish_event("tts-event", tts_payload, created_by=self.created_by)
 
 class TargetTrackingSystem:
-    def __init__(self, bus: MessageBus, created_by: str = "tts-service-1"):
+    def __init__(self, bus: Bus, created_by: str = "tts-service-1"):
         self.bus = bus
         self.created_by = created_by
 
     async def handle_tts_event(self, envelope: Dict[str, Any]):
-        p = TtsEventPayload(**envelope["payload"])
+        p = unpack_payload(envelope, TtsEventPayload)
         movement_type = "Move-In" if p.event_type == "appearance" else "Move-Out"
 
         log.info(f'[TTS] receiving tts_event[{movement_type}] from {envelope.get("created_by")} rid={p.resolved_id}')
 
         async with get_session() as s:
             if movement_type == "Move-In":
+                attrs_json, attrs_vec = p.parse_attributes()
                 await open_or_update_session_on_move_in(
                     s,
                     resolved_id=p.resolved_id,
@@ -118,9 +279,9 @@ class TargetTrackingSystem:
                     camera_id=p.camera_id,
                     ts_ms=envelope["ts_ms"],
                     rep_image=p.image_path if hasattr(p, "image_path") else None,
-                    rep_attrs=p.attributes if hasattr(p, "attributes") else None,
-                    rep_attr_names=None,            # or derive from attributes
-                    rep_scores=None,
+                    rep_attrs=attrs_json if attrs_vec is not None else None,
+                    rep_attr_names=[a["name"] for a in attrs_json["items"] if a["score"] >= ATTR_MASK_THRESHOLD] if attrs_vec is not None else None,
+                    rep_scores=attrs_vec,           # also packed into attr_mask for attribute search
                     rep_embedding=None,             # you can also forward qvec from IDF if carried in TTS
                     track_id=p.track_id if hasattr(p, "track_id") else None,
                 )
@@ -144,5 +305,5 @@ class TargetTrackingSystem:
                 edge_id=p.edge_id,
                 ts_ms=envelope["ts_ms"],
                 track_id= p.track_id,
-            ).model_dump()
-            await self.bus.publish_envelope(pack_event("movement-update", mu_payload, created_by=self.created_by))
+            )
+            await self.bus.publish_event("movement-update", mu_payload, created_by=self.created_by)
@@ -1,12 +1,24 @@
+from contextlib import asynccontextmanager
 from fastapi import APIRouter, FastAPI, HTTPException
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from sqlalchemy import select, desc, text
-from typing import Any, Dict, Optional
+from typing import Any, Dict, List, Optional
 
 from app.db.db import get_session
+from app.ingest_api import close_ingest, ingest, start_ingest
+from app.media_api import media
 from app.db.models import MovementORM, AdEventORM
+from app.services import similar_search
+from app.services.trajectory import TRAJECTORY_MAX_SEGMENTS, person_trajectory
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(_app: FastAPI):
+    start_ingest()
+    yield
+    await close_ingest()
+
+
+app = FastAPI(lifespan=lifespan)
 tracking = APIRouter(prefix="/tracking")
 # bus = None  # injected from main.py
 
@@ -117,8 +129,78 @@ async def untrack_person(cmd: TrackCmd) -> Dict[str, Any]:
 
     return {"status": "ok", "resolved_id": cmd.resolved_id, "is_tracked": False}
 
+@tracking.get("/person/{resolved_id}/trajectory")
+async def get_trajectory(resolved_id: str, start_ms: int, end_ms: int,
+                         max_segments: int = TRAJECTORY_MAX_SEGMENTS) -> Dict[str, Any]:
+    if end_ms < start_ms:
+        raise HTTPException(status_code=400, detail="end_ms must be >= start_ms")
+    async with get_session() as s:
+        out = await person_trajectory(s, resolved_id, start_ms, end_ms, max(1, min(max_segments, 500)))
+    return {"resolved_id": resolved_id, "start_ms": start_ms, "end_ms": end_ms, **out}
+
+# ---------------------------
+# Similar-person search (par_events embeddings)
+# ---------------------------
+class SimilarSearchReq(BaseModel):
+    # query vector: one of embedding / resolved_id / event_id (or camera_id + track_id)
+    embedding: Optional[List[float]] = Field(default=None, min_length=512, max_length=512)
+    resolved_id: Optional[str] = None
+    event_id: Optional[int] = None
+    camera_id: Optional[str] = None
+    track_id: Optional[str] = None
+
+    start_ms: int
+    end_ms: int
+    location_id: Optional[str] = None
+    camera_ids: Optional[List[str]] = None
+    max_distance: float = Field(default=similar_search.SIMILAR_MAX_DISTANCE, gt=0, le=2)
+    limit: int = Field(default=20, ge=1, le=200)
+    cursor: Optional[str] = None
+
+
+@tracking.post("/person/similar")
+async def similar_person(req: SimilarSearchReq) -> Dict[str, Any]:
+    if req.end_ms < req.start_ms:
+        raise HTTPException(status_code=400, detail="end_ms must be >= start_ms")
+    if req.end_ms - req.start_ms > similar_search.SIMILAR_MAX_WINDOW_MS:
+        raise HTTPException(status_code=400, detail="time window too large")
+    try:
+        cursor = similar_search.decode_cursor(req.cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    async with get_session() as s:
+        event_id = req.event_id
+        if event_id is None and req.camera_id and req.track_id:
+            # a track's best-quality stored vector: an aggregated representative (the
+            # quality-weighted mean of its group) first, then the largest bbox as
+            # TrackAggregator.quality scores crops, then the most recent
+            event_id = (await s.execute(text("""
+                SELECT id FROM par_events
+                WHERE cam_id = :cam AND track_id = :track AND embedding IS NOT NULL
+                ORDER BY (meta->>'agg_role' = 'representative') DESC NULLS LAST,
+                         (bbox_ltrb[3] - bbox_ltrb[1]) * (bbox_ltrb[4] - bbox_ltrb[2]) DESC NULLS LAST,
+                         ts_ms DESC
+                LIMIT 1
+            """), {"cam": req.camera_id, "track": req.track_id})).scalar_one_or_none()
+        qvec = await similar_search.query_embedding(s, req.embedding, req.resolved_id, event_id)
+        if qvec is None:
+            raise HTTPException(status_code=404, detail="no embedding found for the query")
+        out = await similar_search.similar_people(
+            s, qvec, req.start_ms, req.end_ms,
+            location_id=req.location_id,
+            camera_ids=req.camera_ids,
+            max_distance=req.max_distance,
+            limit=req.limit,
+            cursor=cursor,
+            exclude_track=(req.camera_id, req.track_id) if req.camera_id and req.track_id else None,
+        )
+    return {"start_ms": req.start_ms, "end_ms": req.end_ms, "location_id": req.location_id, **out}
+
 # ---------------------------
 # Mount router
 # ---------------------------
 app.include_router(tracking)
+app.include_router(ingest)
+app.include_router(media)
 
@@ -0,0 +1,358 @@
+"""
+Worker runner: consumes the bus queues and drives IDFusion, TTS and RAN.
+
+    python -m app.worker                       # all stages, one process
+    python -m app.worker --stages idf          # one stage (e.g. its own container)
+    python -m app.worker --processes           # one child process per stage
+
+Stages:
+    idf  par-event        -> IDFusion.handle_par_event
+    tts  tts-event        -> TargetTrackingSystem.handle_tts_event
+    ran  ad-event         -> RealtimeAlertNotification.handle_ad_event
+         movement-update  -> RealtimeAlertNotification.handle_movement_update
+    alert anomaly-alert   -> AlertFanout.handle_alert (Pushover / webhook)
+
+On SIGTERM/SIGINT the worker stops consuming, waits for in-flight handlers,
+flushes the IDF aggregation buffers, the movement writer and pending alerts,
+then closes the bus.
+With BUS_TRANSPORT=inprocess all stages must run in a single process.
+GET /healthz (liveness) and GET /readyz (consumers attached) are served on
+WORKER_HEALTH_PORT.
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing as mp
+import os
+import signal
+import sys
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from app.bus import BUS_TRANSPORT, Bus, create_bus
+from app.db import statements
+
+import logging
+log = logging.getLogger(__name__)
+
+WORKER_STAGES = os.getenv("WORKER_STAGES", "idf,tts,ran,alert")
+WORKER_HEALTH_PORT = int(os.getenv("WORKER_HEALTH_PORT", "8101"))   # 0 disables
+WORKER_DRAIN_TIMEOUT_S = float(os.getenv("WORKER_DRAIN_TIMEOUT_S", "30"))
+# a stalled event loop stops refreshing the heartbeat and fails liveness
+WORKER_LIVENESS_STALE_S = float(os.getenv("WORKER_LIVENESS_STALE_S", "30"))
+# IDF keeps per-track state, so handlers for one queue default to sequential
+STAGE_CONCURRENCY = {
+    "idf": int(os.getenv("IDF_CONCURRENCY", "1")),
+    "tts": int(os.getenv("TTS_CONCURRENCY", "4")),
+    "ran": int(os.getenv("RAN_CONCURRENCY", "8")),
+    "alert": int(os.getenv("ALERT_CONCURRENCY", "4")),
+}
+SESSION_SWEEPER = os.getenv("WORKER_SESSION_SWEEPER", "1").lower() in ("1", "true", "yes")
+SNAPSHOT_EVERY_S = float(os.getenv("IDF_SNAPSHOT_EVERY_S", "0"))     # 0 = external snapshot job
+
+
+@dataclass
+class Stage:
+    name: str
+    handlers: Dict[str, Callable[[Dict[str, Any]], Awaitable[None]]]
+    concurrency: int = 1
+    background: List[Callable[[], Awaitable[None]]] = field(default_factory=list)
+    shutdown: List[Callable[[], Awaitable[Any]]] = field(default_factory=list)
+    stats: Callable[[], Dict[str, Any]] = dict
+
+
+def _idf_stage(bus: Bus) -> Stage:
+    from app.tracking_service import IDFusion
+    idf = IDFusion(bus)
+
+    async def flush_expired():
+        interval = max(idf.aggregator.max_wait_ms / 2000.0, 0.1)
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await idf.flush_expired()
+            except Exception:
+                log.exception("IDF flush of expired tracks failed")
+
+    background = [flush_expired] if idf.aggregator.enabled else []
+    if SNAPSHOT_EVERY_S > 0:
+        from app.common.snapshot import SNAPSHOT_DIR, snapshot_loop
+        if SNAPSHOT_DIR:
+            background.append(lambda: snapshot_loop(SNAPSHOT_EVERY_S))
+
+    return Stage(
+        name="idf",
+        handlers={"par-event": idf.handle_par_event},
+        concurrency=STAGE_CONCURRENCY["idf"],
+        background=background,
+        shutdown=[idf.flush_pending],
+        stats=lambda: {
+            "pending_tracks": idf.aggregator.pending_tracks,
+            "debouncer": idf.debouncer.stats(),
+            "duplicates": idf.duplicates,
+            "hot_hits": idf.resolver.hot_hits,
+            "cold_lookups": idf.resolver.cold_lookups,
+            "ema": idf.resolver.ema.as_dict(),
+        },
+    )
+
+
+def _tts_stage(bus: Bus) -> Stage:
+    from app.tracking_service import TargetTrackingSystem
+    tts = TargetTrackingSystem(bus)
+    background = []
+    if SESSION_SWEEPER:
+        from app.services.sesessions import session_sweeper
+        background.append(session_sweeper)
+    return Stage(
+        name="tts",
+        handlers={"tts-event": tts.handle_tts_event},
+        concurrency=STAGE_CONCURRENCY["tts"],
+        background=background,
+    )
+
+
+def _ran_stage(bus: Bus) -> Stage:
+    from app.notification_service import RealtimeAlertNotification
+    ran = RealtimeAlertNotification(bus=bus)
+    return Stage(
+        name="ran",
+        handlers={
+            "ad-event": ran.handle_ad_event,
+            "movement-update": ran.handle_movement_update,
+        },
+        concurrency=STAGE_CONCURRENCY["ran"],
+        shutdown=[ran.close],
+        stats=lambda: {
+            "movement_depth": ran.movements.depth if ran.movements else 0,
+            "movement_dropped": ran.movements.dropped if ran.movements else 0,
+        },
+    )
+
+
+def _alert_stage(bus: Bus) -> Stage:
+    from app.services.alert_fanout import AlertFanout
+    fanout = AlertFanout()
+    return Stage(
+        name="alert",
+        handlers={"anomaly-alert": fanout.handle_alert},
+        concurrency=STAGE_CONCURRENCY["alert"],
+        background=[fanout.run],
+        shutdown=[fanout.close],
+        stats=fanout.stats,
+    )
+
+
+STAGES: Dict[str, Callable[[Bus], Stage]] = {
+    "idf": _idf_stage,
+    "tts": _tts_stage,
+    "ran": _ran_stage,
+    "alert": _alert_stage,
+}
+
+
+def parse_stages(spec: str) -> List[str]:
+    names = [s.strip() for s in spec.split(",") if s.strip()]
+    unknown = [s for s in names if s not in STAGES]
+    if unknown or not names:
+        raise ValueError(f"Unknown worker stage(s) {unknown}; expected a subset of {sorted(STAGES)}")
+    return names
+
+
+def check_transport(stage_names: List[str], processes: bool = False) -> None:
+    """
+    The in-process bus only connects stages running in the same process. With
+    BUS_TRANSPORT=inprocess every stage must run here, in one process. Otherwise
+    events for a missing stage are never consumed, and once
+    BUS_INPROC_QUEUE_SIZE is reached their publishers block.
+    """
+    if BUS_TRANSPORT != "inprocess":
+        return
+    if processes and len(stage_names) > 1:
+        raise ValueError("BUS_TRANSPORT=inprocess cannot split stages across processes (--processes)")
+    missing = sorted(set(STAGES) - set(stage_names))
+    if missing:
+        raise ValueError(f"BUS_TRANSPORT=inprocess needs all stages in one process; missing {missing}")
+
+
+class Worker:
+    def __init__(self, stage_names: List[str], health_port: int = WORKER_HEALTH_PORT,
+                 drain_timeout_s: float = WORKER_DRAIN_TIMEOUT_S):
+        self.stage_names = stage_names
+        self.health_port = health_port
+        self.drain_timeout_s = drain_timeout_s
+        self.bus: Optional[Bus] = None
+        self.stages: List[Stage] = []
+        self.ready = False
+        self.stopping = False
+        self._heartbeat = time.monotonic()
+        self._tasks: List[asyncio.Task] = []
+        self._health: Optional[asyncio.AbstractServer] = None
+        self._stop = asyncio.Event()
+
+    # ---- lifecycle ----
+    async def start(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self.health_port:
+            self._health = await asyncio.start_server(self._serve_health, "0.0.0.0", self.health_port)
+        self._tasks.append(asyncio.create_task(self._beat(), name="worker-heartbeat"))
+
+        self.bus = create_bus(loop)
+        await self.bus.connect()
+        self.stages = [STAGES[name](self.bus) for name in self.stage_names]
+        for stage in self.stages:
+            for queue_name, handler in stage.handlers.items():
+                await self.bus.subscribe(queue_name, handler, concurrency=stage.concurrency)
+            for job in stage.background:
+                self._tasks.append(asyncio.create_task(job(), name=f"{stage.name}-background"))
+        self.ready = True
+        log.info("Worker ready: stages=%s health_port=%s", self.stage_names, self.health_port or "-")
+
+    def request_stop(self) -> None:
+        self._stop.set()
+
+    async def run(self) -> None:
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            try:
+                loop.add_signal_handler(sig, self.request_stop)
+            except (NotImplementedError, RuntimeError):   # Windows / non-main thread
+                pass
+        await self.start()
+        await self._stop.wait()
+        await self.shutdown()
+
+    async def shutdown(self) -> None:
+        """Stop consuming -> drain in-flight handlers -> flush buffers -> close."""
+        self.stopping = True
+        self.ready = False
+        log.info("Worker stopping: draining in-flight messages")
+        if self.bus is not None:
+            await self.bus.stop_consuming()
+            await self.bus.drain(self.drain_timeout_s)
+
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks.clear()
+
+        for stage in self.stages:
+            for hook in stage.shutdown:
+                try:
+                    await hook()
+                except Exception:
+                    log.exception("Shutdown hook for stage %s failed", stage.name)
+
+        if self.bus is not None:
+            # flush hooks may have published downstream (e.g. TTS from IDF)
+            await self.bus.drain(self.drain_timeout_s)
+            await self.bus.close()
+        if self._health is not None:
+            self._health.close()
+            await self._health.wait_closed()
+        log.info("Worker stopped")
+
+    # ---- health ----
+    async def _beat(self) -> None:
+        while True:
+            self._heartbeat = time.monotonic()
+            await asyncio.sleep(1.0)
+
+    def alive(self) -> bool:
+        return time.monotonic() - self._heartbeat < WORKER_LIVENESS_STALE_S
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "stages": self.stage_names,
+            "ready": self.ready,
+            "stopping": self.stopping,
+            "inflight": getattr(self.bus, "inflight", 0),
+            "prepared_statements": statements.stats.as_dict(),
+            "stats": {s.name: s.stats() for s in self.stages},
+        }
+
+    async def _serve_health(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            request_line = (await asyncio.wait_for(reader.readline(), 5)).decode("latin-1").split()
+            path = request_line[1] if len(request_line) > 1 else "/"
+            if path == "/healthz":
+                code, body = (200 if self.alive() else 503), {"ok": self.alive()}
+            elif path == "/readyz":
+                code, body = (200 if self.ready else 503), self.status()
+            else:
+                code, body = 404, {"detail": "Not Found"}
+            data = json.dumps(body, default=str).encode()
+            reason = {200: "OK", 404: "Not Found", 503: "Service Unavailable"}[code]
+            writer.write(
+                f"HTTP/1.1 {code} {reason}\r\nContent-Type: application/json\r\n"
+                f"Content-Length: {len(data)}\r\nConnection: close\r\n\r\n".encode() + data
+            )
+            await writer.drain()
+        except Exception as e:
+            log.debug("Health probe failed: %s", e)
+        finally:
+            writer.close()
+
+
+def _install_uvloop() -> bool:
+    try:
+        import uvloop
+    except ImportError:
+        return False
+    asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    return True
+
+
+def run_worker(stage_names: List[str], health_port: int = WORKER_HEALTH_PORT) -> None:
+    check_transport(stage_names)
+    if _install_uvloop():
+        log.info("Using uvloop")
+    asyncio.run(Worker(stage_names, health_port).run())
+
+
+def _child(stage_name: str, health_port: int) -> None:
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s [%(name)s] %(message)s",
+                        stream=sys.stdout)
+    run_worker([stage_name], health_port)
+
+
+def run_processes(stage_names: List[str], health_port: int = WORKER_HEALTH_PORT) -> int:
+    """One child per stage; health ports are health_port, health_port+1, ..."""
+    check_transport(stage_names, processes=True)
+    ctx = mp.get_context("spawn")
+    procs = [
+        ctx.Process(target=_child, args=(name, health_port + i if health_port else 0), name=f"worker-{name}")
+        for i, name in enumerate(stage_names)
+    ]
+    for p in procs:
+        p.start()
+
+    def forward(signum, _frame):
+        for p in procs:
+            if p.is_alive():
+                os.kill(p.pid, signal.SIGTERM)
+
+    signal.signal(signal.SIGTERM, forward)
+    signal.signal(signal.SIGINT, forward)
+    for p in procs:
+        p.join()
+    return max((p.exitcode or 0) for p in procs)
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Run sentinel-central bus workers")
+    ap.add_argument("--stages", default=WORKER_STAGES, help=f"comma-separated subset of {','.join(STAGES)}")
+    ap.add_argument("--processes", action="store_true", help="run each stage in its own process")
+    ap.add_argument("--health-port", type=int, default=WORKER_HEALTH_PORT)
+    args = ap.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s [%(name)s] %(message)s",
+                        stream=sys.stdout)
+    try:
+        names = parse_stages(args.stages)
+        check_transport(names, processes=args.processes)
+    except ValueError as e:
+        ap.error(str(e))
+    if args.processes and len(names) > 1:
+        sys.exit(run_processes(names, args.health_port))
+    run_worker(names, args.health_port)
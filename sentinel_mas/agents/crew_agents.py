@@ -7,6 +7,7 @@ from typing import Any, Dict
 
 from jinja2 import Template
 from langchain_core.messages import AIMessage, BaseMessage, SystemMessage
+from langchain_core.runnables import RunnableLambda
 from langchain_openai import ChatOpenAI
 
 from sentinel_mas.agents import AGENT_REGISTRY
@@ -66,23 +67,14 @@ class CrewAgent:
         )
         return [SystemMessage(content=sys_text), *state["messages"]]
 
-    def __call__(self, state: State) -> Dict[str, Any]:
-        msgs = self.build_messages(state)
-        # DO NOT sanitize; LangChain handles pairing internally
-
+    def _log_in(self, msgs: list[BaseMessage], state: State) -> None:
         print(
             f"\n[AGENT {self.name}] IN messages={len(msgs)} "
             f"start_ms={state.get('start_ms')} end_ms={state.get('end_ms')} \
             time_label={state.get('time_label')}"
         )
-        # print(f"state: {state}\n")
-        try:
-            resp = self.llm.invoke(msgs)  # AIMessage (may include tool_calls)
-
-        except Exception as e:
-            print(f"[AGENT {self.name}] ERROR:", type(e).__name__, e)
-            raise
 
+    def _out(self, resp: Any) -> Dict[str, Any]:
         tcalls = getattr(resp, "tool_calls", None)
         if tcalls:
 
@@ -98,3 +90,42 @@ class CrewAgent:
         else:
             ai = AIMessage(content=str(resp), name=self.name)
             return {"messages": [ai]}
+
+    def __call__(self, state: State) -> Dict[str, Any]:
+        msgs = self.build_messages(state)
+        # DO NOT sanitize; LangChain handles pairing internally
+
+        self._log_in(msgs, state)
+        # print(f"state: {state}\n")
+        try:
+            resp = self.llm.invoke(msgs)  # AIMessage (may include tool_calls)
+
+        except Exception as e:
+            print(f"[AGENT {self.name}] ERROR:", type(e).__name__, e)
+            raise
+
+        return self._out(resp)
+
+    async def acall(self, state: State) -> Dict[str, Any]:
+        """Async node entry: awaits the LLM instead of blocking a worker thread."""
+        msgs = self.build_messages(state)
+        self._log_in(msgs, state)
+        try:
+            resp = await self.llm.ainvoke(msgs)
+        except Exception as e:
+            print(f"[AGENT {self.name}] ERROR:", type(e).__name__, e)
+            raise
+
+        return self._out(resp)
+
+
+def as_node(node: Any) -> Any:
+    """
+    LangGraph node for a callable object. Objects with an async acall() get a
+    native async path, so graph.ainvoke awaits them on the event loop instead
+    of running the sync __call__ in the default thread pool.
+    """
+    acall = getattr(node, "acall", None)
+    if not callable(acall) or not callable(node):
+        return node
+    return RunnableLambda(node, afunc=acall)
@@ -8,16 +8,24 @@ from langchain_core.messages import AIMessage, ToolMessage
 from langgraph.graph import END, StateGraph
 from langgraph.prebuilt import tools_condition
 
-from sentinel_mas.agents.crew_agents import CrewAgent, State
+from sentinel_mas.agents.crew_agents import CrewAgent, State, as_node
 
 # from sentinel_mas.tools import get_tracks
 # Policy Sentinel
 from sentinel_mas.policy_sentinel.secure_tool_node import SecureToolNode
 from sentinel_mas.timewin import resolve_time_window
-from sentinel_mas.tools.events_tools import list_anomaly_event, who_entered_zone
+from sentinel_mas.tools.events_tools import (
+    list_anomaly_event,
+    people_during_episode,
+    search_person_attributes,
+    who_entered_zone,
+    who_was_present,
+)
 from sentinel_mas.tools.sop_tools import get_sop, search_sop
 from sentinel_mas.tools.tracking_tools import (
+    find_similar_person,
     get_person_insight,
+    get_person_trajectory,
     get_track_status,
     send_cancel,
     send_track,
@@ -26,7 +34,15 @@ from sentinel_mas.tools.tracking_tools import (
 # ~~~ Per-agent tool permissions ~~~
 # router_tools = []
 faq_tools = [get_sop, search_sop]
-event_tools = [list_anomaly_event, who_entered_zone]
+event_tools = [
+    list_anomaly_event,
+    who_entered_zone,
+    find_similar_person,
+    search_person_attributes,
+    get_person_trajectory,
+    who_was_present,
+    people_during_episode,
+]
 tracking_tools = [send_track, send_cancel, get_track_status, get_person_insight]
 
 # ~~~ Agents ~~~
@@ -134,8 +150,8 @@ def register_agent_and_tools(
 ) -> StateGraph:
     tools_name = f"{agent_name}_tools"
 
-    graph.add_node(agent_name, agent_node)
-    graph.add_node(tools_name, tool_node)
+    graph.add_node(agent_name, as_node(agent_node))
+    graph.add_node(tools_name, as_node(tool_node))
     graph.add_conditional_edges(
         agent_name, tools_condition, {"tools": tools_name, END: end_node}
     )
@@ -160,7 +176,7 @@ def CreateCrew() -> Any:
         graph, "tracking_agent", tracking_agent, tracking_tool_node
     )
 
-    graph.add_node("router_agent", router_agent)
+    graph.add_node("router_agent", as_node(router_agent))
 
     graph.set_entry_point("router_agent")
     graph.add_conditional_edges(
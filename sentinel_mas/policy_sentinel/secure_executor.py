@@ -1,3 +1,4 @@
+import asyncio
 import time
 from typing import Any, Dict
 
@@ -58,6 +59,20 @@ def call_tool_safely(tool_obj: Any, tool_args: Dict[str, Any]) -> Any:
     raise TypeError(f"Unsupported tool type: {type(tool_obj).__name__}")
 
 
+async def acall_tool_safely(tool_obj: Any, tool_args: Dict[str, Any]) -> Any:
+    """
+    Async counterpart of call_tool_safely().
+
+    Runnables are awaited through .ainvoke() (tools with a coroutine run on the
+    event loop; LangChain falls back to a thread for sync-only tools). Anything
+    else runs call_tool_safely() in a worker thread so it never blocks the loop.
+    """
+    if hasattr(tool_obj, "ainvoke") and callable(getattr(tool_obj, "ainvoke")):
+        return await tool_obj.ainvoke(tool_args)
+
+    return await asyncio.to_thread(call_tool_safely, tool_obj, tool_args)
+
+
 def guard_tool_call(tool_name: str, args: Dict[str, Any], gate: str) -> None:
     """
     Enforce route/role policy and ALWAYS audit the decision.
@@ -85,7 +100,7 @@ def guard_tool_call(tool_name: str, args: Dict[str, Any], gate: str) -> None:
         guard_deny_and_raise(tool_name=tool_name, reason=reason, gate=gate)
 
 
-def secure_execute_tool(tool_name: str, tool_fn: Any, tool_args: dict) -> Any:
+def _guard_and_audit(tool_name: str, tool_args: dict) -> None:
     # 1. Guard + pre-audit
     guard_tool_call(
         tool_name=tool_name,
@@ -98,6 +113,10 @@ def secure_execute_tool(tool_name: str, tool_fn: Any, tool_args: dict) -> Any:
         tool_name=tool_name, detail="RBAC, route, and injection checks passed"
     )
 
+
+def secure_execute_tool(tool_name: str, tool_fn: Any, tool_args: dict) -> Any:
+    _guard_and_audit(tool_name, tool_args)
+
     # 3. Execute tool
     try:
         result = call_tool_safely(tool_fn, tool_args)
@@ -114,3 +133,24 @@ def secure_execute_tool(tool_name: str, tool_fn: Any, tool_args: dict) -> Any:
             exc=exc,
         )
         raise
+
+
+async def asecure_execute_tool(tool_name: str, tool_fn: Any, tool_args: dict) -> Any:
+    """Same guard and audit flow as secure_execute_tool(), awaiting the tool."""
+    _guard_and_audit(tool_name, tool_args)
+
+    try:
+        result = await acall_tool_safely(tool_fn, tool_args)
+        audit_tool_success(
+            tool_name=tool_name,
+            raw_args=tool_args,
+            result_preview=_safe_preview(result),
+        )
+        return result
+    except Exception as exc:
+        audit_tool_failure(
+            tool_name=tool_name,
+            raw_args=tool_args,
+            exc=exc,
+        )
+        raise
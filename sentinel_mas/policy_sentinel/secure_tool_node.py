@@ -2,12 +2,16 @@
 from __future__ import annotations
 
 import json
-from typing import Any, Dict, List, Optional
+from contextlib import ExitStack
+from typing import Any, Dict, List, Mapping, Optional, Tuple
 
-from langchain_core.messages import AIMessage, ToolMessage
+from langchain_core.messages import AIMessage, ToolCall, ToolMessage
 
 from sentinel_mas.policy_sentinel.runtime import context_scope, graph_state_scope
-from sentinel_mas.policy_sentinel.secure_executor import secure_execute_tool
+from sentinel_mas.policy_sentinel.secure_executor import (
+    asecure_execute_tool,
+    secure_execute_tool,
+)
 from sentinel_mas.tools import TOOL_REGISTRY
 
 
@@ -80,50 +84,102 @@ class SecureToolNode:
                 args[k] = state[k]
         return args
 
-    # ---- LangGraph node entry ----
-    def __call__(self, state: Dict[str, Any]) -> Dict[str, Any]:
-        messages = state.get("messages", [])
-        ai = self._last_ai(messages)
-        if not ai or not getattr(ai, "tool_calls", None):
-            return {}
-
-        # print(f'\n[SecureToolNode {self.agent_name}], state: {state}\n')
-        tool_calls = ai.tool_calls
-        tool_messages: List[ToolMessage] = []
-
-        with (
+    def _scope(self, state: Dict[str, Any]) -> ExitStack:
+        stack = ExitStack()
+        stack.enter_context(
             context_scope(
                 user_id=state["user_id"],
                 user_role=state["user_role"],
                 request_id=state["request_id"],
                 session_id=state["session_id"],
                 route=self._get_route(state),
-            ),
-            graph_state_scope(state),
-        ):
-            is_halt = False
-            for tc in tool_calls:
-                name = tc.get("name", "")
-                args = tc.get("args") or {}
-                # args = self._state_overrides(dict(args or {}), state)
-                tcid = tc.get("id") or tc.get("tool_call_id") or "tool_call_0"
+            )
+        )
+        stack.enter_context(graph_state_scope(state))
+        return stack
+
+    @staticmethod
+    def _unknown_tool(name: str) -> Dict[str, Any]:
+        # if LLM hallucinated a tool we don't even have
+        return {
+            "ok": False,
+            "status": "DENIED",
+            "error_type": "UnknownTool",
+            "msg": f"Tool '{name}' is not registered or not allowed.",
+        }
 
-                fn = TOOL_REGISTRY.get(name)
+    @staticmethod
+    def _error_payload(e: Exception) -> Dict[str, Any]:
+        if isinstance(e, PermissionError):
+            # RBAC / policy_sentinel said NO
+            return {
+                "ok": False,
+                "status": "DENIED",
+                "error_type": "PermissionError",
+                "msg": str(e) or "You are not allowed to perform this action.",
+            }
+        if isinstance(e, ValueError):
+            # bad / missing params etc.
+            return {
+                "ok": False,
+                "status": "BAD_REQUEST",
+                "error_type": "ValueError",
+                "msg": str(e),
+            }
+        # unexpected tool failure
+        return {
+            "ok": False,
+            "status": "ERROR",
+            "error_type": e.__class__.__name__,
+            "msg": str(e),
+        }
+
+    @staticmethod
+    def _message(payload: Dict[str, Any], tcid: str, name: str) -> ToolMessage:
+        return ToolMessage(
+            content=json.dumps(payload, ensure_ascii=False),
+            tool_call_id=tcid,
+            name=name,
+        )
+
+    @staticmethod
+    def _new_state(
+        state: Dict[str, Any], tool_messages: List[ToolMessage], is_halt: bool
+    ) -> Dict[str, Any]:
+        return {
+            **state,
+            "messages": state.get("messages", []) + tool_messages,
+            "halt": is_halt,
+        }
+
+    def _tool_calls(self, state: Dict[str, Any]) -> List[ToolCall]:
+        ai = self._last_ai(state.get("messages", []))
+        if not ai or not getattr(ai, "tool_calls", None):
+            return []
+        return list(ai.tool_calls)
+
+    @staticmethod
+    def _parse_call(tc: Mapping[str, Any]) -> Tuple[str, Dict[str, Any], str]:
+        name = tc.get("name", "")
+        args = tc.get("args") or {}
+        tcid = tc.get("id") or tc.get("tool_call_id") or "tool_call_0"
+        return name, args, tcid
+
+    # ---- LangGraph node entry ----
+    def __call__(self, state: Dict[str, Any]) -> Dict[str, Any]:
+        tool_calls = self._tool_calls(state)
+        if not tool_calls:
+            return {}
 
-                # if LLM hallucinated a tool we don't even have
+        tool_messages: List[ToolMessage] = []
+        is_halt = False
+        with self._scope(state):
+            for tc in tool_calls:
+                name, args, tcid = self._parse_call(tc)
+                fn = TOOL_REGISTRY.get(name)
                 if fn is None:
-                    error_payload = {
-                        "ok": False,
-                        "status": "DENIED",
-                        "error_type": "UnknownTool",
-                        "msg": f"Tool '{name}' is not registered or not allowed.",
-                    }
                     tool_messages.append(
-                        ToolMessage(
-                            content=json.dumps(error_payload, ensure_ascii=False),
-                            tool_call_id=tcid,
-                            name=name,
-                        )
+                        self._message(self._unknown_tool(name), tcid, name)
                     )
                     continue
 
@@ -134,59 +190,50 @@ class SecureToolNode:
                         tool_fn=fn,
                         tool_args=args,
                     )
-
-                    # you can standardize success format if you want
-                    payload = {
-                        "ok": True,
-                        "status": "OK",
-                        "data": result,
-                    }
+                    payload = {"ok": True, "status": "OK", "data": result}
                     is_halt = False
-
-                except PermissionError as e:
-                    # RBAC / policy_sentinel said NO
-                    payload = {
-                        "ok": False,
-                        "status": "DENIED",
-                        "error_type": "PermissionError",
-                        "msg": str(e) or "You are not allowed to perform this action.",
-                    }
-                    is_halt = True
-
-                except ValueError as e:
-                    # bad / missing params etc.
-                    payload = {
-                        "ok": False,
-                        "status": "BAD_REQUEST",
-                        "error_type": "ValueError",
-                        "msg": str(e),
-                    }
-                    is_halt = True
-
                 except Exception as e:
-                    # unexpected tool failure
-                    payload = {
-                        "ok": False,
-                        "status": "ERROR",
-                        "error_type": e.__class__.__name__,
-                        "msg": str(e),
-                    }
+                    payload = self._error_payload(e)
                     is_halt = True
 
                 # always push a ToolMessage back to the model
-                tool_messages.append(
-                    ToolMessage(
-                        content=json.dumps(payload, ensure_ascii=False),
-                        tool_call_id=tcid,
-                        name=name,
+                tool_messages.append(self._message(payload, tcid, name))
+
+        return self._new_state(state, tool_messages, is_halt)
+
+    async def acall(self, state: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Async node entry: same steps as __call__, with each tool call awaited
+        in order, so a later call still sees the effects of an earlier one.
+        """
+        tool_calls = self._tool_calls(state)
+        if not tool_calls:
+            return {}
+
+        tool_messages: List[ToolMessage] = []
+        is_halt = False
+        with self._scope(state):
+            for tc in tool_calls:
+                name, args, tcid = self._parse_call(tc)
+                fn = TOOL_REGISTRY.get(name)
+                if fn is None:
+                    tool_messages.append(
+                        self._message(self._unknown_tool(name), tcid, name)
                     )
-                )
+                    continue
 
-        new_state = {
-            **state,
-            "messages": state.get("messages", []) + tool_messages,
-            "halt": is_halt,
-        }
+                try:
+                    result = await asecure_execute_tool(
+                        tool_name=name,
+                        tool_fn=fn,
+                        tool_args=args,
+                    )
+                    payload = {"ok": True, "status": "OK", "data": result}
+                    is_halt = False
+                except Exception as e:
+                    payload = self._error_payload(e)
+                    is_halt = True
+
+                tool_messages.append(self._message(payload, tcid, name))
 
-        # print("[SecureToolNode RETURN]", new_state.keys(), "halt=", new_state["halt"])
-        return new_state
+        return self._new_state(state, tool_messages, is_halt)
@@ -0,0 +1,335 @@
+"""Database connections for the read-only tools.
+
+When SENTINEL_DB_READ_URL is set, reads go to that replica unless:
+- it is marked down (a connect or query failed within SENTINEL_DB_READ_RETRY_S),
+- or it has not replayed up to the requested end_ms yet (lag awareness).
+Otherwise they use the primary (SENTINEL_DB_URL).
+
+Connections come from the shared pools in ``sentinel_mas.tools.pool``.
+
+DB tools are written once as query plans: generators that yield a ``Query``
+(or an ``Offload`` for CPU-bound work) and receive its result. ``db_tool``
+turns a plan into a LangChain tool whose ``invoke`` runs it on a sync pooled
+connection and whose ``ainvoke`` awaits it on an async one.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import functools
+import logging
+import time
+from contextlib import (
+    AsyncExitStack,
+    ExitStack,
+    asynccontextmanager,
+    contextmanager,
+)
+from dataclasses import dataclass
+from typing import (
+    Any,
+    AsyncIterator,
+    Callable,
+    Dict,
+    Generator,
+    Iterator,
+    Optional,
+    Sequence,
+    Tuple,
+    TypeVar,
+    Union,
+    cast,
+)
+
+import psycopg
+from langchain_core.tools import StructuredTool
+
+from sentinel_mas.config import Config
+from sentinel_mas.tools import pool
+
+logger = logging.getLogger(__name__)
+
+DSN = Config.SENTINEL_DB_URL
+READ_DSN = Config.SENTINEL_DB_READ_URL
+READ_RETRY_S = Config.SENTINEL_DB_READ_RETRY_S
+LAG_CHECK_S = Config.SENTINEL_DB_READ_LAG_CHECK_S
+CONNECT_TIMEOUT_S = 3
+
+# (streaming and nothing received is left to replay, last replayed commit in
+# epoch ms). pg_stat_wal_receiver.status needs pg_read_all_stats; without it
+# (or on a disconnected replica) the first column is false and only the replay
+# timestamp decides.
+_LAG_SQL = """
+SELECT
+    pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn()
+        AND EXISTS (SELECT 1 FROM pg_stat_wal_receiver WHERE status = 'streaming'),
+    (extract(epoch FROM pg_last_xact_replay_timestamp()) * 1000)::bigint
+"""
+
+
+@dataclass
+class ReplicaState:
+    down_until: float = 0.0
+    checked_at: float = float("-inf")
+    caught_up: bool = False
+    replay_ms: Optional[int] = None
+    reads: int = 0
+    fallbacks_lag: int = 0
+    fallbacks_down: int = 0
+
+
+_replica = ReplicaState()
+
+
+def replica_stats() -> Dict[str, Any]:
+    return {
+        "configured": bool(READ_DSN),
+        "down": time.monotonic() < _replica.down_until,
+        "replay_ms": _replica.replay_ms,
+        "caught_up": _replica.caught_up,
+        "reads": _replica.reads,
+        "fallbacks_lag": _replica.fallbacks_lag,
+        "fallbacks_down": _replica.fallbacks_down,
+    }
+
+
+def db_stats() -> Dict[str, Any]:
+    return {"pools": pool.pool_stats(), "replica": replica_stats()}
+
+
+def _mark_down(err: Exception) -> None:
+    _replica.down_until = time.monotonic() + READ_RETRY_S
+    logger.warning(
+        "Read replica unavailable (%s); using primary for %ss", err, READ_RETRY_S
+    )
+
+
+def _use_replica() -> bool:
+    if not READ_DSN or READ_DSN == DSN:
+        return False
+    if time.monotonic() < _replica.down_until:
+        _replica.fallbacks_down += 1
+        return False
+    return True
+
+
+def _probe_due(end_ms: Optional[int]) -> bool:
+    return end_ms is not None and (
+        time.monotonic() - _replica.checked_at >= LAG_CHECK_S
+    )
+
+
+def _record_probe(row: Optional[Tuple[Any, Any]]) -> None:
+    caught_up, replay_ms = row if row is not None else (False, None)
+    _replica.caught_up = bool(caught_up)
+    _replica.replay_ms = replay_ms
+    _replica.checked_at = time.monotonic()
+
+
+def _probe_covers(end_ms: Optional[int]) -> bool:
+    # streaming and fully replayed: behind the primary by at most the WAL in flight
+    if end_ms is None or _replica.caught_up:
+        return True
+    return _replica.replay_ms is not None and _replica.replay_ms >= end_ms
+
+
+def _covers(conn: psycopg.Connection, end_ms: Optional[int]) -> bool:
+    """True if the replica already holds everything up to end_ms."""
+    if _probe_due(end_ms):
+        with conn.cursor() as cur:
+            cur.execute(_LAG_SQL)
+            _record_probe(cur.fetchone())
+    return _probe_covers(end_ms)
+
+
+async def _acovers(conn: psycopg.AsyncConnection, end_ms: Optional[int]) -> bool:
+    if _probe_due(end_ms):
+        async with conn.cursor() as cur:
+            await cur.execute(_LAG_SQL)
+            _record_probe(await cur.fetchone())
+    return _probe_covers(end_ms)
+
+
+def _open_replica(
+    end_ms: Optional[int],
+) -> Optional[Tuple[ExitStack, psycopg.Connection]]:
+    dsn = READ_DSN
+    if dsn is None or not _use_replica():
+        return None
+    stack = ExitStack()
+    try:
+        # PoolTimeout is an OperationalError: an unreachable replica fails fast
+        conn = stack.enter_context(
+            pool.connection(dsn, "replica", timeout=CONNECT_TIMEOUT_S)
+        )
+    except psycopg.OperationalError as e:
+        _mark_down(e)
+        _replica.fallbacks_down += 1
+        return None
+    try:
+        if _covers(conn, end_ms):
+            return stack, conn
+    except psycopg.Error as e:
+        _mark_down(e)
+        _replica.fallbacks_down += 1
+    else:
+        _replica.fallbacks_lag += 1
+    stack.close()
+    return None
+
+
+async def _aopen_replica(
+    end_ms: Optional[int],
+) -> Optional[Tuple[AsyncExitStack, psycopg.AsyncConnection]]:
+    dsn = READ_DSN
+    if dsn is None or not _use_replica():
+        return None
+    stack = AsyncExitStack()
+    try:
+        conn = await stack.enter_async_context(
+            pool.async_connection(dsn, "replica", timeout=CONNECT_TIMEOUT_S)
+        )
+    except psycopg.OperationalError as e:
+        _mark_down(e)
+        _replica.fallbacks_down += 1
+        return None
+    try:
+        if await _acovers(conn, end_ms):
+            return stack, conn
+    except psycopg.Error as e:
+        _mark_down(e)
+        _replica.fallbacks_down += 1
+    else:
+        _replica.fallbacks_lag += 1
+    await stack.aclose()
+    return None
+
+
+@contextmanager
+def read_connection(end_ms: Optional[int] = None) -> Iterator[psycopg.Connection]:
+    """Connection for a read-only query whose data must reach end_ms (if given)."""
+    opened = _open_replica(end_ms)
+    if opened is None:
+        with pool.connection(DSN) as primary:
+            yield primary
+        return
+    stack, conn = opened
+    _replica.reads += 1
+    with stack:
+        try:
+            yield conn
+        except psycopg.OperationalError as e:
+            # the replica went away mid-query; later calls go to the primary
+            _mark_down(e)
+            raise
+
+
+@asynccontextmanager
+async def async_read_connection(
+    end_ms: Optional[int] = None,
+) -> AsyncIterator[psycopg.AsyncConnection]:
+    """Async counterpart of read_connection()."""
+    opened = await _aopen_replica(end_ms)
+    if opened is None:
+        async with pool.async_connection(DSN) as primary:
+            yield primary
+        return
+    stack, conn = opened
+    _replica.reads += 1
+    async with stack:
+        try:
+            yield conn
+        except psycopg.OperationalError as e:
+            _mark_down(e)
+            raise
+
+
+# ---- query plans ----
+T = TypeVar("T")
+
+
+@dataclass(frozen=True)
+class Query:
+    """One read-only statement; fetch is "dicts" (rows as dicts), "all" or "one"."""
+
+    sql: str
+    params: Sequence[Any]
+    end_ms: Optional[int] = None
+    fetch: str = "dicts"
+
+
+@dataclass(frozen=True)
+class Offload:
+    """CPU-bound step: run inline by invoke, in a worker thread by ainvoke."""
+
+    fn: Callable[..., Any]
+    args: Tuple[Any, ...] = ()
+
+
+QueryPlan = Generator[Union[Query, Offload], Any, T]
+
+
+def _shape(q: Query, cur: Any, rows: Any) -> Any:
+    if q.fetch != "dicts":
+        return rows
+    cols = [d[0] for d in cur.description]
+    return [dict(zip(cols, r)) for r in rows]
+
+
+def _execute(q: Query) -> Any:
+    with read_connection(q.end_ms) as conn, conn.cursor() as cur:
+        cur.execute(q.sql, q.params)
+        return _shape(q, cur, cur.fetchone() if q.fetch == "one" else cur.fetchall())
+
+
+async def _aexecute(q: Query) -> Any:
+    async with async_read_connection(q.end_ms) as conn, conn.cursor() as cur:
+        await cur.execute(q.sql, q.params)
+        if q.fetch == "one":
+            return await cur.fetchone()
+        return _shape(q, cur, await cur.fetchall())
+
+
+def run_plan(plan: QueryPlan[T]) -> T:
+    result: Any = None
+    try:
+        while True:
+            step = plan.send(result)
+            if isinstance(step, Offload):
+                result = step.fn(*step.args)
+            else:
+                result = _execute(step)
+    except StopIteration as done:
+        return cast(T, done.value)
+
+
+async def arun_plan(plan: QueryPlan[T]) -> T:
+    result: Any = None
+    try:
+        while True:
+            step = plan.send(result)
+            if isinstance(step, Offload):
+                result = await asyncio.to_thread(step.fn, *step.args)
+            else:
+                result = await _aexecute(step)
+    except StopIteration as done:
+        return cast(T, done.value)
+
+
+def db_tool(
+    plan_fn: Optional[Callable[..., QueryPlan[Any]]] = None, **tool_kwargs: Any
+) -> Any:
+    """Like @tool, for a query plan: gives the tool both invoke and ainvoke."""
+
+    def build(fn: Callable[..., QueryPlan[Any]]) -> StructuredTool:
+        @functools.wraps(fn)
+        def run(*args: Any, **kwargs: Any) -> Any:
+            return run_plan(fn(*args, **kwargs))
+
+        @functools.wraps(fn)
+        async def arun(*args: Any, **kwargs: Any) -> Any:
+            return await arun_plan(fn(*args, **kwargs))
+
+        return StructuredTool.from_function(func=run, coroutine=arun, **tool_kwargs)
+
+    return build(plan_fn) if plan_fn is not None else build
@@ -1,19 +1,66 @@
 from __future__ import annotations
 
+import re
+import time
 from typing import Any, Dict, List, Optional
 
-import psycopg
-from langchain_core.tools import tool
+from .db import Query, QueryPlan, db_tool
 
-from sentinel_mas.config import Config
+# Must match sentinel_central app.events.ATTR_ORDER: attribute i is bit i of
+# person_sessions.attr_mask (set when its PAR score is >= 0.5).
+ATTR_ORDER = [
+    "Age-Young",
+    "Age-Adult",
+    "Age-Old",
+    "Gender-Female",
+    "Hair-Length-Short",
+    "Hair-Length-Long",
+    "Hair-Length-Bald",
+    "UpperBody-Length-Short",
+    "UpperBody-Color-Black",
+    "UpperBody-Color-Blue",
+    "UpperBody-Color-Brown",
+    "UpperBody-Color-Green",
+    "UpperBody-Color-Grey",
+    "UpperBody-Color-Orange",
+    "UpperBody-Color-Pink",
+    "UpperBody-Color-Purple",
+    "UpperBody-Color-Red",
+    "UpperBody-Color-White",
+    "UpperBody-Color-Yellow",
+    "UpperBody-Color-Other",
+    "LowerBody-Length-Short",
+    "LowerBody-Color-Black",
+    "LowerBody-Color-Blue",
+    "LowerBody-Color-Brown",
+    "LowerBody-Color-Green",
+    "LowerBody-Color-Grey",
+    "LowerBody-Color-Orange",
+    "LowerBody-Color-Pink",
+    "LowerBody-Color-Purple",
+    "LowerBody-Color-Red",
+    "LowerBody-Color-White",
+    "LowerBody-Color-Yellow",
+    "LowerBody-Color-Other",
+    "LowerBody-Type-Trousers&Shorts",
+    "LowerBody-Type-Skirt&Dress",
+    "Accessory-Backpack",
+    "Accessory-Bag",
+    "Accessory-Glasses-Normal",
+    "Accessory-Glasses-Sun",
+    "Accessory-Hat",
+]
 
-DSN = Config.SENTINEL_DB_URL
-# print(f"event_tools, DSN: {DSN}")
 
+def _now_ms() -> int:
+    return int(time.time() * 1000)
 
-def _rows(cursor: Any) -> List[dict]:
-    cols = [d[0] for d in cursor.description]
-    return [dict(zip(cols, r)) for r in cursor.fetchall()]
+
+def _attr_key(name: str) -> str:
+    return re.sub(r"[^a-z0-9]", "", name.lower())
+
+
+_ATTR_BITS = {_attr_key(n): i for i, n in enumerate(ATTR_ORDER)}
 
 
 def _clamp_limit(x: Optional[int | str], default: int = 50, max_cap: int = 1000) -> int:
@@ -34,14 +81,14 @@ def _clamp_limit(x: Optional[int | str], default: int = 50, max_cap: int = 1000)
 
 
 # @tool(args_schema=WhoEnteredArgs)
-@tool
+@db_tool
 def who_entered_zone(
     location_id: str,
     start_ms: int,
     end_ms: int,
     camera_id: Optional[str] = None,
     limit: int = 50,
-) -> Dict[str, Any]:
+) -> QueryPlan[Dict[str, Any]]:
     """List persons (from person_sessions) who appeared within a time window.
     Filters: location_id (required), camera_id (optional).
     Returns: track_id, resolved_id, location_id, appear_ms, disappear_ms, cam_id.
@@ -65,9 +112,7 @@ def who_entered_zone(
         LIMIT %s;
     """
     params = (location_id, start_ms, end_ms, camera_id, limit)
-    with psycopg.connect(DSN) as conn, conn.cursor() as cur:
-        cur.execute(sql, params)
-        rows = _rows(cur)
+    rows = yield Query(sql, params, end_ms)
     return {
         "ok": True,
         "filters": {
@@ -83,14 +128,234 @@ def who_entered_zone(
     }
 
 
-@tool
+@db_tool
+def who_was_present(
+    location_id: str,
+    at_ms: Optional[int] = None,
+    start_ms: Optional[int] = None,
+    end_ms: Optional[int] = None,
+    camera_id: Optional[str] = None,
+    limit: int = 100,
+) -> QueryPlan[Dict[str, Any]]:
+    """List persons (from person_sessions) present at a location at an instant
+    (at_ms) or at any time during a window (start_ms..end_ms), including people
+    who entered before the window and were still there.
+    Returns: track_id, resolved_id, location_id, appear_ms, disappear_ms, cam_id
+    (disappear_ms is null while still present).
+    """
+    limit = _clamp_limit(limit, default=100, max_cap=1000)
+    if at_ms is not None:
+        lo, hi = at_ms, at_ms
+    elif start_ms is not None and end_ms is not None:
+        lo, hi = start_ms, end_ms
+    else:
+        return {"ok": False, "error": "at_ms or start_ms+end_ms is required"}
+    # overlap on session_span(...) is answered by the ix_ps_span_gist index
+    sql = """
+        SELECT
+            track_id,
+            resolved_id,
+            location_id,
+            appear_ms,
+            disappear_ms,
+            camera_id AS cam_id,
+            to_char((to_timestamp(appear_ms/1000.0) AT TIME ZONE 'Asia/Singapore'),
+                    'YYYY-MM-DD HH24:MI:SS') AS appear_at_sgt
+        FROM person_sessions
+        WHERE session_span(appear_ms, disappear_ms) && int8range(%s, %s, '[]')
+          AND location_id = %s
+          AND camera_id = COALESCE(%s::text, camera_id)
+        ORDER BY appear_ms ASC
+        LIMIT %s;
+    """
+    params = (lo, hi, location_id, camera_id, limit)
+    rows = yield Query(sql, params, hi)
+    return {
+        "ok": True,
+        "filters": {
+            "location_id": location_id,
+            "camera_id": camera_id,
+            "at_ms": at_ms,
+            "start_ms": lo,
+            "end_ms": hi,
+        },
+        "rows": rows,
+        "count": len(rows),
+        "limit": limit,
+        "source": "person_sessions",
+    }
+
+
+@db_tool
+def people_during_episode(
+    ad_event_id: int,
+    padding_ms: int = 0,
+    same_camera: bool = False,
+    limit: int = 100,
+) -> QueryPlan[Dict[str, Any]]:
+    """List persons present at the location of an anomaly episode while it was
+    active (ad_event_id from list_anomaly_event). padding_ms widens the episode
+    on both sides; same_camera restricts to the episode's camera. An episode
+    without end_ms is treated as ongoing.
+    Returns: episode (incident, start_ms, end_ms, location_id, cam_id) and rows
+    of track_id, resolved_id, appear_ms, disappear_ms, cam_id.
+    """
+    limit = _clamp_limit(limit, default=100, max_cap=1000)
+    pad = max(0, int(padding_ms or 0))
+    filters = {
+        "ad_event_id": ad_event_id,
+        "padding_ms": pad,
+        "same_camera": bool(same_camera),
+    }
+    # routed with end_ms=now: an episode written moments ago may not be on a
+    # lagging replica yet, and "not replicated" must not read as "no such episode"
+    ep = yield Query(
+        """
+        SELECT id, incident, episode, start_ms, end_ms, location_id, camera_id
+        FROM public.ad_events
+        WHERE id = %s;
+        """,
+        (ad_event_id,),
+        _now_ms(),
+        fetch="one",
+    )
+    if ep is None:
+        return {
+            "ok": False,
+            "error": f"ad_event_id {ad_event_id} not found",
+            "filters": filters,
+        }
+    _, incident, name, ep_start, ep_end, location_id, ep_cam = ep
+    lo = ep_start - pad if ep_start is not None else None
+    hi = ep_end + pad if ep_end is not None else None
+    # overlap on session_span(...) is answered by the ix_ps_span_gist index;
+    # a NULL bound leaves that side of the episode open
+    sql = """
+        SELECT
+            track_id,
+            resolved_id,
+            appear_ms,
+            disappear_ms,
+            camera_id AS cam_id
+        FROM person_sessions
+        WHERE location_id = %s
+          AND session_span(appear_ms, disappear_ms) && int8range(%s, %s, '[]')
+          AND (NOT %s OR camera_id = %s)
+        ORDER BY appear_ms ASC
+        LIMIT %s;
+    """
+    params = (location_id, lo, hi, bool(same_camera), ep_cam, limit)
+    rows = yield Query(sql, params, hi if hi is not None else _now_ms())
+    return {
+        "ok": True,
+        "filters": filters,
+        "episode": {
+            "ad_event_id": ad_event_id,
+            "incident": incident,
+            "episode": name,
+            "start_ms": ep_start,
+            "end_ms": ep_end,
+            "location_id": location_id,
+            "cam_id": ep_cam,
+        },
+        "rows": rows,
+        "count": len(rows),
+        "limit": limit,
+        "source": "public.ad_events, person_sessions",
+    }
+
+
+def _attr_bits(names: Optional[List[str]]) -> tuple[int, List[str]]:
+    """Bitmask for attribute names (case/punctuation-insensitive) and unknown names."""
+    mask, unknown = 0, []
+    for n in names or []:
+        i = _ATTR_BITS.get(_attr_key(n))
+        if i is None:
+            unknown.append(n)
+        else:
+            mask |= 1 << i
+    return mask, unknown
+
+
+@db_tool
+def search_person_attributes(
+    attributes: List[str],
+    start_ms: int,
+    end_ms: int,
+    location_id: Optional[str] = None,
+    camera_id: Optional[str] = None,
+    exclude_attributes: Optional[List[str]] = None,
+    limit: int = 50,
+) -> QueryPlan[Dict[str, Any]]:
+    """Find persons (from person_sessions) by appearance attributes in a time window,
+    e.g. "red top with backpack" -> ["UpperBody-Color-Red", "Accessory-Backpack"].
+    All attributes must match; exclude_attributes must not. Names follow
+    ATTR_ORDER: Age-*, Gender-Female, Hair-Length-*, UpperBody-Color-<Color>,
+    UpperBody-Length-Short, LowerBody-Color-<Color>, LowerBody-Length-Short,
+    LowerBody-Type-Trousers&Shorts / Skirt&Dress, Accessory-Backpack / Bag /
+    Glasses-Normal / Glasses-Sun / Hat.
+    Returns: track_id, resolved_id, location_id, appear_ms, disappear_ms, cam_id,
+    attr_names.
+    """
+    limit = _clamp_limit(limit, default=50, max_cap=1000)
+    want, unknown = _attr_bits(attributes)
+    avoid, unknown_x = _attr_bits(exclude_attributes)
+    if unknown or unknown_x or not want:
+        return {
+            "ok": False,
+            "error": "unknown or missing attributes",
+            "unknown": unknown + unknown_x,
+            "allowed": ATTR_ORDER,
+        }
+    # location/time range comes from ix_ps_loc_appear (or appear_ms); the mask test
+    # is a single bitwise AND per candidate row
+    sql = """
+        SELECT
+            track_id,
+            resolved_id,
+            location_id,
+            appear_ms,
+            disappear_ms,
+            camera_id AS cam_id,
+            attr_names,
+            to_char((to_timestamp(appear_ms/1000.0) AT TIME ZONE 'Asia/Singapore'),
+                    'YYYY-MM-DD HH24:MI:SS') AS appear_at_sgt
+        FROM person_sessions
+        WHERE appear_ms BETWEEN %s AND %s
+          AND location_id = COALESCE(%s::text, location_id)
+          AND camera_id = COALESCE(%s::text, camera_id)
+          AND (attr_mask & %s) = %s
+          AND (attr_mask & %s) = 0
+        ORDER BY appear_ms ASC
+        LIMIT %s;
+    """
+    params = (start_ms, end_ms, location_id, camera_id, want, want, avoid, limit)
+    rows = yield Query(sql, params, end_ms)
+    return {
+        "ok": True,
+        "filters": {
+            "attributes": attributes,
+            "exclude_attributes": exclude_attributes,
+            "start_ms": start_ms,
+            "end_ms": end_ms,
+            "location_id": location_id,
+            "camera_id": camera_id,
+        },
+        "rows": rows,
+        "count": len(rows),
+        "limit": limit,
+        "source": "person_sessions",
+    }
+
+
+@db_tool
 def list_anomaly_event(
     start_ms: int,
     end_ms: int,
     location_id: Optional[str] = None,
     camera_id: Optional[str] = None,
     limit: int = 100,
-) -> Dict[str, Any]:
+) -> QueryPlan[Dict[str, Any]]:
     """List anomaly/incident episodes from public.ad_events in a time window.
     Optional filters: location_id, camera_id. Returns ts_ms=start_ms,
     location_id, cam_id, incident, phase, confidence, episode,
@@ -119,9 +384,7 @@ def list_anomaly_event(
         LIMIT %s;
     """
     params = (start_ms, end_ms, location_id, camera_id, limit)
-    with psycopg.connect(DSN) as conn, conn.cursor() as cur:
-        cur.execute(sql, params)
-        rows = _rows(cur)
+    rows = yield Query(sql, params, end_ms)
     return {
         "ok": True,
         "filters": {
@@ -0,0 +1,161 @@
+"""Shared psycopg connection pools for the DB-backed tools.
+
+One pool per DSN, created on first use and sized from config:
+- sync ``ConnectionPool`` for the tools as LangChain calls them today,
+- async ``AsyncConnectionPool`` for coroutine callers (one per event loop).
+
+Connections are checked before they are handed out (``check_connection``) and
+recycled after SENTINEL_DB_POOL_MAX_IDLE_S idle / SENTINEL_DB_POOL_MAX_LIFETIME_S,
+so a restarted database or a dropped idle connection costs a reconnect, not a
+failed tool call. With SENTINEL_DB_POOL_ENABLED=false every call opens its own
+connection as before.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import atexit
+import logging
+import threading
+import weakref
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, AsyncIterator, Dict, Iterator, Optional
+
+import psycopg
+from psycopg_pool import AsyncConnectionPool, ConnectionPool
+
+from sentinel_mas.config import Config
+
+logger = logging.getLogger(__name__)
+
+POOL_ENABLED = Config.SENTINEL_DB_POOL_ENABLED
+MIN_SIZE = Config.SENTINEL_DB_POOL_MIN_SIZE
+MAX_SIZE = Config.SENTINEL_DB_POOL_MAX_SIZE
+TIMEOUT_S = Config.SENTINEL_DB_POOL_TIMEOUT_S
+MAX_IDLE_S = Config.SENTINEL_DB_POOL_MAX_IDLE_S
+MAX_LIFETIME_S = Config.SENTINEL_DB_POOL_MAX_LIFETIME_S
+CONNECT_TIMEOUT_S = 3
+
+_lock = threading.Lock()
+_pools: Dict[str, ConnectionPool] = {}
+# event loop -> {dsn: pool}; a loop's pools are dropped with the loop
+_async_pools: weakref.WeakKeyDictionary[
+    asyncio.AbstractEventLoop, Dict[str, AsyncConnectionPool]
+] = weakref.WeakKeyDictionary()
+_names: Dict[str, str] = {}
+
+
+def _kwargs() -> Dict[str, Any]:
+    return {"connect_timeout": CONNECT_TIMEOUT_S}
+
+
+def get_pool(dsn: str, name: str = "primary") -> ConnectionPool:
+    """The process-wide sync pool for dsn, opened on first use."""
+    pool = _pools.get(dsn)
+    if pool is not None:
+        return pool
+    with _lock:
+        pool = _pools.get(dsn)
+        if pool is None:
+            pool = ConnectionPool(
+                dsn,
+                kwargs=_kwargs(),
+                min_size=MIN_SIZE,
+                max_size=MAX_SIZE,
+                timeout=TIMEOUT_S,
+                max_idle=MAX_IDLE_S,
+                max_lifetime=MAX_LIFETIME_S,
+                check=ConnectionPool.check_connection,
+                name=name,
+                open=False,
+            )
+            # don't block the first tool call on min_size connections
+            pool.open(wait=False)
+            _pools[dsn] = pool
+            _names[dsn] = name
+            logger.info("Opened %s DB pool (min=%d, max=%d)", name, MIN_SIZE, MAX_SIZE)
+    return pool
+
+
+async def get_async_pool(dsn: str, name: str = "primary") -> AsyncConnectionPool:
+    """The async pool for dsn on the running event loop, opened on first use."""
+    pools = _async_pools.setdefault(asyncio.get_running_loop(), {})
+    pool = pools.get(dsn)
+    if pool is None:
+        pool = AsyncConnectionPool(
+            dsn,
+            kwargs=_kwargs(),
+            min_size=MIN_SIZE,
+            max_size=MAX_SIZE,
+            timeout=TIMEOUT_S,
+            max_idle=MAX_IDLE_S,
+            max_lifetime=MAX_LIFETIME_S,
+            check=AsyncConnectionPool.check_connection,
+            name=f"{name}-async",
+            open=False,
+        )
+        # no await before the insert: concurrent first callers share one pool
+        pools[dsn] = pool
+        _names[dsn] = name
+        await pool.open(wait=False)
+    return pool
+
+
+@contextmanager
+def connection(
+    dsn: str, name: str = "primary", timeout: Optional[float] = None
+) -> Iterator[psycopg.Connection]:
+    """A pooled connection (committed / rolled back and returned on exit)."""
+    if not POOL_ENABLED:
+        with psycopg.connect(dsn, connect_timeout=CONNECT_TIMEOUT_S) as conn:
+            yield conn
+        return
+    with get_pool(dsn, name).connection(timeout=timeout) as conn:
+        yield conn
+
+
+@asynccontextmanager
+async def async_connection(
+    dsn: str, name: str = "primary", timeout: Optional[float] = None
+) -> AsyncIterator[psycopg.AsyncConnection]:
+    """Async counterpart of connection()."""
+    if not POOL_ENABLED:
+        conn = await psycopg.AsyncConnection.connect(
+            dsn, connect_timeout=CONNECT_TIMEOUT_S
+        )
+        async with conn:
+            yield conn
+        return
+    pool = await get_async_pool(dsn, name)
+    async with pool.connection(timeout=timeout) as conn:
+        yield conn
+
+
+def pool_stats() -> Dict[str, Any]:
+    """Counters of every open pool, by name (DSNs carry credentials)."""
+    stats: Dict[str, Any] = {"enabled": POOL_ENABLED}
+    for dsn, pool in list(_pools.items()):
+        stats[_names[dsn]] = pool.get_stats()
+    for pools in list(_async_pools.values()):
+        for dsn, apool in list(pools.items()):
+            stats[f"{_names[dsn]}-async"] = apool.get_stats()
+    return stats
+
+
+def close_pools() -> None:
+    """Close the sync pools (registered atexit; also call from app shutdown)."""
+    with _lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.close()
+
+
+async def close_async_pools() -> None:
+    """Close the async pools of the running event loop."""
+    pools = _async_pools.pop(asyncio.get_running_loop(), {})
+    for pool in pools.values():
+        await pool.close()
+
+
+atexit.register(close_pools)
@@ -1,20 +1,58 @@
+"""Tools that call sentinel_central over HTTP.
+
+All calls share one keep-alive client per process (and one async client per
+event loop), sized by SENTINEL_CENTRAL_MAX_CONNECTIONS / _MAX_KEEPALIVE and
+optionally speaking HTTP/2. Failed connects and read timeouts are retried with
+jittered backoff inside a per-call deadline; after
+SENTINEL_CENTRAL_BREAKER_THRESHOLD consecutive failed calls a circuit breaker
+answers immediately until SENTINEL_CENTRAL_BREAKER_RESET_S has passed.
+"""
+
 from __future__ import annotations
 
+import asyncio
+import atexit
+import functools
+import importlib.util
+import logging
+import random
+import threading
 import time
-from typing import Any, Dict, Optional
+import weakref
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Union
 
 import httpx
-from langchain_core.tools import tool
+from langchain_core.tools import StructuredTool
 
 from sentinel_mas.config import Config
 
+logger = logging.getLogger(__name__)
+
 SENTINEL_CENTRAL_URL = Config.SENTINEL_CENTRAL_URL
 SENTINEL_API_KEY = Config.SENTINEL_API_KEY
+HTTP2 = Config.SENTINEL_CENTRAL_HTTP2
+MAX_CONNECTIONS = Config.SENTINEL_CENTRAL_MAX_CONNECTIONS
+MAX_KEEPALIVE = Config.SENTINEL_CENTRAL_MAX_KEEPALIVE
+KEEPALIVE_S = Config.SENTINEL_CENTRAL_KEEPALIVE_S
+DEADLINE_S = Config.SENTINEL_CENTRAL_DEADLINE_S
+BREAKER_THRESHOLD = Config.SENTINEL_CENTRAL_BREAKER_THRESHOLD
+BREAKER_RESET_S = Config.SENTINEL_CENTRAL_BREAKER_RESET_S
 
 # from langchain.tools import tool
 DEFAULT_TIMEOUT = 5.0
 MAX_RETRIES = 2
 RETRY_BACKOFF = 0.25
+SEARCH_TIMEOUT = 15.0
+MIN_ATTEMPT_TIMEOUT = 0.1
+
+# the request never reached (or never came back from) sentinel_central
+RETRY_ERRORS = (
+    httpx.ConnectError,
+    httpx.ConnectTimeout,
+    httpx.ReadTimeout,
+    httpx.PoolTimeout,
+)
 
 
 # print(
@@ -30,44 +68,222 @@ def _headers() -> Dict[str, str]:
     return h
 
 
+# ---- shared clients ----
+_lock = threading.Lock()
+_client: Optional[httpx.Client] = None
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Any]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def _http2() -> bool:
+    if HTTP2 and importlib.util.find_spec("h2") is None:
+        logger.warning("SENTINEL_CENTRAL_HTTP2 needs the h2 package; using HTTP/1.1")
+        return False
+    return HTTP2
+
+
+def _client_kwargs() -> Dict[str, Any]:
+    return {
+        "headers": _headers(),
+        "timeout": DEFAULT_TIMEOUT,
+        "limits": httpx.Limits(
+            max_connections=MAX_CONNECTIONS,
+            max_keepalive_connections=MAX_KEEPALIVE,
+            keepalive_expiry=KEEPALIVE_S,
+        ),
+        "http2": _http2(),
+    }
+
+
+def get_client() -> httpx.Client:
+    """The process-wide keep-alive client, created on first use."""
+    global _client
+    if _client is None:
+        with _lock:
+            if _client is None:
+                _client = httpx.Client(**_client_kwargs())
+    return _client
+
+
+def get_async_client() -> httpx.AsyncClient:
+    """The keep-alive async client of the running event loop."""
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = httpx.AsyncClient(**_client_kwargs())
+        _async_clients[loop] = client
+    return client
+
+
+def close_clients() -> None:
+    """Close the sync client (registered atexit; also call from app shutdown)."""
+    global _client
+    with _lock:
+        client, _client = _client, None
+    if client is not None:
+        client.close()
+
+
+async def aclose_clients() -> None:
+    """Close the async client of the running event loop."""
+    client = _async_clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
+
+
+atexit.register(close_clients)
+
+
+# ---- circuit breaker ----
+class CircuitBreaker:
+    """
+    Opens after `threshold` consecutive failed calls. While open, calls fail
+    fast; after `reset_s` one probe call is let through (half-open) and its
+    outcome closes the circuit or opens it for another `reset_s`.
+    """
+
+    def __init__(self, threshold: int, reset_s: float):
+        self.threshold = threshold
+        self.reset_s = reset_s
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.probing = False
+        self.rejected = 0
+        self._lock = threading.Lock()
+
+    def allow(self) -> Optional[float]:
+        """None if the call may proceed, else seconds until the next probe."""
+        with self._lock:
+            if self.opened_at is None:
+                return None
+            wait = self.opened_at + self.reset_s - time.monotonic()
+            if wait <= 0 and not self.probing:
+                self.probing = True
+                return None
+            self.rejected += 1
+            return max(wait, 0.0)
+
+    def record(self, ok: bool) -> None:
+        with self._lock:
+            self.probing = False
+            if ok:
+                if self.opened_at is not None:
+                    logger.info("sentinel_central reachable again; circuit closed")
+                self.failures = 0
+                self.opened_at = None
+                return
+            self.failures += 1
+            if self.opened_at is not None or self.failures >= self.threshold:
+                if self.opened_at is None:
+                    logger.warning(
+                        "sentinel_central failed %d calls in a row; "
+                        "failing fast for %ss",
+                        self.failures,
+                        self.reset_s,
+                    )
+                self.opened_at = time.monotonic()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "state": (
+                "closed"
+                if self.opened_at is None
+                else "half_open" if self.probing else "open"
+            ),
+            "failures": self.failures,
+            "rejected": self.rejected,
+        }
+
+
+_breaker = CircuitBreaker(BREAKER_THRESHOLD, BREAKER_RESET_S)
+
+
+def central_stats() -> Dict[str, Any]:
+    return {"breaker": _breaker.stats(), "http2": HTTP2}
+
+
+def _result(resp: httpx.Response, path: str) -> Dict[str, Any]:
+    if resp.status_code >= 400:
+        try:
+            detail = resp.json().get("detail", resp.text)
+        except Exception:
+            detail = resp.text
+        return {
+            "ok": False,
+            "status_code": resp.status_code,
+            "error": detail,
+            "endpoint": path,
+        }
+    return {
+        "ok": True,
+        "status_code": resp.status_code,
+        "data": resp.json(),
+        "endpoint": path,
+    }
+
+
+def _gave_up(e: Exception, path: str) -> Dict[str, Any]:
+    return {
+        "ok": False,
+        "status_code": 599,
+        "error": f"{type(e).__name__}: {e}",
+        "endpoint": path,
+    }
+
+
+def _circuit_open(wait: float, path: str) -> Dict[str, Any]:
+    return {
+        "ok": False,
+        "status_code": 503,
+        "error": f"sentinel_central unavailable (circuit open, retry in {wait:.0f}s)",
+        "endpoint": path,
+    }
+
+
+def _backoff(attempt: int) -> float:
+    # exponential with +-50% jitter so concurrent callers don't retry in step
+    return RETRY_BACKOFF * (2.0**attempt) * random.uniform(0.5, 1.5)
+
+
+def _attempt_timeout(timeout: float, end: float) -> float:
+    return max(MIN_ATTEMPT_TIMEOUT, min(timeout, end - time.monotonic()))
+
+
 def _request(
     method: str,
     path: str,
     json: Optional[dict] = None,
     timeout: float = DEFAULT_TIMEOUT,
+    params: Optional[dict] = None,
+    deadline: Optional[float] = None,
 ) -> Dict[str, Any]:
+    wait = _breaker.allow()
+    if wait is not None:
+        return _circuit_open(wait, path)
     url = f"{SENTINEL_CENTRAL_URL.rstrip('/')}{path}"
-    for attempt in range(MAX_RETRIES + 1):
-        try:
-            with httpx.Client(timeout=timeout, headers=_headers()) as client:
-                resp = client.request(method, url, json=json)
-                if resp.status_code >= 400:
-                    try:
-                        detail = resp.json().get("detail", resp.text)
-                    except Exception:
-                        detail = resp.text
-                    return {
-                        "ok": False,
-                        "status_code": resp.status_code,
-                        "error": detail,
-                        "endpoint": path,
-                    }
-                return {
-                    "ok": True,
-                    "status_code": resp.status_code,
-                    "data": resp.json(),
-                    "endpoint": path,
-                }
-        except (httpx.ConnectError, httpx.ReadTimeout) as e:
-            if attempt < MAX_RETRIES:
-                time.sleep(RETRY_BACKOFF * (attempt + 1))
-                continue
-            return {
-                "ok": False,
-                "status_code": 599,
-                "error": f"{type(e).__name__}: {e}",
-                "endpoint": path,
-            }
+    end = time.monotonic() + (deadline or max(DEADLINE_S, timeout))
+    ok = False
+    try:
+        for attempt in range(MAX_RETRIES + 1):
+            try:
+                resp = get_client().request(
+                    method,
+                    url,
+                    json=json,
+                    params=params,
+                    timeout=_attempt_timeout(timeout, end),
+                )
+                ok = resp.status_code < 500
+                return _result(resp, path)
+            except RETRY_ERRORS as e:
+                delay = _backoff(attempt)
+                if attempt < MAX_RETRIES and time.monotonic() + delay < end:
+                    time.sleep(delay)
+                    continue
+                return _gave_up(e, path)
+    finally:
+        _breaker.record(ok)
     # Fallback for static analyzer — never actually reached
     return {
         "ok": False,
@@ -77,8 +293,89 @@ def _request(
     }
 
 
-@tool
-def send_track(resolved_id: str) -> Dict[str, Any]:
+async def _arequest(
+    method: str,
+    path: str,
+    json: Optional[dict] = None,
+    timeout: float = DEFAULT_TIMEOUT,
+    params: Optional[dict] = None,
+    deadline: Optional[float] = None,
+) -> Dict[str, Any]:
+    """_request() without blocking the event loop (retries sleep asynchronously)."""
+    wait = _breaker.allow()
+    if wait is not None:
+        return _circuit_open(wait, path)
+    url = f"{SENTINEL_CENTRAL_URL.rstrip('/')}{path}"
+    end = time.monotonic() + (deadline or max(DEADLINE_S, timeout))
+    ok = False
+    try:
+        for attempt in range(MAX_RETRIES + 1):
+            try:
+                resp = await get_async_client().request(
+                    method,
+                    url,
+                    json=json,
+                    params=params,
+                    timeout=_attempt_timeout(timeout, end),
+                )
+                ok = resp.status_code < 500
+                return _result(resp, path)
+            except RETRY_ERRORS as e:
+                delay = _backoff(attempt)
+                if attempt < MAX_RETRIES and time.monotonic() + delay < end:
+                    await asyncio.sleep(delay)
+                    continue
+                return _gave_up(e, path)
+    finally:
+        _breaker.record(ok)
+    return {
+        "ok": False,
+        "status_code": 500,
+        "error": "Unexpected error: loop exited without return",
+        "endpoint": path,
+    }
+
+
+@dataclass(frozen=True)
+class Call:
+    """A request to sentinel_central, made by central_tool on invoke or ainvoke.
+
+    timeout bounds each attempt; deadline (default: the larger of
+    SENTINEL_CENTRAL_DEADLINE_S and timeout) bounds the call including retries.
+    """
+
+    method: str
+    path: str
+    json: Optional[dict] = None
+    params: Optional[dict] = None
+    timeout: float = DEFAULT_TIMEOUT
+    deadline: Optional[float] = None
+
+
+def central_tool(fn: Callable[..., Union[Call, Dict[str, Any]]]) -> StructuredTool:
+    """Like @tool, for a function that returns a Call (or an error dict)."""
+
+    @functools.wraps(fn)
+    def run(*args: Any, **kwargs: Any) -> Dict[str, Any]:
+        c = fn(*args, **kwargs)
+        if not isinstance(c, Call):
+            return c
+        return _request(c.method, c.path, c.json, c.timeout, c.params, c.deadline)
+
+    @functools.wraps(fn)
+    async def arun(*args: Any, **kwargs: Any) -> Dict[str, Any]:
+        c = fn(*args, **kwargs)
+        if not isinstance(c, Call):
+            return c
+        return await _arequest(
+            c.method, c.path, c.json, c.timeout, c.params, c.deadline
+        )
+
+    return StructuredTool.from_function(func=run, coroutine=arun)
+
+
+@central_tool
+def send_track(resolved_id: str) -> Union[Call, Dict[str, Any]]:
     """Activate server-side tracking for a person/identity by resolved_id."""
     if not resolved_id:
         return {
@@ -87,11 +384,11 @@ def send_track(resolved_id: str) -> Dict[str, Any]:
             "error": "resolved_id is required",
             "endpoint": "/person/track",
         }
-    return _request("POST", "/person/track", json={"resolved_id": resolved_id})
+    return Call("POST", "/person/track", json={"resolved_id": resolved_id})
 
 
-@tool
-def send_cancel(resolved_id: str) -> Dict[str, Any]:
+@central_tool
+def send_cancel(resolved_id: str) -> Union[Call, Dict[str, Any]]:
     """Cancel/disable server-side tracking for a person/identity by resolved_id."""
     if not resolved_id:
         return {
@@ -100,11 +397,11 @@ def send_cancel(resolved_id: str) -> Dict[str, Any]:
             "error": "resolved_id is required",
             "endpoint": "/person/untrack",
         }
-    return _request("POST", "/person/untrack", json={"resolved_id": resolved_id})
+    return Call("POST", "/person/untrack", json={"resolved_id": resolved_id})
 
 
-@tool
-def get_track_status(resolved_id: str) -> Dict[str, Any]:
+@central_tool
+def get_track_status(resolved_id: str) -> Union[Call, Dict[str, Any]]:
     """Fetch current tracking status (is_tracked) for a resolved_id."""
     if not resolved_id:
         return {
@@ -113,11 +410,11 @@ def get_track_status(resolved_id: str) -> Dict[str, Any]:
             "error": "resolved_id is required",
             "endpoint": "/person/{id}/tracking",
         }
-    return _request("GET", f"/person/{resolved_id}/tracking")
+    return Call("GET", f"/person/{resolved_id}/tracking")
 
 
-@tool
-def get_person_insight(resolved_id: str) -> Dict[str, Any]:
+@central_tool
+def get_person_insight(resolved_id: str) -> Union[Call, Dict[str, Any]]:
     """Get last movement and last ad event for a resolved_id (context only)."""
     if not resolved_id:
         return {
@@ -126,4 +423,78 @@ def get_person_insight(resolved_id: str) -> Dict[str, Any]:
             "error": "resolved_id is required",
             "endpoint": "/insight/{id}",
         }
-    return _request("GET", f"/insight/{resolved_id}")
+    return Call("GET", f"/insight/{resolved_id}")
+
+
+@central_tool
+def find_similar_person(
+    start_ms: int,
+    end_ms: int,
+    resolved_id: Optional[str] = None,
+    camera_id: Optional[str] = None,
+    track_id: Optional[str] = None,
+    event_id: Optional[int] = None,
+    location_id: Optional[str] = None,
+    camera_ids: Optional[List[str]] = None,
+    max_distance: Optional[float] = None,
+    limit: int = 20,
+    cursor: Optional[str] = None,
+) -> Union[Call, Dict[str, Any]]:
+    """Find where a person appeared across cameras (embedding similarity search).
+    Query by resolved_id, by camera_id + track_id, or by par-event event_id,
+    within start_ms..end_ms (optional location_id / camera_ids filters).
+    Returns groups per camera/track: cam_id, track_id, resolved_id,
+    best_distance, hits, first_ms, last_ms; pass next_cursor as cursor for
+    the next page.
+    """
+    if not (resolved_id or event_id is not None or (camera_id and track_id)):
+        return {
+            "ok": False,
+            "status_code": 400,
+            "error": "resolved_id, event_id or camera_id+track_id is required",
+            "endpoint": "/person/similar",
+        }
+    body: Dict[str, Any] = {
+        "start_ms": start_ms,
+        "end_ms": end_ms,
+        "resolved_id": resolved_id,
+        "camera_id": camera_id,
+        "track_id": track_id,
+        "event_id": event_id,
+        "location_id": location_id,
+        "camera_ids": camera_ids,
+        "max_distance": max_distance,
+        "limit": limit,
+        "cursor": cursor,
+    }
+    return Call(
+        "POST",
+        "/person/similar",
+        json={k: v for k, v in body.items() if v is not None},
+        timeout=SEARCH_TIMEOUT,
+    )
+
+
+@central_tool
+def get_person_trajectory(
+    resolved_id: str, start_ms: int, end_ms: int
+) -> Union[Call, Dict[str, Any]]:
+    """Where a person (resolved_id) has been between start_ms and end_ms.
+    Returns ordered per-camera segments (location_id, camera_id, enter_ms,
+    exit_ms, dwell_ms), consecutive visits to the same camera merged, plus
+    cameras, locations, dwell_ms_by_location and the current segment if
+    still present. Long trajectories keep the first and last segments and
+    report omitted_segments.
+    """
+    if not resolved_id:
+        return {
+            "ok": False,
+            "status_code": 400,
+            "error": "resolved_id is required",
+            "endpoint": "/person/{id}/trajectory",
+        }
+    return Call(
+        "GET",
+        f"/person/{resolved_id}/trajectory",
+        params={"start_ms": start_ms, "end_ms": end_ms},
+    )
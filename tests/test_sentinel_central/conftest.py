@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# sentinel_central is run from its own directory and imports itself as `app`
+sys.path.insert(0, str(Path(__file__).parents[2] / "sentinel_central"))
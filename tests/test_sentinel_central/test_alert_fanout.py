@@ -0,0 +1,203 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+from app.alert_stub import AlertStub
+from app.events import AnomalyAlertPayload
+from app.services.alert_fanout import (
+    Alert,
+    Channel,
+    ChannelQueue,
+    Coalescer,
+    PushoverChannel,
+    TokenBucket,
+    WebhookChannel,
+)
+
+
+def _payload(ts_ms=1000, phase="start", camera_id="C1", confidence=0.5, episode="E1"):
+    return AnomalyAlertPayload(
+        episode=episode,
+        phase=phase,
+        location_id="L1",
+        camera_id=camera_id,
+        ts_ms=ts_ms,
+        confidence=confidence,
+    )
+
+
+def _alert(episode="E1") -> Alert:
+    return Alert.from_payload(_payload(episode=episode))
+
+
+def _with_stub(check, **stub_kwargs):
+    async def main():
+        stub = AlertStub(**stub_kwargs)
+        port = await stub.start()
+        try:
+            async with httpx.AsyncClient() as client:
+                return await check(stub, client, f"http://127.0.0.1:{port}")
+        finally:
+            await stub.close()
+
+    return asyncio.run(main())
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class TestTokenBucket:
+
+    def test_burst_then_refill(self) -> None:
+        clock = FakeClock()
+        bucket = TokenBucket(rate_per_s=2.0, burst=2, clock=clock)
+
+        assert bucket.take() and bucket.take()
+        assert not bucket.take()
+        assert bucket.delay() == pytest.approx(0.5)
+
+        clock.now = 0.5
+        assert bucket.take()
+
+    def test_hold_blocks_for_the_requested_time(self) -> None:
+        clock = FakeClock()
+        bucket = TokenBucket(rate_per_s=1.0, burst=5, clock=clock)
+
+        bucket.hold(3.0)
+
+        assert not bucket.take()
+        assert bucket.delay() == pytest.approx(4.0)
+        clock.now = 4.0
+        assert bucket.take()
+
+
+class TestCoalescer:
+
+    def test_leading_alert_then_one_trailing_summary(self) -> None:
+        c = Coalescer(window_ms=1000)
+
+        first = c.offer(_payload(ts_ms=1), now_ms=0)
+        assert [a.count for a in first] == [1]
+        assert (
+            c.offer(_payload(ts_ms=2, camera_id="C2", confidence=0.9), now_ms=100) == []
+        )
+        assert c.offer(_payload(ts_ms=3, phase="end"), now_ms=200) == []
+        assert c.due(now_ms=999) == []
+
+        (summary,) = c.due(now_ms=1000)
+        assert summary.count == 2
+        assert summary.cameras == {"C1", "C2"}
+        assert summary.confidence == 0.9
+        assert summary.phase == "end"
+        assert c.merged == 2 and c.open_windows == 0
+
+    def test_full_table_closes_the_oldest_window(self) -> None:
+        c = Coalescer(window_ms=1000, max_windows=1)
+        c.offer(_payload(episode="E1"), now_ms=0)
+        c.offer(_payload(episode="E1"), now_ms=10)
+
+        out = c.offer(_payload(episode="E2"), now_ms=20)
+
+        assert [a.episode for a in out] == ["E1", "E2"]
+        assert c.open_windows == 1
+
+
+class TestChannel:
+
+    def test_channel_is_abstract(self) -> None:
+        with pytest.raises(TypeError):
+            Channel(60, 1)
+
+
+class TestChannelQueue:
+
+    def test_webhook_delivers_a_batch(self) -> None:
+        async def check(stub, client, base):
+            q = ChannelQueue(WebhookChannel(url=f"{base}/webhook"))
+            q.put(_alert("E1"))
+            q.put(_alert("E2"))
+            await q.send_next(client)
+            return stub, q
+
+        stub, q = _with_stub(check)
+
+        (message,) = stub.messages
+        assert [a["episode"] for a in message["body"]["alerts"]] == ["E1", "E2"]
+        assert message["body"]["suppressed"] == 0
+        assert q.stats.sent == 2 and q.stats.messages == 1
+
+    def test_failed_send_is_retried(self) -> None:
+        async def check(stub, client, base):
+            q = ChannelQueue(WebhookChannel(url=f"{base}/webhook"))
+            q.put(_alert())
+            await q.send_next(client)
+            assert not q.queue and len(q.retry) == 1
+            assert q.stats.retried == 1
+            stub.fail_rate = 0.0
+            await q.flush(client)
+            return stub, q
+
+        stub, q = _with_stub(check, fail_rate=1.0)
+
+        assert stub.failed == 1 and len(stub.messages) == 1
+        assert q.stats.sent == 1 and q.stats.failed == 0
+        assert not q.retry
+
+    def test_gives_up_after_max_attempts(self) -> None:
+        async def check(stub, client, base):
+            q = ChannelQueue(WebhookChannel(url=f"{base}/webhook"), max_attempts=2)
+            q.put(_alert())
+            await q.send_next(client)
+            await q.flush(client)
+            return q
+
+        q = _with_stub(check, fail_rate=1.0)
+
+        assert q.stats.retried == 1 and q.stats.failed == 1
+        assert not q.queue and not q.retry
+
+    def test_retry_after_holds_the_channel(self) -> None:
+        async def check(stub, client, base):
+            q = ChannelQueue(WebhookChannel(url=f"{base}/webhook"))
+            q.put(_alert())
+            await q.send_next(client)
+            return stub, q, time.monotonic()
+
+        stub, q, now = _with_stub(check, status_429_every=1)
+
+        assert stub.throttled == 1
+        # the stub answers 429 with Retry-After: 1
+        assert q.channel.bucket.delay() > 0.9
+        assert q.retry[0][0] - now >= 0.9
+
+    def test_suppressed_count_reaches_the_next_message(self) -> None:
+        async def check(stub, client, base):
+            channel = PushoverChannel(
+                api=f"{base}/1/messages.json", token="t", user="u"
+            )
+            q = ChannelQueue(channel, max_size=2)
+            for episode in ("E1", "E2", "E3"):
+                q.put(_alert(episode))
+            assert q.suppressed == 1 and q.stats.dropped == 1
+
+            stub.fail_rate = 1.0
+            await q.send_next(client)
+            # a failed send keeps the count for the retry
+            assert q.suppressed == 1
+            stub.fail_rate = 0.0
+            await q.flush(client)
+            return stub, q
+
+        stub, q = _with_stub(check)
+
+        (message,) = stub.messages
+        lines = message["body"]["message"].splitlines()
+        assert lines[-1] == "+1 more alerts suppressed (rate limit)"
+        assert len(lines) == 3
+        assert q.suppressed == 0
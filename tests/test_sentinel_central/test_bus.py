@@ -0,0 +1,48 @@
+import asyncio
+
+from app.bus import InProcessBus
+
+
+class TestInProcessBusJoin:
+
+    def test_join_waits_for_downstream_handlers(self) -> None:
+        handled = []
+
+        async def main():
+            bus = InProcessBus()
+
+            async def first(envelope):
+                await asyncio.sleep(0.01)
+                await bus.publish("second", {"n": envelope["n"]})
+
+            async def second(envelope):
+                await asyncio.sleep(0.01)
+                handled.append(envelope["n"])
+
+            await bus.subscribe("first", first)
+            await bus.subscribe("second", second)
+            for n in range(3):
+                await bus.publish("first", {"n": n})
+            await asyncio.wait_for(bus.join(), 1)
+            await bus.close()
+
+        asyncio.run(main())
+
+        assert handled == [0, 1, 2]
+
+    def test_join_counts_failed_handlers_as_done(self) -> None:
+        async def main():
+            bus = InProcessBus()
+
+            async def boom(envelope):
+                raise RuntimeError("bad")
+
+            await bus.subscribe("q", boom)
+            await bus.publish("q", {})
+            await asyncio.wait_for(bus.join(), 1)
+            await bus.close()
+
+        asyncio.run(main())
+
+    def test_join_on_an_idle_bus_returns_at_once(self) -> None:
+        asyncio.run(asyncio.wait_for(InProcessBus().join(), 1))
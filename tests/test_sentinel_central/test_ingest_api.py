@@ -0,0 +1,40 @@
+import asyncio
+from unittest.mock import AsyncMock, Mock
+
+from app import ingest_api
+
+
+class TestIngestFlush:
+
+    def test_flush_task_sweeps_the_ingest_pipeline(self, monkeypatch) -> None:
+        idf = Mock()
+        idf.aggregator.enabled = True
+        idf.aggregator.max_wait_ms = 0
+        idf.flush_expired = AsyncMock(return_value=0)
+        idf.flush_pending = AsyncMock(return_value=0)
+        monkeypatch.setattr(ingest_api, "_idf", idf)
+        monkeypatch.setattr(ingest_api, "_ran", None)
+        monkeypatch.setattr(ingest_api, "_bus", None)
+
+        async def main():
+            ingest_api.start_ingest()
+            await asyncio.sleep(0.25)
+            await ingest_api.close_ingest()
+
+        asyncio.run(main())
+
+        assert idf.flush_expired.await_count >= 1
+        idf.flush_pending.assert_awaited_once_with()
+        assert ingest_api._flush_task is None
+
+    def test_summary_counts_buffered_items_apart(self) -> None:
+        out = ingest_api._summary(
+            [
+                {"index": 1, "status": "buffered"},
+                {"index": 0, "status": "accepted"},
+                {"index": 2, "status": "rejected", "error": "bad"},
+            ]
+        )
+
+        assert (out["accepted"], out["buffered"], out["rejected"]) == (1, 1, 1)
+        assert [r["index"] for r in out["results"]] == [0, 1, 2]
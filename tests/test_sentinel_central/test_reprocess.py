@@ -0,0 +1,127 @@
+import json
+
+from app.common.resolve import Resolver
+from app.reprocess import Reprocessor
+
+DIM = 512
+
+
+def _vec(axis: int) -> str:
+    v = ["0"] * DIM
+    v[axis] = "1"
+    return "[" + ",".join(v) + "]"
+
+
+def _row(row_id, track, ts_ms, emb=None, appeared=True, old=None, cam="C1"):
+    return (row_id, cam, track, ts_ms, appeared, old, emb, "L1")
+
+
+def _reprocessor(*gallery) -> Reprocessor:
+    rp = Reprocessor(Resolver(), track_ttl_ms=60_000)
+    rp.load_gallery([(rid, _vec(axis), 0, 0, 1) for rid, axis in gallery])
+    return rp
+
+
+class TestTrackInheritance:
+
+    def test_later_rows_inherit_the_first_embedded_match(self) -> None:
+        rp = _reprocessor(("R-1", 0))
+
+        out = rp.process(
+            [
+                _row(1, "t1", 100, emb=_vec(0), old="R-9"),
+                _row(2, "t1", 200, old="R-9"),
+                _row(3, "t1", 300, emb=_vec(5), old="R-1"),
+            ]
+        )
+
+        # row 3 carries another embedding but the track is already resolved
+        assert out.par == [(1, "R-1"), (2, "R-1")]
+        assert out.tracks == [("C1", "t1", 100, 300, "R-1")]
+        assert out.new_ids == []
+        assert rp.progress.matched == 1 and rp.progress.changed == 2
+        assert out.position == (300, 3)
+
+    def test_unmatched_track_creates_one_identity(self) -> None:
+        rp = _reprocessor(("R-1", 0))
+
+        out = rp.process(
+            [_row(1, "t1", 100, emb=_vec(1)), _row(2, "t1", 200, emb=_vec(1))]
+        )
+
+        assert len(out.new_ids) == 1
+        rid = out.new_ids[0]
+        assert out.par == [(1, rid), (2, rid)]
+        assert [i[0] for i in out.identities if i[5]] == [rid]
+
+    def test_disappearance_ends_the_track(self) -> None:
+        rp = _reprocessor(("R-1", 0), ("R-2", 1))
+
+        out = rp.process(
+            [
+                _row(1, "t1", 100, emb=_vec(0), appeared=False),
+                _row(2, "t1", 200, emb=_vec(1)),
+            ]
+        )
+
+        assert out.par == [(1, "R-1"), (2, "R-2")]
+        assert ("C1", "t1") in rp.tracks
+
+
+class TestPendingRows:
+
+    def test_rows_before_the_first_embedding_are_back_filled(self) -> None:
+        rp = _reprocessor(("R-1", 0))
+
+        out = rp.process(
+            [
+                _row(1, "t1", 100),
+                _row(2, "t1", 200, old="R-1"),
+                _row(3, "t1", 300, emb=_vec(0)),
+            ]
+        )
+
+        assert sorted(out.par) == [(1, "R-1"), (3, "R-1")]
+        assert out.tracks == [("C1", "t1", 100, 300, "R-1")]
+        assert rp.tracks[("C1", "t1")].pending == []
+
+    def test_tracks_without_embeddings_count_as_unresolved(self) -> None:
+        rp = _reprocessor(("R-1", 0))
+
+        out = rp.process([_row(1, "t1", 100), _row(2, "t1", 200, appeared=False)])
+
+        assert out.par == [] and out.tracks == []
+        assert rp.progress.unresolved == 2
+
+    def test_idle_tracks_expire_after_the_ttl(self) -> None:
+        rp = _reprocessor(("R-1", 0))
+        rp.process([_row(1, "t1", 100)])
+
+        rp.process([_row(2, "t2", 100 + rp.track_ttl_ms + 1)])
+
+        assert ("C1", "t1") not in rp.tracks
+        assert rp.progress.unresolved == 1
+
+
+class TestCheckpointRestore:
+
+    def test_restore_continues_pending_and_resolved_tracks(self) -> None:
+        rp = _reprocessor(("R-1", 0), ("R-2", 1))
+        rp.process([_row(1, "t1", 100), _row(2, "t2", 150, emb=_vec(1))])
+        state = json.loads(json.dumps(rp.state()))
+
+        resumed = _reprocessor(("R-1", 0), ("R-2", 1))
+        resumed.restore(state)
+        out = resumed.process([_row(3, "t2", 200), _row(4, "t1", 250, emb=_vec(0))])
+
+        assert sorted(out.par) == [(1, "R-1"), (3, "R-2"), (4, "R-1")]
+        assert resumed.progress.rows == 4
+        assert resumed.progress.batches == 2
+        assert resumed.progress.matched == 2
+
+    def test_restore_of_an_empty_state(self) -> None:
+        rp = _reprocessor()
+        rp.restore({})
+
+        assert rp.tracks == {}
+        assert rp.progress.rows == 0
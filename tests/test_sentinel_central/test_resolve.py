@@ -0,0 +1,64 @@
+import asyncio
+from unittest.mock import AsyncMock, patch
+
+import numpy as np
+from app.common.gallery import HotGallery
+from app.common.resolve import Resolver
+
+
+def _unit(*xs: float) -> np.ndarray:
+    v = np.zeros(512, dtype=np.float32)
+    v[: len(xs)] = xs
+    return v / np.linalg.norm(v)
+
+
+def _resolver(*hot) -> Resolver:
+    gallery = HotGallery(horizon_ms=60_000)
+    gallery._loaded = True
+    for rid, v in hot:
+        gallery.promote(rid, v, 1_000)
+    return Resolver(gallery=gallery)
+
+
+def _candidates(resolver, q, cold):
+    with patch(
+        "app.common.resolve._nearest_identities", AsyncMock(return_value=cold)
+    ) as nearest:
+        top = asyncio.run(resolver._candidates(None, q, 1_000))
+    return top, nearest
+
+
+class TestCandidates:
+
+    def test_confident_hot_match_skips_the_cold_gallery(self) -> None:
+        resolver = _resolver(("R-1", _unit(1.0)))
+
+        top, nearest = _candidates(resolver, _unit(1.0), [])
+
+        nearest.assert_not_awaited()
+        assert [c["id"] for c in top] == ["R-1"]
+        assert resolver.hot_hits == 1
+
+    def test_ambiguous_hot_match_is_checked_against_the_cold_gallery(self) -> None:
+        # hot distance ~0.27: inside tau_ambig, outside tau_same
+        resolver = _resolver(("R-1", _unit(1.0)))
+        q = _unit(1.0, 0.94)
+        cold = [{"id": "R-2", "distance": 0.25}, {"id": "R-1", "distance": 0.27}]
+
+        top, nearest = _candidates(resolver, q, cold)
+
+        nearest.assert_awaited_once()
+        assert [c["id"] for c in top] == ["R-2", "R-1"]
+        # R-2 wins, but the margin to R-1 is below delta_min: a new identity
+        best, second = top[0]["distance"], top[1]["distance"]
+        assert resolver.decide(top[0]["id"], best, second) is None
+
+    def test_merge_keeps_the_hot_second_when_cold_has_one_row(self) -> None:
+        resolver = _resolver(("R-1", _unit(1.0)), ("R-3", _unit(0.0, 1.0)))
+        q = _unit(1.0, 0.94)
+        cold = [{"id": "R-1", "distance": 0.5}]
+
+        top, _ = _candidates(resolver, q, cold)
+
+        assert [c["id"] for c in top] == ["R-1", "R-3"]
+        assert top[0]["distance"] < 0.3
@@ -0,0 +1,41 @@
+from app.common.snapshot import _prune
+
+
+def _snapshots(root, *names, current):
+    for name in names:
+        (root / name).mkdir()
+    (root / "CURRENT").write_text(current)
+
+
+class TestPrune:
+
+    def test_keeps_the_newest_by_creation_time(self, tmp_path) -> None:
+        # an idle period: same watermark, three writes
+        _snapshots(tmp_path, "500-1", "500-2", "500-3", current="500-3")
+
+        _prune(tmp_path, keep=2)
+
+        assert sorted(p.name for p in tmp_path.iterdir() if p.is_dir()) == [
+            "500-2",
+            "500-3",
+        ]
+
+    def test_never_removes_the_current_snapshot(self, tmp_path) -> None:
+        _snapshots(tmp_path, "500-1", "600-2", "700-3", current="500-1")
+
+        _prune(tmp_path, keep=1)
+
+        assert sorted(p.name for p in tmp_path.iterdir() if p.is_dir()) == [
+            "500-1",
+            "700-3",
+        ]
+
+    def test_prunes_old_layout_and_ignores_other_entries(self, tmp_path) -> None:
+        _snapshots(tmp_path, "400", ".tmp-1-2", "700-3", current="700-3")
+
+        _prune(tmp_path, keep=1)
+
+        assert sorted(p.name for p in tmp_path.iterdir() if p.is_dir()) == [
+            ".tmp-1-2",
+            "700-3",
+        ]
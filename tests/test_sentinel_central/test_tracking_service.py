@@ -0,0 +1,115 @@
+import asyncio
+from unittest.mock import AsyncMock, Mock
+
+from app.services.track_aggregation import TrackResolution
+from app.tracking_service import IDFusion
+
+
+def _envelope(ts_ms, track="t1", event_type="appearance"):
+    return {
+        "type": "par-event",
+        "ts_ms": ts_ms,
+        "created_by": "edge-test",
+        "payload": {
+            "event_type": event_type,
+            "track_id": track,
+            "location_id": "L1",
+            "camera_id": "C1",
+            "edge_id": "E1",
+            "frame": 1,
+            "bbox_ltrb": [0, 0, 10, 20],
+            "embedding": [1.0] + [0.0] * 511,
+        },
+    }
+
+
+def _idf() -> IDFusion:
+    idf = IDFusion(Mock())
+    idf.debouncer = Mock(enabled=False)
+    idf._resolve_group = AsyncMock()
+    idf._store_resolved = AsyncMock()
+    return idf
+
+
+class TestExpirySweep:
+
+    def test_sweep_uses_event_time_not_wall_clock(self) -> None:
+        idf = _idf()
+
+        async def main():
+            # an event from long ago, e.g. read from a broker backlog
+            await idf.handle_par_event(_envelope(1_000))
+            return await idf.flush_expired()
+
+        assert asyncio.run(main()) == 0
+        assert idf.aggregator.pending_tracks == 1
+        idf._resolve_group.assert_not_awaited()
+
+    def test_sweep_flushes_after_idle_wall_time(self) -> None:
+        idf = _idf()
+
+        async def main():
+            await idf.handle_par_event(_envelope(1_000))
+            idf._watermark_at -= idf.aggregator.max_wait_ms / 1000.0
+            return await idf.flush_expired()
+
+        assert asyncio.run(main()) == 1
+        assert idf.aggregator.pending_tracks == 0
+
+    def test_sweep_before_any_event_is_a_no_op(self) -> None:
+        assert asyncio.run(_idf().flush_expired()) == 0
+
+    def test_sweep_and_handler_do_not_interleave(self) -> None:
+        idf = _idf()
+
+        async def resolve(group):
+            await asyncio.sleep(0.01)
+            idf.aggregator.set_resolution(
+                group[0].key, TrackResolution("R-1", 0.1, None, False, 1)
+            )
+
+        idf._resolve_group = AsyncMock(side_effect=resolve)
+
+        async def main():
+            await idf.handle_par_event(_envelope(1_000))
+            idf._watermark_at -= idf.aggregator.max_wait_ms / 1000.0
+            await asyncio.gather(
+                idf.flush_expired(), idf.handle_par_event(_envelope(1_100))
+            )
+
+        asyncio.run(main())
+
+        # the second detection waited for the resolution instead of opening a group
+        assert idf._resolve_group.await_count == 1
+        idf._store_resolved.assert_awaited_once()
+        assert idf.aggregator.pending_tracks == 0
+
+
+class TestParBatch:
+
+    def test_buffered_detections_are_reported_as_such(self) -> None:
+        idf = _idf()
+        idf._handle_single = AsyncMock()
+        batch = [
+            _envelope(1_000, track="t1"),
+            _envelope(1_100, track="t1"),
+            _envelope(1_200, track="t2", event_type="disappearance"),
+        ]
+
+        statuses = asyncio.run(idf.handle_par_batch(batch))
+
+        assert statuses == ["buffered", "buffered", "accepted"]
+        idf._handle_single.assert_awaited_once()
+
+    def test_items_of_flushed_groups_are_accepted(self) -> None:
+        idf = _idf()
+        late = 1_000 + idf.aggregator.max_wait_ms
+
+        statuses = asyncio.run(
+            idf.handle_par_batch(
+                [_envelope(1_000, track="t1"), _envelope(late, track="t2")]
+            )
+        )
+
+        assert statuses == ["accepted", "buffered"]
+        idf._resolve_group.assert_awaited_once()
@@ -165,7 +165,14 @@ def mock_all_heavy_imports():
 @pytest.fixture
 def mock_db_connection():
     """Mock database connection with proper context manager support"""
-    with patch("psycopg.connect") as mock_connect:
+    with (
+        patch("psycopg.connect") as mock_connect,
+        # pooled connections resolve to the same mock as direct ones
+        patch(
+            "sentinel_mas.tools.pool.connection",
+            side_effect=lambda dsn, *args, **kwargs: mock_connect(dsn),
+        ),
+    ):
         # Create mock connection and cursor
         mock_conn = MagicMock()
         mock_cursor = MagicMock()
@@ -0,0 +1,271 @@
+import asyncio
+import json
+import threading
+from contextlib import asynccontextmanager
+from unittest.mock import AsyncMock, MagicMock, Mock, patch
+
+import httpx
+from langchain_core.messages import AIMessage
+
+from sentinel_mas.policy_sentinel.runtime import get_context
+from sentinel_mas.policy_sentinel.secure_executor import asecure_execute_tool
+from sentinel_mas.policy_sentinel.secure_tool_node import SecureToolNode
+from sentinel_mas.tools import db
+
+
+def _async_cursor(rows, description=(("track_id",), ("resolved_id",))):
+    cur = MagicMock()
+    cur.__aenter__ = AsyncMock(return_value=cur)
+    cur.__aexit__ = AsyncMock(return_value=None)
+    cur.execute = AsyncMock()
+    cur.fetchall = AsyncMock(return_value=rows)
+    cur.fetchone = AsyncMock(return_value=rows[0] if rows else None)
+    cur.description = description
+    return cur
+
+
+def _patch_async_connection(cur):
+    conn = MagicMock()
+    conn.cursor.return_value = cur
+    dsns = []
+
+    @asynccontextmanager
+    async def fake(dsn, *args, **kwargs):
+        dsns.append(dsn)
+        yield conn
+
+    return patch("sentinel_mas.tools.pool.async_connection", fake), dsns
+
+
+class TestQueryPlans:
+
+    def test_db_tool_ainvoke_runs_on_async_connection(self, monkeypatch) -> None:
+        from sentinel_mas.tools.events_tools import who_entered_zone
+
+        monkeypatch.setattr(db, "READ_DSN", None)
+        cur = _async_cursor([(1, "R-1"), (2, "R-2")])
+        patcher, dsns = _patch_async_connection(cur)
+
+        with patcher, patch("psycopg.connect") as mock_connect:
+            result = asyncio.run(
+                who_entered_zone.ainvoke(
+                    {"location_id": "L1", "start_ms": 0, "end_ms": 10}
+                )
+            )
+
+        mock_connect.assert_not_called()
+        assert dsns == [db.DSN]
+        assert result["count"] == 2
+        assert result["rows"][0] == {"track_id": 1, "resolved_id": "R-1"}
+        assert cur.execute.await_args[0][1][0] == "L1"
+
+    def test_offload_runs_in_worker_thread(self, monkeypatch) -> None:
+        seen = {}
+
+        def embed(text):
+            seen["thread"] = threading.current_thread()
+            return [0.5]
+
+        def plan():
+            vec = yield db.Offload(embed, ("q",))
+            row = yield db.Query("SELECT %s", (vec,), fetch="one")
+            return row
+
+        monkeypatch.setattr(db, "READ_DSN", None)
+        cur = _async_cursor([("ok",)])
+        patcher, _ = _patch_async_connection(cur)
+        with patcher:
+            assert asyncio.run(db.arun_plan(plan())) == ("ok",)
+
+        assert seen["thread"] is not threading.main_thread()
+        assert cur.execute.await_args[0][1] == ([0.5],)
+
+    def test_run_plan_and_arun_plan_agree(self, mock_db_connection) -> None:
+        _, _, mock_cursor = mock_db_connection
+        mock_cursor.fetchall.return_value = [(7, "R-7")]
+        mock_cursor.description = (("track_id",), ("resolved_id",))
+
+        def plan():
+            rows = yield db.Query("SELECT 1", ())
+            return rows
+
+        sync_rows = db.run_plan(plan())
+        patcher, _ = _patch_async_connection(_async_cursor([(7, "R-7")]))
+        with patcher:
+            async_rows = asyncio.run(db.arun_plan(plan()))
+
+        assert sync_rows == async_rows == [{"track_id": 7, "resolved_id": "R-7"}]
+
+
+class TestCentralToolsAsync:
+
+    def test_ainvoke_uses_async_client(self) -> None:
+        from sentinel_mas.tools.tracking_tools import send_track
+
+        response = Mock(status_code=200)
+        response.json.return_value = {"tracked": True}
+        with (
+            patch("httpx.AsyncClient") as mock_async,
+            patch("httpx.Client") as mock_sync,
+        ):
+            client = mock_async.return_value
+            client.request = AsyncMock(return_value=response)
+            result = asyncio.run(send_track.ainvoke({"resolved_id": "R-1"}))
+
+        mock_sync.assert_not_called()
+        assert result["ok"] is True
+        assert result["data"] == {"tracked": True}
+        assert client.request.await_args[0][0] == "POST"
+
+    def test_ainvoke_retries_without_blocking(self) -> None:
+        import sentinel_mas.tools.tracking_tools as tracking_tools
+
+        with (
+            patch("httpx.AsyncClient") as mock_async,
+            patch("asyncio.sleep", new=AsyncMock()) as mock_sleep,
+        ):
+            client = mock_async.return_value
+            client.request = AsyncMock(side_effect=httpx.ConnectError("down"))
+            result = asyncio.run(
+                tracking_tools.get_track_status.ainvoke({"resolved_id": "R-1"})
+            )
+
+        assert result["ok"] is False
+        assert result["status_code"] == 599
+        assert client.request.await_count == tracking_tools.MAX_RETRIES + 1
+        assert mock_sleep.await_count == tracking_tools.MAX_RETRIES
+
+
+class TestAsyncSecureExecution:
+
+    @patch("sentinel_mas.policy_sentinel.secure_executor.audit_tool_success")
+    @patch("sentinel_mas.policy_sentinel.secure_executor.audit_guard_allow")
+    @patch("sentinel_mas.policy_sentinel.secure_executor.guard_tool_call")
+    def test_asecure_execute_awaits_ainvoke(
+        self, mock_guard, mock_allow, mock_success
+    ) -> None:
+        tool = Mock()
+        tool.ainvoke = AsyncMock(return_value={"ok": True, "count": 1})
+
+        result = asyncio.run(asecure_execute_tool("t", tool, {"a": 1}))
+
+        assert result == {"ok": True, "count": 1}
+        tool.ainvoke.assert_awaited_once_with({"a": 1})
+        tool.invoke.assert_not_called()
+        mock_guard.assert_called_once()
+        mock_success.assert_called_once()
+
+    @patch("sentinel_mas.policy_sentinel.secure_executor.audit_tool_failure")
+    @patch("sentinel_mas.policy_sentinel.secure_executor.audit_guard_allow")
+    @patch("sentinel_mas.policy_sentinel.secure_executor.guard_tool_call")
+    def test_asecure_execute_audits_failure(
+        self, mock_guard, mock_allow, mock_failure
+    ) -> None:
+        def plain(**kwargs):
+            raise ValueError("bad")
+
+        try:
+            asyncio.run(asecure_execute_tool("plain", plain, {}))
+        except ValueError:
+            pass
+        else:
+            raise AssertionError("ValueError not raised")
+        mock_failure.assert_called_once()
+
+
+class TestSecureToolNodeAsync:
+
+    def _state(self, *calls):
+        ai = AIMessage(
+            content="",
+            tool_calls=[
+                {"id": f"tc{i}", "name": name, "args": {}, "type": "tool_call"}
+                for i, name in enumerate(calls)
+            ],
+        )
+        return {
+            "messages": [ai],
+            "user_id": "u",
+            "user_role": "operator",
+            "request_id": "r",
+            "session_id": "s",
+        }
+
+    def test_acall_runs_calls_one_after_another(self, monkeypatch) -> None:
+        events = []
+        routes = []
+
+        async def slow(tool_name, tool_fn, tool_args):
+            events.append(("start", tool_name))
+            routes.append(get_context().route)
+            await asyncio.sleep(0)
+            events.append(("end", tool_name))
+            return {"tool": tool_name}
+
+        monkeypatch.setattr(
+            "sentinel_mas.policy_sentinel.secure_tool_node.TOOL_REGISTRY",
+            {"a": object(), "b": object()},
+        )
+        monkeypatch.setattr(
+            "sentinel_mas.policy_sentinel.secure_tool_node.asecure_execute_tool", slow
+        )
+
+        node = SecureToolNode(route="EVENTS", tools=[])
+        out = asyncio.run(node.acall(self._state("a", "b")))
+
+        names = [m.name for m in out["messages"][1:]]
+        assert names == ["a", "b"]
+        assert events == [("start", "a"), ("end", "a"), ("start", "b"), ("end", "b")]
+        assert json.loads(out["messages"][-1].content)["data"] == {"tool": "b"}
+        assert routes == ["EVENTS", "EVENTS"]
+        assert out["halt"] is False
+
+    def test_acall_maps_errors_like_sync_path(self, monkeypatch) -> None:
+        async def deny(tool_name, tool_fn, tool_args):
+            raise PermissionError("nope")
+
+        monkeypatch.setattr(
+            "sentinel_mas.policy_sentinel.secure_tool_node.TOOL_REGISTRY",
+            {"a": object()},
+        )
+        monkeypatch.setattr(
+            "sentinel_mas.policy_sentinel.secure_tool_node.asecure_execute_tool", deny
+        )
+
+        node = SecureToolNode(route="SOP", tools=[])
+        out = asyncio.run(node.acall(self._state("a", "missing")))
+
+        first, second = (json.loads(m.content) for m in out["messages"][1:])
+        assert first["status"] == "DENIED" and first["msg"] == "nope"
+        assert second["error_type"] == "UnknownTool"
+        # the unknown tool was never executed, so the denial still halts
+        assert out["halt"] is True
+
+    def test_acall_without_tool_calls(self) -> None:
+        node = SecureToolNode(route="SOP", tools=[])
+        assert asyncio.run(node.acall({"messages": []})) == {}
+
+
+class TestAgentNodes:
+
+    def test_crew_agent_acall_awaits_llm(self) -> None:
+        from sentinel_mas.agents.crew_agents import CrewAgent, as_node
+
+        agent = CrewAgent("events_agent")
+        agent.llm = Mock()
+        agent.llm.ainvoke = AsyncMock(return_value=AIMessage(content="hi"))
+
+        node = as_node(agent)
+        out = asyncio.run(node.ainvoke({"messages": [], "user_question": "q"}))
+
+        agent.llm.ainvoke.assert_awaited_once()
+        agent.llm.invoke.assert_not_called()
+        assert out["messages"][0].name == "events_agent"
+
+    def test_as_node_passes_through_plain_callables(self) -> None:
+        from sentinel_mas.agents.crew_agents import as_node
+
+        def plain(state):
+            return state
+
+        assert as_node(plain) is plain
@@ -0,0 +1,86 @@
+from unittest.mock import MagicMock, Mock, patch
+
+import psycopg
+import pytest
+
+from sentinel_mas.tools import db
+
+PRIMARY = "postgresql://primary/sentinel"
+REPLICA = "postgresql://replica/sentinel"
+
+
+def _conn(probe=None):
+    conn = MagicMock()
+    conn.__enter__ = Mock(return_value=conn)
+    conn.__exit__ = Mock(return_value=None)
+    cur = conn.cursor.return_value.__enter__.return_value
+    cur.fetchone.return_value = probe
+    return conn
+
+
+@pytest.fixture
+def routing(monkeypatch):
+    monkeypatch.setattr(db, "DSN", PRIMARY)
+    monkeypatch.setattr(db, "READ_DSN", REPLICA)
+    monkeypatch.setattr(db, "_replica", db.ReplicaState())
+    with patch("sentinel_mas.tools.pool.connection") as mock_connect:
+        yield mock_connect
+
+
+class TestReadRouting:
+
+    def test_no_replica_uses_primary(self, routing, monkeypatch) -> None:
+        monkeypatch.setattr(db, "READ_DSN", None)
+        primary = _conn()
+        routing.return_value = primary
+
+        with db.read_connection(1_000) as conn:
+            assert conn is primary
+        assert routing.call_args[0][0] == PRIMARY
+
+    def test_caught_up_replica_serves_read(self, routing) -> None:
+        replica = _conn(probe=(True, 500))
+        routing.return_value = replica
+
+        with db.read_connection(1_000) as conn:
+            assert conn is replica
+        assert routing.call_args[0][0] == REPLICA
+        assert db.replica_stats()["reads"] == 1
+
+    def test_lagging_replica_falls_back(self, routing) -> None:
+        replica, primary = _conn(probe=(False, 500)), _conn()
+        routing.side_effect = [replica, primary]
+
+        with db.read_connection(1_000) as conn:
+            assert conn is primary
+        # handed back to the pool, not kept for the primary read
+        replica.__exit__.assert_called_once()
+        assert db.replica_stats()["fallbacks_lag"] == 1
+
+    def test_empty_probe_falls_back(self, routing) -> None:
+        replica, primary = _conn(probe=None), _conn()
+        routing.side_effect = [replica, primary]
+
+        with db.read_connection(1_000) as conn:
+            assert conn is primary
+        assert db.replica_stats()["caught_up"] is False
+
+    def test_replica_covering_window_serves_read(self, routing) -> None:
+        replica = _conn(probe=(False, 2_000))
+        routing.return_value = replica
+
+        with db.read_connection(1_000) as conn:
+            assert conn is replica
+
+    def test_unreachable_replica_marked_down(self, routing) -> None:
+        primary = _conn()
+        routing.side_effect = [psycopg.OperationalError("down"), primary, primary]
+
+        with db.read_connection() as conn:
+            assert conn is primary
+        with db.read_connection() as conn:
+            assert conn is primary
+
+        # the second read skipped the replica entirely
+        assert [c[0][0] for c in routing.call_args_list] == [REPLICA, PRIMARY, PRIMARY]
+        assert db.replica_stats()["down"] is True
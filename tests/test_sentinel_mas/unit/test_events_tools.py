@@ -166,3 +166,124 @@ class TestEventsTools:
         assert result["ok"] is True
         assert result["filters"]["location_id"] is None
         assert result["filters"]["camera_id"] is None
+
+    def test_search_person_attributes_bitmask(self, mock_db_connection: Any) -> None:
+        """Test attribute search packs names into the attr_mask bits"""
+        from sentinel_mas.tools.events_tools import ATTR_ORDER, search_person_attributes
+
+        mock_connect, mock_conn, mock_cursor = mock_db_connection
+        mock_cursor.description = [("track_id",), ("resolved_id",)]
+        mock_cursor.fetchall.return_value = [("track_1", "person_1")]
+
+        result = search_person_attributes.invoke(
+            {
+                "attributes": ["upperbody color red", "Accessory-Backpack"],
+                "start_ms": 1000,
+                "end_ms": 2000,
+                "location_id": "exit-1",
+            }
+        )
+
+        want = (1 << ATTR_ORDER.index("UpperBody-Color-Red")) | (
+            1 << ATTR_ORDER.index("Accessory-Backpack")
+        )
+        sql_query, params = mock_cursor.execute.call_args[0]
+        assert "attr_mask" in sql_query
+        assert params == (1000, 2000, "exit-1", None, want, want, 0, 50)
+        assert result["ok"] is True
+        assert result["count"] == 1
+
+    def test_search_person_attributes_unknown_name(
+        self, mock_db_connection: Any
+    ) -> None:
+        """Test attribute search rejects names outside ATTR_ORDER"""
+        from sentinel_mas.tools.events_tools import search_person_attributes
+
+        mock_connect, mock_conn, mock_cursor = mock_db_connection
+
+        result = search_person_attributes.invoke(
+            {"attributes": ["Cape-Color-Red"], "start_ms": 1000, "end_ms": 2000}
+        )
+
+        assert result["ok"] is False
+        assert result["unknown"] == ["Cape-Color-Red"]
+        mock_cursor.execute.assert_not_called()
+
+    def test_who_was_present_at_instant(self, mock_db_connection: Any) -> None:
+        """Test presence lookup turns at_ms into a point range overlap"""
+        from sentinel_mas.tools.events_tools import who_was_present
+
+        mock_connect, mock_conn, mock_cursor = mock_db_connection
+        mock_cursor.description = [("track_id",), ("resolved_id",)]
+        mock_cursor.fetchall.return_value = [("track_1", "person_1")]
+
+        result = who_was_present.invoke({"location_id": "lobby", "at_ms": 1500})
+
+        sql_query, params = mock_cursor.execute.call_args[0]
+        assert "session_span(appear_ms, disappear_ms) &&" in sql_query
+        assert params == (1500, 1500, "lobby", None, 100)
+        assert result["ok"] is True
+        assert result["count"] == 1
+
+    def test_who_was_present_requires_time(self, mock_db_connection: Any) -> None:
+        """Test presence lookup without at_ms or a window"""
+        from sentinel_mas.tools.events_tools import who_was_present
+
+        mock_connect, mock_conn, mock_cursor = mock_db_connection
+
+        result = who_was_present.invoke({"location_id": "lobby", "start_ms": 1000})
+
+        assert result["ok"] is False
+        mock_cursor.execute.assert_not_called()
+
+    def test_people_during_episode(self, mock_db_connection: Any) -> None:
+        """Test the episode is looked up first and bounds the presence query"""
+        from sentinel_mas.tools.events_tools import people_during_episode
+
+        mock_connect, mock_conn, mock_cursor = mock_db_connection
+        mock_cursor.fetchone.return_value = (
+            7,
+            "fall",
+            "ep-7",
+            1000,
+            2000,
+            "lobby",
+            "cam_1",
+        )
+        cols = ["track_id", "resolved_id", "appear_ms", "disappear_ms", "cam_id"]
+        mock_cursor.description = [(c,) for c in cols]
+        mock_cursor.fetchall.return_value = [("t1", "p1", 900, None, "cam_2")]
+
+        result = people_during_episode.invoke({"ad_event_id": 7, "padding_ms": 60000})
+
+        lookup, presence = mock_cursor.execute.call_args_list
+        assert "FROM public.ad_events" in lookup[0][0]
+        assert lookup[0][1] == (7,)
+        assert "session_span" in presence[0][0]
+        assert presence[0][1] == ("lobby", -59000, 62000, False, "cam_1", 100)
+        assert result["episode"]["incident"] == "fall"
+        assert result["episode"]["location_id"] == "lobby"
+        assert result["rows"] == [
+            {
+                "track_id": "t1",
+                "resolved_id": "p1",
+                "appear_ms": 900,
+                "disappear_ms": None,
+                "cam_id": "cam_2",
+            }
+        ]
+
+    def test_people_during_episode_unknown_episode(
+        self, mock_db_connection: Any
+    ) -> None:
+        """Test a missing episode is reported, not returned as zero rows"""
+        from sentinel_mas.tools.events_tools import people_during_episode
+
+        mock_connect, mock_conn, mock_cursor = mock_db_connection
+        mock_cursor.fetchone.return_value = None
+
+        result = people_during_episode.invoke({"ad_event_id": 99})
+
+        assert result["ok"] is False
+        assert "not found" in result["error"]
+        assert mock_cursor.execute.call_count == 1
@@ -0,0 +1,104 @@
+import asyncio
+import weakref
+from unittest.mock import AsyncMock, MagicMock, Mock, patch
+
+import pytest
+
+from sentinel_mas.tools import pool
+
+DSN = "postgresql://primary/sentinel"
+
+
+@pytest.fixture
+def fresh_pools(monkeypatch):
+    monkeypatch.setattr(pool, "POOL_ENABLED", True)
+    monkeypatch.setattr(pool, "_pools", {})
+    monkeypatch.setattr(pool, "_async_pools", weakref.WeakKeyDictionary())
+    monkeypatch.setattr(pool, "_names", {})
+    with patch("sentinel_mas.tools.pool.ConnectionPool") as mock_pool_cls:
+        mock_pool_cls.check_connection = Mock()
+        yield mock_pool_cls
+
+
+class TestSyncPool:
+
+    def test_pool_created_lazily_once_per_dsn(self, fresh_pools) -> None:
+        assert fresh_pools.call_count == 0
+
+        first = pool.get_pool(DSN)
+        second = pool.get_pool(DSN)
+
+        assert first is second
+        assert fresh_pools.call_count == 1
+        kwargs = fresh_pools.call_args.kwargs
+        assert kwargs["min_size"] == pool.MIN_SIZE
+        assert kwargs["max_size"] == pool.MAX_SIZE
+        assert kwargs["check"] is fresh_pools.check_connection
+        fresh_pools.return_value.open.assert_called_once_with(wait=False)
+
+    def test_connection_checks_out_from_pool(self, fresh_pools) -> None:
+        conn = MagicMock()
+        fresh_pools.return_value.connection.return_value.__enter__.return_value = conn
+
+        with pool.connection(DSN, timeout=1.5) as got:
+            assert got is conn
+        fresh_pools.return_value.connection.assert_called_once_with(timeout=1.5)
+
+    def test_disabled_pool_connects_directly(self, fresh_pools, monkeypatch) -> None:
+        monkeypatch.setattr(pool, "POOL_ENABLED", False)
+        with patch("psycopg.connect") as mock_connect:
+            conn = MagicMock()
+            conn.__enter__ = Mock(return_value=conn)
+            conn.__exit__ = Mock(return_value=None)
+            mock_connect.return_value = conn
+
+            with pool.connection(DSN) as got:
+                assert got is conn
+        assert fresh_pools.call_count == 0
+        assert mock_connect.call_args[0][0] == DSN
+
+    def test_stats_keyed_by_name_not_dsn(self, fresh_pools) -> None:
+        fresh_pools.return_value.get_stats.return_value = {"pool_size": 2}
+        pool.get_pool(DSN, "replica")
+
+        stats = pool.pool_stats()
+
+        assert stats == {"enabled": True, "replica": {"pool_size": 2}}
+
+    def test_close_pools(self, fresh_pools) -> None:
+        pool.get_pool(DSN)
+        pool.close_pools()
+
+        fresh_pools.return_value.close.assert_called_once()
+        assert pool.pool_stats() == {"enabled": True}
+
+
+class TestAsyncPool:
+
+    def test_async_pool_per_event_loop(self, fresh_pools) -> None:
+        with patch("sentinel_mas.tools.pool.AsyncConnectionPool") as mock_async_cls:
+            opened = mock_async_cls.return_value.open = AsyncMock()
+            closed = mock_async_cls.return_value.close = AsyncMock()
+
+            async def twice():
+                a = await pool.get_async_pool(DSN)
+                b = await pool.get_async_pool(DSN)
+                await pool.close_async_pools()
+                return a, b
+
+            a, b = asyncio.run(twice())
+
+        assert a is b
+        assert mock_async_cls.call_count == 1
+        opened.assert_awaited_once_with(wait=False)
+        closed.assert_awaited_once()
+        assert len(pool._async_pools) == 0
+
+    def test_each_event_loop_gets_its_own_pool(self, fresh_pools) -> None:
+        with patch("sentinel_mas.tools.pool.AsyncConnectionPool") as mock_async_cls:
+            mock_async_cls.return_value.open = AsyncMock()
+
+            asyncio.run(pool.get_async_pool(DSN))
+            asyncio.run(pool.get_async_pool(DSN))
+
+        assert mock_async_cls.call_count == 2
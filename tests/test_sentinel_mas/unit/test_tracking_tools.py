@@ -222,3 +222,142 @@ class TestTrackingTools:
         assert "ConnectError" in result["error"]
         # Should have been called MAX_RETRIES + 1 times
         assert mock_request.call_count == 3  # (MAX_RETRIES=2 + initial attempt)
+
+    def test_find_similar_person_by_track(self, mock_http_client) -> None:
+        """Test similar-person search posts the query and drops unset filters"""
+        from sentinel_mas.tools.tracking_tools import find_similar_person
+
+        mock_client, mock_response = mock_http_client
+        mock_response.status_code = 200
+        mock_response.json.return_value = {"results": [], "next_cursor": None}
+
+        result = find_similar_person.invoke(
+            {
+                "start_ms": 1000,
+                "end_ms": 2000,
+                "camera_id": "cam-1",
+                "track_id": "t-9",
+                "location_id": "exit-1",
+            }
+        )
+
+        call_args = mock_client.return_value.__enter__.return_value.request.call_args
+        assert call_args[0][0] == "POST"
+        assert call_args[0][1] == "http://test-central:8000/person/similar"
+        assert call_args[1]["json"] == {
+            "start_ms": 1000,
+            "end_ms": 2000,
+            "camera_id": "cam-1",
+            "track_id": "t-9",
+            "location_id": "exit-1",
+            "limit": 20,
+        }
+        assert result["ok"] is True
+
+    def test_find_similar_person_requires_query(self) -> None:
+        """Test similar-person search without a query person"""
+        from sentinel_mas.tools.tracking_tools import find_similar_person
+
+        result = find_similar_person.invoke(
+            {"start_ms": 1000, "end_ms": 2000, "camera_id": "cam-1"}
+        )
+
+        assert result["ok"] is False
+        assert result["status_code"] == 400
+
+    def test_get_person_trajectory(self, mock_http_client) -> None:
+        """Test trajectory request passes the window as query parameters"""
+        from sentinel_mas.tools.tracking_tools import get_person_trajectory
+
+        mock_client, mock_response = mock_http_client
+        mock_response.status_code = 200
+        mock_response.json.return_value = {"segments": [], "segment_count": 0}
+
+        result = get_person_trajectory.invoke(
+            {"resolved_id": "person_123", "start_ms": 1000, "end_ms": 2000}
+        )
+
+        call_args = mock_client.return_value.__enter__.return_value.request.call_args
+        assert call_args[0][0] == "GET"
+        assert (
+            call_args[0][1] == "http://test-central:8000/person/person_123/trajectory"
+        )
+        assert call_args[1]["params"] == {"start_ms": 1000, "end_ms": 2000}
+        assert result["ok"] is True
+
+
+class TestCentralClient:
+
+    def test_client_shared_across_calls(self, mock_http_client) -> None:
+        """Test one keep-alive client serves every request"""
+        from sentinel_mas.tools.tracking_tools import get_track_status, send_track
+
+        mock_client, mock_response = mock_http_client
+        mock_response.status_code = 200
+        mock_response.json.return_value = {}
+
+        send_track.invoke({"resolved_id": "person_123"})
+        get_track_status.invoke({"resolved_id": "person_123"})
+
+        assert mock_client.call_count == 1
+        limits = mock_client.call_args[1]["limits"]
+        assert isinstance(limits, httpx.Limits)
+        assert mock_client.return_value.request.call_count == 2
+
+    def test_breaker_fails_fast_when_central_down(self, mock_http_client) -> None:
+        """Test the circuit opens after consecutive failed calls"""
+        import sentinel_mas.tools.tracking_tools as tracking_tools
+
+        mock_client, _ = mock_http_client
+        mock_request = mock_client.return_value.request
+        mock_request.side_effect = httpx.ConnectError("Connection failed")
+
+        with patch.object(tracking_tools.time, "sleep"):
+            for _ in range(tracking_tools.BREAKER_THRESHOLD):
+                result = tracking_tools.send_track.invoke({"resolved_id": "p"})
+                assert result["status_code"] == 599
+        attempts = mock_request.call_count
+
+        result = tracking_tools.send_track.invoke({"resolved_id": "p"})
+
+        assert result["ok"] is False
+        assert result["status_code"] == 503
+        assert "circuit open" in result["error"]
+        assert mock_request.call_count == attempts
+        assert tracking_tools.central_stats()["breaker"]["state"] == "open"
+
+    def test_breaker_probe_closes_circuit(self, mock_http_client) -> None:
+        """Test a successful half-open probe closes the circuit"""
+        import sentinel_mas.tools.tracking_tools as tracking_tools
+
+        breaker = tracking_tools._breaker
+        for _ in range(breaker.threshold):
+            breaker.record(False)
+        assert breaker.allow() is not None
+
+        assert breaker.opened_at is not None
+        breaker.opened_at -= breaker.reset_s
+        mock_client, mock_response = mock_http_client
+        mock_response.status_code = 200
+        mock_response.json.return_value = {"is_tracked": True}
+
+        result = tracking_tools.get_track_status.invoke({"resolved_id": "p"})
+
+        assert result["ok"] is True
+        assert breaker.stats() == {"state": "closed", "failures": 0, "rejected": 1}
+
+    def test_deadline_stops_retries(self, mock_http_client) -> None:
+        """Test no retry is attempted once the backoff would pass the deadline"""
+        import sentinel_mas.tools.tracking_tools as tracking_tools
+
+        mock_client, _ = mock_http_client
+        mock_request = mock_client.return_value.request
+        mock_request.side_effect = httpx.ReadTimeout("slow")
+
+        with patch.object(tracking_tools.time, "sleep") as mock_sleep:
+            result = tracking_tools._request("GET", "/health", deadline=0.01)
+
+        assert result["status_code"] == 599
+        assert mock_request.call_count == 1
+        mock_sleep.assert_not_called()
+        assert mock_request.call_args[1]["timeout"] <= 0.1